@@ -10,7 +10,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 # Import Base from your db setup
 from app.db import Base
-from app.models import User, Document  # ensure models are imported
+from app.models import User, Document, Conversation, ConversationArchive  # ensure models are imported
 
 # Load Alembic configuration
 config = context.config
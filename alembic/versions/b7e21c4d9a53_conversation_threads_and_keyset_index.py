@@ -0,0 +1,51 @@
+"""Conversation threads and keyset history index
+
+Revision ID: b7e21c4d9a53
+Revises: 53740683bf0d
+Create Date: 2026-10-19 10:12:41.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e21c4d9a53'
+down_revision: Union[str, Sequence[str], None] = '53740683bf0d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # conversations was only ever created by create_all at startup
+    if not sa.inspect(op.get_bind()).has_table('conversations'):
+        op.create_table('conversations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_conversations_user_id'), 'conversations', ['user_id'], unique=False)
+
+    op.add_column('conversations', sa.Column('thread_id', sa.String(length=64), nullable=True))
+    op.execute("UPDATE conversations SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL")
+    op.alter_column('conversations', 'created_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_conversations_user_created_id', 'conversations', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_conversations_user_thread_created_id', 'conversations', ['user_id', 'thread_id', 'created_at', 'id'], unique=False)
+    # Covered by the composite indexes, which lead with user_id
+    op.drop_index(op.f('ix_conversations_user_id'), table_name='conversations')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_conversations_user_id'), 'conversations', ['user_id'], unique=False)
+    op.drop_index('ix_conversations_user_thread_created_id', table_name='conversations')
+    op.drop_index('ix_conversations_user_created_id', table_name='conversations')
+    op.alter_column('conversations', 'created_at', existing_type=sa.DateTime(), nullable=True)
+    op.drop_column('conversations', 'thread_id')
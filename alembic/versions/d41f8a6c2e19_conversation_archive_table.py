@@ -0,0 +1,44 @@
+"""Conversation archive table and retention index
+
+Revision ID: d41f8a6c2e19
+Revises: b7e21c4d9a53
+Create Date: 2026-10-19 14:38:05.917362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8a6c2e19'
+down_revision: Union[str, Sequence[str], None] = 'b7e21c4d9a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_conversations_created_at', 'conversations', ['created_at'], unique=False)
+    op.create_table('conversations_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('thread_id', sa.String(length=64), nullable=True),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_conversations_archive_user_created', 'conversations_archive', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_conversations_archive_archived_at', 'conversations_archive', ['archived_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversations_archive_archived_at', table_name='conversations_archive')
+    op.drop_index('ix_conversations_archive_user_created', table_name='conversations_archive')
+    op.drop_table('conversations_archive')
+    op.drop_index('ix_conversations_created_at', table_name='conversations')
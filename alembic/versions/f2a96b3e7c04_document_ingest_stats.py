@@ -0,0 +1,34 @@
+"""Document ingest stats and catalog index
+
+Revision ID: f2a96b3e7c04
+Revises: d41f8a6c2e19
+Create Date: 2026-10-19 17:02:55.381204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a96b3e7c04'
+down_revision: Union[str, Sequence[str], None] = 'd41f8a6c2e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('chunk_count', sa.Integer(), nullable=True))
+    op.add_column('documents', sa.Column('byte_size', sa.BigInteger(), nullable=True))
+    op.add_column('documents', sa.Column('ingest_ms', sa.Integer(), nullable=True))
+    op.create_index('ix_documents_global_created_id', 'documents', ['is_global', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_global_created_id', table_name='documents')
+    op.drop_column('documents', 'ingest_ms')
+    op.drop_column('documents', 'byte_size')
+    op.drop_column('documents', 'chunk_count')
@@ -0,0 +1,96 @@
+import os, re, json
+from typing import Dict, List, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(__file__), "lexicon.json"))
+ANALYZER_STEM = os.getenv("ANALYZER_STEM", "true").lower() == "true"
+ANALYZER_STOPWORDS = os.getenv("ANALYZER_STOPWORDS", "true").lower() == "true"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how i if in into is it its
+me my of on or our so than that the their them then there these they this to was we were what
+when where which who why will with you your
+""".split())
+
+def load_lexicon(path: str = LEXICON_PATH) -> Dict[str, Any]:
+    """Load the typo, synonym and expansion dictionaries and compile their matchers once"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    expansions = {k.lower(): v for k, v in data.get("expansions", {}).items()}
+    # Longest keys first so multi-word keys win over their prefixes
+    keys = sorted(expansions, key=len, reverse=True)
+    return {
+        "typos": {k.lower(): v.lower() for k, v in data.get("typos", {}).items()},
+        "synonyms": {k.lower(): v.lower() for k, v in data.get("synonyms", {}).items()},
+        "expansions": expansions,
+        "expansion_re": re.compile(r"\b(" + "|".join(map(re.escape, keys)) + r")(?:s|es)?\b") if keys else None,
+    }
+
+def light_stem(token: str) -> str:
+    """Conservative suffix stripping; enough to fold plurals and simple inflections"""
+    if len(token) <= 4 or token.isdigit():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "shes", "ches", "xes")):
+        return token[:-2]
+    if token.endswith("ing") and len(token) > 6:
+        return token[:-3]
+    if token.endswith("ed") and len(token) > 5:
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+class Analyzer:
+    """Single-pass tokenizer shared by ingest and query time.
+
+    ``tokens`` lowercases once, walks one compiled regex and maps each token
+    through a precomputed table (typo fix, synonym, stopword drop, stem), so
+    the cost is linear in the text with no per-rule passes.
+    """
+
+    def __init__(self, lexicon: Dict[str, Any], stem: bool = ANALYZER_STEM, stopwords: bool = ANALYZER_STOPWORDS):
+        self.typos = lexicon["typos"]
+        self.synonyms = lexicon["synonyms"]
+        self.stem = stem
+        self.stopwords = STOPWORDS if stopwords else frozenset()
+        self._memo: Dict[str, List[str]] = {}
+
+    def _map(self, token: str) -> List[str]:
+        mapped = self._memo.get(token)
+        if mapped is None:
+            # Possessives index as the plain word, so "employee's" matches a query for "employee"
+            word = token[:-2] if token.endswith("'s") else token
+            word = self.typos.get(word, word)
+            word = self.synonyms.get(word, word)
+            mapped = [
+                light_stem(t) if self.stem else t
+                for t in TOKEN_RE.findall(word)
+                if t not in self.stopwords
+            ]
+            # Vocabulary is bounded in practice; cap anyway against adversarial input
+            if len(self._memo) < 200_000:
+                self._memo[token] = mapped
+        return mapped
+
+    def tokens(self, text: str) -> List[str]:
+        memo = self._memo
+        out: List[str] = []
+        extend = out.extend
+        for token in TOKEN_RE.findall(text.lower()):
+            mapped = memo.get(token)
+            extend(mapped if mapped is not None else self._map(token))
+        return out
+
+    def normalize(self, text: str) -> str:
+        """Lowercase and fix known typos word by word, keeping the text readable"""
+        typos = self.typos
+        return TOKEN_RE.sub(lambda m: typos.get(m.group(0), m.group(0)), text.lower().strip())
+
+LEXICON = load_lexicon()
+analyzer = Analyzer(LEXICON)
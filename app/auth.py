@@ -1,10 +1,15 @@
 import os
+import time
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .db import get_db
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import AsyncSessionLocal
 from .models import User, UserRole
 import bcrypt
 from dotenv import load_dotenv
@@ -16,6 +21,17 @@ SECRET_KEY = os.getenv("JWT_SECRET", "change_me")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY", "admin123")  # Change this!
+# Authenticated users are cached per worker; a role change or deletion shows up
+# within USER_CACHE_TTL_SECONDS even if it bypasses the version stamp below
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Touched after any commit that updated or deleted a user so every worker drops its cache.
+# Workers must share it, so it defaults to a fixed path in the project root, not the working directory.
+USER_CACHE_VERSION_FILE = os.getenv(
+    "USER_CACHE_VERSION_FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".user_cache_version")
+)
+# How often a worker stats the version file
+USER_CACHE_STAMP_CHECK_SECONDS = 1.0
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -36,7 +52,94 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 def get_user_by_email(db: Session, email: str) -> User | None:
     return db.query(User).filter(User.email == email).first()
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+async def aget_user_by_email(db: AsyncSession, email: str) -> User | None:
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Detached snapshot of the fields requests use; safe to share across threads"""
+    id: int
+    email: str
+    role: UserRole
+
+class UserCache:
+    """TTL-bounded map of JWT subject -> CachedUser, shared by a worker's threads"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, size: int = USER_CACHE_SIZE, version_file: str = USER_CACHE_VERSION_FILE):
+        self.ttl = ttl
+        self.size = size
+        self.version_file = version_file
+        self._lock = threading.Lock()
+        self._users = {}
+        self._version = self._read_version()
+        self._checked_at = time.monotonic()
+
+    def _read_version(self):
+        try:
+            return os.stat(self.version_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self, sub: str) -> CachedUser | None:
+        now = time.monotonic()
+        if now - self._checked_at >= USER_CACHE_STAMP_CHECK_SECONDS:
+            self._checked_at = now
+            version = self._read_version()
+            if version != self._version:
+                with self._lock:
+                    self._version = version
+                    self._users.clear()
+        entry = self._users.get(sub)
+        if entry is None or entry[1] < now:
+            return None
+        return entry[0]
+
+    @property
+    def version(self):
+        """Pass to put(): a row read before an invalidation is then not cached"""
+        return self._version
+
+    def put(self, sub: str, user: CachedUser, version=None):
+        with self._lock:
+            if version != self._version:
+                # Invalidated while this user was being read; the row may predate the change
+                return
+            if len(self._users) >= self.size:
+                # Drop expired entries first, then the oldest half
+                now = time.monotonic()
+                self._users = {k: v for k, v in self._users.items() if v[1] >= now}
+                if len(self._users) >= self.size:
+                    self._users = dict(list(self._users.items())[self.size // 2:])
+            self._users[sub] = (user, time.monotonic() + self.ttl)
+
+    def invalidate(self):
+        """Drop cached users in every worker"""
+        tmp = f"{self.version_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, self.version_file)
+        with self._lock:
+            self._version = self._read_version()
+            self._users.clear()
+
+user_cache = UserCache()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_user_changed(mapper, connection, target):
+    # Flushed but not committed: invalidating now would let a concurrent miss re-cache the old row
+    session = object_session(target)
+    if session is not None:
+        session.info["user_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_user_cache(session):
+    if session.info.pop("user_changed", False):
+        user_cache.invalidate()
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CachedUser:
+    """Validate the bearer token; the database is only read on a cache miss"""
     cred_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED, 
         detail="Could not validate credentials",
@@ -47,14 +150,23 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         user_id = payload.get("sub")
         if user_id is None:
             raise cred_exc
-        user = db.query(User).get(int(user_id))
-        if not user:
-            raise cred_exc
-        return user
     except JWTError:
         raise cred_exc
+    
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    version = user_cache.version
+    
+    async with AsyncSessionLocal() as db:
+        row = await db.get(User, int(user_id))
+        if not row:
+            raise cred_exc
+        user = CachedUser(id=row.id, email=row.email, role=row.role)
+    user_cache.put(user_id, user, version)
+    return user
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_admin_user(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
     """Dependency to check if user is admin"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
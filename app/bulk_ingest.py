@@ -0,0 +1,168 @@
+import os, time, uuid, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from .rag import store, embedding_fn, document_meta, bump_corpus_version
+from .extraction_cache import extract_prepared, extract_file
+from .models import Document
+from . import metrics
+
+load_dotenv()
+
+# Processes parsing and chunking PDFs in parallel
+BULK_PARSE_PROCESSES = int(os.getenv("BULK_PARSE_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+# Chunks embedded per model call
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "512"))
+# Chunks buffered across documents before one store upsert
+BULK_UPSERT_SIZE = int(os.getenv("BULK_UPSERT_SIZE", "4096"))
+
+def parse_pool(processes: int = BULK_PARSE_PROCESSES) -> ProcessPoolExecutor:
+    # Spawned, not forked: the parent may hold loaded models and running threads
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+def _ordered(fn, args: List[Tuple], processes: int) -> Iterator[Dict[str, Any]]:
+    """Run fn over args in a process pool, yielding in input order.
+
+    At most two tasks per process are in flight, so parsed documents
+    never pile up in memory when embedding is the slower stage.
+    """
+    if not args:
+        return
+    processes = max(1, min(processes, len(args)))
+    with parse_pool(processes) as pool:
+        pending = deque()
+        for a in args:
+            pending.append(pool.submit(fn, *a))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def prepare_files(paths: List[str], names: List[str], processes: int = BULK_PARSE_PROCESSES) -> Iterator[Dict[str, Any]]:
+    """Parse and chunk files in a process pool, yielding in input order; cached PDFs aren't parsed again"""
+    return _ordered(extract_file, list(zip(paths, names)), processes)
+
+def prepare_uploads(files: List[Tuple[str, bytes]], processes: int = BULK_PARSE_PROCESSES) -> Iterator[Dict[str, Any]]:
+    """Same as prepare_files for in-memory (name, bytes) pairs"""
+    return _ordered(extract_prepared, [(data, name) for name, data in files], processes)
+
+class BulkIngester:
+    """Embeds and upserts chunks of many documents in large shared batches.
+
+    Chunks from consecutive documents fill one buffer, which is embedded
+    BULK_EMBED_BATCH_SIZE at a time and written with a single upsert per
+    BULK_UPSERT_SIZE chunks. A document counts as stored once its last
+    chunk is written; on_stored is then called with it, which is where a
+    caller records progress it can resume from.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        is_global: bool = True,
+        upsert_size: int = BULK_UPSERT_SIZE,
+        embed_batch_size: int = BULK_EMBED_BATCH_SIZE,
+        on_stored: Callable[[Dict[str, Any]], None] | None = None,
+    ):
+        self.user_id = user_id
+        self.is_global = is_global
+        self.upsert_size = upsert_size
+        self.embed_batch_size = embed_batch_size
+        self.on_stored = on_stored
+        self.stored: List[Dict[str, Any]] = []
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._waiting: List[Dict[str, Any]] = []  # documents with chunks still in the buffer
+
+    def add(self, prepared: Dict[str, Any], doc_id: str | None = None, title: str | None = None) -> Dict[str, Any]:
+        """Queue one prepare_pdf result; returns its document record"""
+        doc_id = doc_id or str(uuid.uuid4())
+        doc = {
+            "doc_id": doc_id,
+            "name": prepared["name"],
+            "title": title or prepared["title"],
+            "pages": prepared["pages"],
+            "chunks": len(prepared["chunks"]),
+            "byte_size": prepared["byte_size"],
+            "parse_ms": prepared.get("parse_ms", 0),
+            "started": time.perf_counter(),
+        }
+        base_meta = document_meta(self.user_id, doc_id, doc["title"], self.is_global)
+        for i, chunk in enumerate(prepared["chunks"]):
+            self._ids.append(f"{doc_id}_{i}")
+            self._documents.append(chunk["text"])
+            self._metadatas.append({
+                **base_meta,
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "tokens": chunk["terms"],
+            })
+            # A long document is written in upsert_size pieces, not buffered whole.
+            # It joins _waiting only after its last chunk, so it isn't reported stored early.
+            if len(self._ids) >= self.upsert_size:
+                self.flush()
+        self._waiting.append(doc)
+        return doc
+
+    def flush(self):
+        if self._ids:
+            embeddings = []
+            for start in range(0, len(self._documents), self.embed_batch_size):
+                embeddings.extend(embedding_fn(self._documents[start:start + self.embed_batch_size]))
+            store.upsert(self._ids, embeddings, self._documents, self._metadatas)
+            metrics.incr("bulk_ingest_chunks", len(self._ids))
+        now = time.perf_counter()
+        for doc in self._waiting:
+            # Parse time in the worker plus time until the last chunk was written
+            doc["ingest_ms"] = doc.pop("parse_ms") + int((now - doc.pop("started")) * 1000)
+            self.pages += doc["pages"]
+            self.chunks += doc["chunks"]
+            self.stored.append(doc)
+            if self.on_stored:
+                self.on_stored(doc)
+        self._ids, self._documents, self._metadatas, self._waiting = [], [], [], []
+
+    def finish(self) -> List[Dict[str, Any]]:
+        self.flush()
+        if self.stored:
+            bump_corpus_version()
+        return self.stored
+
+    def rates(self) -> Dict[str, float]:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "documents": len(self.stored),
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 1),
+            "pages_per_sec": round(self.pages / elapsed, 1),
+            "chunks_per_sec": round(self.chunks / elapsed, 1),
+        }
+
+def register_documents(db: Session, user_id: int, docs: Iterable[Dict[str, Any]], is_global: bool = True) -> int:
+    """Add Document rows for stored documents in one transaction.
+
+    Ids already registered (a resumed run that stopped after committing)
+    are skipped. Returns the number of rows added.
+    """
+    docs = list(docs)
+    if not docs:
+        return 0
+    ids = [uuid.UUID(d["doc_id"]) for d in docs]
+    existing = {row.id for row in db.query(Document.id).filter(Document.id.in_(ids))}
+    rows = [
+        Document(
+            id=doc_uuid, user_id=user_id, title=d["title"], is_global=is_global,
+            chunk_count=d["chunks"], byte_size=d["byte_size"], ingest_ms=d.get("ingest_ms"),
+        )
+        for doc_uuid, d in zip(ids, docs) if doc_uuid not in existing
+    ]
+    db.add_all(rows)
+    db.commit()
+    return len(rows)
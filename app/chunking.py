@@ -0,0 +1,97 @@
+import os, re
+from typing import Iterable, Iterator, List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# all-MiniLM-L6-v2 truncates input at 256 word pieces; anything past that is never embedded
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+|\n(?=\s*(?:[•\-\*]|\d+[.)])\s)")
+
+_tokenizer = None
+
+def get_tokenizer():
+    """Load the embedding model's tokenizer once per process"""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text, add_special_tokens=False)["input_ids"])
+
+def split_sentences(text: str) -> List[str]:
+    """Split a page into sentences, keeping list items as their own units"""
+    sentences = []
+    for paragraph in PARAGRAPH_RE.split(text):
+        for sentence in SENTENCE_RE.split(paragraph):
+            sentence = " ".join(sentence.split())
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+def _split_long_sentence(sentence: str, budget: int) -> Iterator[Tuple[str, int]]:
+    """Hard-split a sentence that alone exceeds the token budget at token boundaries"""
+    encoding = get_tokenizer()(sentence, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = encoding["offset_mapping"]
+    for start in range(0, len(offsets), budget):
+        window = offsets[start:start + budget]
+        piece = sentence[window[0][0]:window[-1][1]].strip()
+        if piece:
+            yield piece, len(window)
+
+def iter_chunks(
+    pages: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Dict[str, Any]]:
+    """Stream sentence-aligned chunks sized in embedding-model tokens.
+
+    Pages are consumed one at a time and only the sentences of the chunk
+    being built are held in memory, so arbitrarily long documents can be
+    chunked in bounded space. Each chunk carries the 1-based page range it
+    was drawn from.
+    """
+    # [CLS] and [SEP] are added by the encoder and count against its limit
+    budget = max(max_tokens - 2, 1)
+    overlap_tokens = min(overlap_tokens, budget // 2)
+
+    window: List[Tuple[str, int, int]] = []  # (sentence, tokens, page)
+    window_tokens = 0
+    fresh = False  # window holds sentences not yet emitted in a chunk
+
+    def emit():
+        return {
+            "text": " ".join(s for s, _, _ in window),
+            "page_start": window[0][2],
+            "page_end": window[-1][2],
+            "tokens": window_tokens,
+        }
+
+    for page_no, page in enumerate(pages, start=1):
+        for sentence in split_sentences(page or ""):
+            n = count_tokens(sentence)
+            pieces = _split_long_sentence(sentence, budget) if n > budget else [(sentence, n)]
+            for piece, piece_tokens in pieces:
+                if window_tokens + piece_tokens > budget and fresh:
+                    yield emit()
+                    # Carry trailing sentences forward as overlap
+                    carried, carried_tokens = [], 0
+                    for item in reversed(window):
+                        if carried_tokens + item[1] + piece_tokens > budget or carried_tokens + item[1] > overlap_tokens:
+                            break
+                        carried.insert(0, item)
+                        carried_tokens += item[1]
+                    window, window_tokens = carried, carried_tokens
+                    fresh = False
+                window.append((piece, piece_tokens, page_no))
+                window_tokens += piece_tokens
+                fresh = True
+
+    if window and fresh:
+        yield emit()
@@ -0,0 +1,164 @@
+import os, gzip, json, time, hashlib, threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+from dotenv import load_dotenv
+from .chunking import EMBEDDING_MODEL, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from .analyzer import LEXICON_PATH, ANALYZER_STEM, ANALYZER_STOPWORDS
+from .pdf import prepare_pdf
+from . import metrics
+
+load_dotenv()
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+# Shared by every worker and the ingest CLI, so it defaults to the project root, not the working directory
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "extraction_cache")
+)
+# Compressed bytes kept on disk; least recently used entries are evicted beyond this
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Chat-session indexes kept in memory, shared by every session on the same PDF
+CHAT_INDEX_CACHE_SIZE = int(os.getenv("CHAT_INDEX_CACHE_SIZE", "32"))
+
+def _lexicon_digest(path: str = LEXICON_PATH) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# Entries hold chunks and their BM25 terms, so a chunking or analyzer change
+# (settings or lexicon) starts a fresh namespace instead of serving stale terms
+CONFIG_TAG = hashlib.sha256(
+    f"2:{EMBEDDING_MODEL}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}:"
+    f"{ANALYZER_STEM}:{ANALYZER_STOPWORDS}:{_lexicon_digest()}".encode()
+).hexdigest()[:12]
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class ExtractionCache:
+    """SHA-256 of a PDF's bytes -> its prepare_pdf result, gzipped on disk.
+
+    Reads touch the file's mtime, so eviction by oldest mtime is LRU, and
+    files are written to a temp name and renamed into place, so several
+    workers can share the directory.
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_DIR, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.path, f"{digest}.{CONFIG_TAG}.json.gz")
+
+    def get(self, digest: str) -> Dict[str, Any] | None:
+        file = self._file(digest)
+        try:
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            now = time.time_ns()
+            os.utime(file, ns=(now, now))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Extraction cache read error: {e}")
+            return None
+        return entry
+
+    def put(self, digest: str, entry: Dict[str, Any]):
+        os.makedirs(self.path, exist_ok=True)
+        file = self._file(digest)
+        tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(entry, f)
+            os.replace(tmp, file)
+        except Exception as e:
+            print(f"Extraction cache write error: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".json.gz"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, file in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(file)
+                    metrics.incr("extraction_cache_evicted")
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+cache = ExtractionCache()
+
+def lookup(data: bytes, name: str) -> Tuple[str, Dict[str, Any] | None]:
+    """(content hash, cached prepare_pdf result or None); never parses.
+
+    The name is per upload, so it (and a title falling back to it) is set on
+    the returned copy rather than taken from the cached entry.
+    """
+    digest = content_hash(data)
+    if not EXTRACTION_CACHE_ENABLED:
+        return digest, None
+    entry = cache.get(digest)
+    if entry is None:
+        metrics.incr("extraction_cache_miss")
+        return digest, None
+    metrics.incr("extraction_cache_hit")
+    return digest, {**entry, "name": name, "title": entry.get("pdf_title") or name}
+
+def extract(data: bytes, name: str) -> Tuple[str, Dict[str, Any]]:
+    """(content hash, prepare_pdf result), parsing only on a cache miss; failed extractions aren't cached"""
+    digest, entry = lookup(data, name)
+    if entry is not None:
+        return digest, entry
+    prepared = prepare_pdf(data, name)
+    if EXTRACTION_CACHE_ENABLED and "error" not in prepared:
+        cache.put(digest, prepared)
+    return digest, prepared
+
+def extract_prepared(data: bytes, name: str) -> Dict[str, Any]:
+    """extract() without the hash; module-level so process pools can run it"""
+    return extract(data, name)[1]
+
+def extract_file(path: str, name: str | None = None) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        return extract_prepared(f.read(), name or path)
+
+class IndexCache:
+    """Small in-memory LRU of objects built from an extraction, keyed by content hash"""
+
+    def __init__(self, size: int = CHAT_INDEX_CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, digest: str, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                metrics.incr("chat_index_cache_hit")
+                return self._items[digest]
+        # Built outside the lock; two concurrent builds of one PDF just race to insert
+        value = build()
+        with self._lock:
+            self._items[digest] = value
+            self._items.move_to_end(digest)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return value
+
+chat_indexes = IndexCache()
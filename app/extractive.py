@@ -0,0 +1,89 @@
+import os, re
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from .analyzer import analyzer
+from .chunking import split_sentences
+
+load_dotenv()
+
+# Off by default; requests can also opt in or out with "fast_path"
+EXTRACTIVE_ENABLED = os.getenv("EXTRACTIVE_ENABLED", "false").lower() == "true"
+# Relative lead of the best chunk over the runner-up, (s1 - s2) / s1, on the rerank
+# probability when the hits were reranked, else on the query's cosine similarity
+EXTRACTIVE_MIN_MARGIN = float(os.getenv("EXTRACTIVE_MIN_MARGIN", "0.2"))
+# Sentence score in [0, 1] needed to answer without the LLM
+EXTRACTIVE_MIN_SCORE = float(os.getenv("EXTRACTIVE_MIN_SCORE", "0.75"))
+# Longest span returned, in sentences
+EXTRACTIVE_MAX_SENTENCES = int(os.getenv("EXTRACTIVE_MAX_SENTENCES", "2"))
+# Chunks whose sentences are considered, best first
+EXTRACTIVE_CHUNKS = int(os.getenv("EXTRACTIVE_CHUNKS", "2"))
+
+# Questions whose answer is a number, a date or an amount
+QUANTITY_RE = re.compile(r"\b(how (many|much|long|often)|when|what date|which date|deadline|limit|maximum|minimum)\b")
+NUMBER_RE = re.compile(r"\d")
+# Words that come from the question's phrasing rather than its subject
+QUESTION_WORDS = frozenset("many much long often get got tell know please give".split())
+# Questions that want reasoning or a summary rather than a fact
+OPEN_ENDED_RE = re.compile(r"\b(why|explain\w*|summar\w*|compar\w*|difference|upcoming|next|list|all)\b")
+
+def relevance_scores(hits: List[Dict[str, Any]]) -> List[float]:
+    """Per-hit relevance in [0, 1] that doesn't depend on FUSION_METHOD.
+
+    Reranked hits (which keep their "fused_score") are compared on the
+    cross-encoder probability; otherwise, or when the rerank budget ran out
+    before every hit was scored, on the semantic similarity to the query.
+    """
+    if all("fused_score" in h for h in hits):
+        return [h["score"] for h in hits]
+    return [h.get("similarity", 0.0) for h in hits]
+
+def score_margin(hits: List[Dict[str, Any]]) -> float:
+    scores = sorted(relevance_scores(hits), reverse=True)
+    if not scores or scores[0] <= 0:
+        return 0.0
+    if len(scores) == 1:
+        return 1.0
+    return (scores[0] - scores[1]) / scores[0]
+
+def score_span(query_terms: set, wants_number: bool, sentences: List[str]) -> float:
+    """Share of the question's terms the span covers, discounted when a
+    quantity is asked for and the span has no digits"""
+    terms = set()
+    for sentence in sentences:
+        terms.update(analyzer.tokens(sentence))
+    coverage = len(query_terms & terms) / len(query_terms)
+    if wants_number and not any(NUMBER_RE.search(s) for s in sentences):
+        coverage *= 0.5
+    return coverage
+
+def extract_answer(query: str, hits: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Best sentence span from the top chunks, or None when the LLM should answer.
+
+    Two gates: retrieval must be decisive (score margin) and one short span
+    must cover the question's terms. Questions that need reasoning over
+    dates or several passages always go to the LLM.
+    """
+    lowered = query.lower()
+    query_terms = set(analyzer.tokens(query)) - QUESTION_WORDS
+    if not hits or not query_terms or OPEN_ENDED_RE.search(lowered):
+        return None
+    margin = score_margin(hits)
+    if margin < EXTRACTIVE_MIN_MARGIN:
+        return None
+
+    wants_number = bool(QUANTITY_RE.search(lowered))
+    best = None
+    for hit in sorted(hits, key=lambda h: h["score"], reverse=True)[:EXTRACTIVE_CHUNKS]:
+        sentences = split_sentences(hit["chunk"])
+        for i in range(len(sentences)):
+            for n in range(1, EXTRACTIVE_MAX_SENTENCES + 1):
+                span = sentences[i:i + n]
+                if len(span) < n:
+                    break
+                # Longer spans must earn their extra sentence
+                score = score_span(query_terms, wants_number, span) - 0.05 * (n - 1)
+                if best is None or score > best["score"]:
+                    best = {"answer": " ".join(span), "hit": hit, "score": score, "margin": margin}
+    if best is None or best["score"] < EXTRACTIVE_MIN_SCORE:
+        return None
+    return best
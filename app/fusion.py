@@ -0,0 +1,79 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# A ranked leg is (ids, scores) in rank order; scores may be None for pure-rank methods
+Leg = Tuple[Sequence[str], Sequence[float] | None]
+
+def _encode(legs: Sequence[Leg]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Map string ids to dense integer codes in first-seen order.
+
+    Returns the unique ids, the codes of all legs concatenated, and each
+    leg's length.
+    """
+    flat = [i for ids, _ in legs for i in ids]
+    unique = list(dict.fromkeys(flat))
+    position = dict(zip(unique, range(len(unique))))
+    codes = np.fromiter(map(position.__getitem__, flat), dtype=np.int64, count=len(flat))
+    lengths = np.fromiter((len(ids) for ids, _ in legs), dtype=np.int64, count=len(legs))
+    return unique, codes, lengths
+
+def _top(ids: List[str], scores: np.ndarray, top_k: int | None) -> List[Tuple[str, float]]:
+    """Top-k by partial selection; only the k survivors are sorted"""
+    n = len(ids)
+    if top_k is not None and top_k < n:
+        if top_k <= 0:
+            return []
+        picked = np.argpartition(-scores, top_k - 1)[:top_k]
+        picked = picked[np.argsort(-scores[picked], kind="stable")]
+    else:
+        picked = np.argsort(-scores, kind="stable")
+    return [(ids[i], float(scores[i])) for i in picked]
+
+def _weights(legs: Sequence[Leg], weights: Sequence[float] | None) -> Sequence[float]:
+    if weights is None:
+        return [1.0] * len(legs)
+    if len(weights) != len(legs):
+        raise ValueError("One weight per leg is required")
+    return weights
+
+def weighted_rrf(legs: Sequence[Leg], weights: Sequence[float] | None = None, k: int = 60, top_k: int | None = None) -> List[Tuple[str, float]]:
+    """Weighted Reciprocal Rank Fusion: sum of w / (k + rank) over the legs"""
+    weights = _weights(legs, weights)
+    ids, codes, lengths = _encode(legs)
+    if not ids:
+        return []
+    # 1-based rank of every entry within its own leg, without a per-leg loop
+    starts = np.cumsum(lengths) - lengths
+    ranks = np.arange(1, len(codes) + 1) - np.repeat(starts, lengths)
+    contrib = np.repeat(np.asarray(weights, dtype=np.float64), lengths) / (k + ranks)
+    scores = np.bincount(codes, weights=contrib, minlength=len(ids))
+    return _top(ids, scores, top_k)
+
+def _normalized(scores: Sequence[float]) -> np.ndarray:
+    """Min-max to [0, 1]; a constant leg scores 1 everywhere"""
+    s = np.asarray(scores, dtype=np.float64)
+    if s.size == 0:
+        return s
+    lo, hi = s.min(), s.max()
+    return (s - lo) / (hi - lo) if hi > lo else np.ones_like(s)
+
+def _comb(legs: Sequence[Leg], weights: Sequence[float] | None, mnz: bool, top_k: int | None) -> List[Tuple[str, float]]:
+    weights = _weights(legs, weights)
+    ids, codes, _ = _encode(legs)
+    if not ids:
+        return []
+    contrib = np.concatenate([w * _normalized(s) for (_, s), w in zip(legs, weights)])
+    scores = np.bincount(codes, weights=contrib, minlength=len(ids))
+    if mnz:
+        scores *= np.bincount(codes, minlength=len(ids))
+    return _top(ids, scores, top_k)
+
+def comb_sum(legs: Sequence[Leg], weights: Sequence[float] | None = None, top_k: int | None = None) -> List[Tuple[str, float]]:
+    """CombSUM over min-max normalised leg scores"""
+    return _comb(legs, weights, mnz=False, top_k=top_k)
+
+def comb_mnz(legs: Sequence[Leg], weights: Sequence[float] | None = None, top_k: int | None = None) -> List[Tuple[str, float]]:
+    """CombMNZ: CombSUM scaled by the number of legs that returned each id"""
+    return _comb(legs, weights, mnz=True, top_k=top_k)
+
+FUSION_METHODS = {"rrf": weighted_rrf, "combsum": comb_sum, "combmnz": comb_mnz}
@@ -0,0 +1,142 @@
+import os, time, threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from .analyzer import analyzer, TOKEN_RE
+from .rag import answer_batch, corpus_version, get_current_date_info
+from . import jobs, metrics
+
+load_dotenv()
+
+# Always precomputed, in sidebar order; "|"-separated
+HOT_QUESTIONS = [q.strip() for q in os.getenv(
+    "HOT_QUESTIONS", "What are the policies?|Employee benefits?|Upcoming holidays?"
+).split("|") if q.strip()]
+# Frequently asked questions are added up to this many entries in total
+HOT_QUESTIONS_MAX = int(os.getenv("HOT_QUESTIONS_MAX", "8"))
+# Times a question must be asked (today plus yesterday) to become hot
+HOT_QUESTION_MIN_COUNT = int(os.getenv("HOT_QUESTION_MIN_COUNT", "5"))
+# Precomputed retrieval uses this top_k; requests asking for another one run live
+HOT_TOP_K = int(os.getenv("HOT_TOP_K", "8"))
+# Only global documents are searched; no user has id 0, so no private chunks match
+GLOBAL_SCOPE_USER = 0
+
+_lock = threading.Lock()
+_answers: Dict[str, Dict[str, Any]] = {}
+_counts: Counter = Counter()
+_phrasing: Dict[str, str] = {}  # key -> wording shown in the UI
+_previous_counts: Counter = Counter()
+_counts_day = ""
+_built_for = (None, "")  # (corpus version, date) the answers were computed for
+
+def question_key(question: str) -> str:
+    """Case, typo, punctuation and spacing insensitive form used for lookups"""
+    return " ".join(TOKEN_RE.findall(analyzer.normalize(question)))
+
+def record(question: str):
+    """Count a served question towards auto-detection"""
+    global _counts_day, _counts, _previous_counts
+    key = question_key(question)
+    if not key:
+        return
+    today = get_current_date_info()["short_date"]
+    with _lock:
+        if today != _counts_day:
+            _previous_counts, _counts, _counts_day = _counts, Counter(), today
+            keep = set(_counts) | set(_previous_counts)
+            for stale in [k for k in _phrasing if k not in keep]:
+                del _phrasing[stale]
+        _counts[key] += 1
+        _phrasing.setdefault(key, question.strip())
+        # One-off questions dominate the tail; keep the table bounded
+        if len(_counts) > 20_000:
+            _counts = Counter(dict(_counts.most_common(10_000)))
+
+def hot_questions() -> List[str]:
+    """Configured questions first, then the most frequently asked ones"""
+    questions = list(dict.fromkeys(HOT_QUESTIONS))
+    seen = {question_key(q) for q in questions}
+    with _lock:
+        combined = _counts + _previous_counts
+        phrasing = dict(_phrasing)
+    for key, count in combined.most_common():
+        if len(questions) >= HOT_QUESTIONS_MAX or count < HOT_QUESTION_MIN_COUNT:
+            break
+        if key not in seen:
+            questions.append(phrasing.get(key, key))
+            seen.add(key)
+    return questions
+
+def _current_state():
+    return corpus_version(), get_current_date_info()["short_date"]
+
+def refresh():
+    """Recompute answers for every hot question against the current corpus and date"""
+    global _answers, _built_for
+    state = _current_state()
+    questions = hot_questions()
+    start = time.perf_counter()
+    answers = {}
+    for index, answer, hits in answer_batch(questions, GLOBAL_SCOPE_USER, top_k=HOT_TOP_K):
+        if hits:
+            answers[question_key(questions[index])] = {
+                "question": questions[index],
+                "answer": answer,
+                "hits": hits,
+                "computed_at": datetime.now().isoformat(timespec="seconds"),
+            }
+    with _lock:
+        # Another trigger may have fired while this ran; keep its answers out
+        if _current_state() == state:
+            _answers, _built_for = answers, state
+    metrics.observe("hot_questions_refresh_ms", (time.perf_counter() - start) * 1000)
+    print(f"🔥 Precomputed {len(answers)}/{len(questions)} hot questions")
+
+def schedule_refresh() -> bool:
+    return jobs.schedule("hot_questions", refresh)
+
+def lookup(question: str, top_k: int = HOT_TOP_K) -> Dict[str, Any] | None:
+    """Precomputed answer, if it was built for the current corpus and date.
+
+    A stale build is dropped and a refresh scheduled, so answers about
+    "upcoming" dates or deleted documents are never served.
+    """
+    global _answers
+    if top_k != HOT_TOP_K:
+        return None
+    with _lock:
+        if _built_for != _current_state():
+            if _answers:
+                _answers = {}
+            stale = True
+        else:
+            stale = False
+            entry = _answers.get(question_key(question))
+    if stale:
+        schedule_refresh()
+        return None
+    metrics.incr("hot_questions_hit" if entry else "hot_questions_miss")
+    return entry
+
+def status() -> List[Dict[str, Any]]:
+    with _lock:
+        fresh = _built_for == _current_state()
+        answers = dict(_answers) if fresh else {}
+    return [
+        {"question": q, "ready": question_key(q) in answers, "computed_at": answers.get(question_key(q), {}).get("computed_at")}
+        for q in hot_questions()
+    ]
+
+def _watch_rollover():
+    """Refresh just after midnight, since answers depend on today's date"""
+    while True:
+        now = datetime.now()
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=5, microsecond=0)
+        time.sleep((midnight - now).total_seconds())
+        schedule_refresh()
+
+def start():
+    """Build the answers in the background and keep them fresh across days"""
+    schedule_refresh()
+    threading.Thread(target=_watch_rollover, name="hot_questions_rollover", daemon=True).start()
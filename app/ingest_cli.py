@@ -0,0 +1,156 @@
+"""Ingest a directory of PDFs as global (admin) documents.
+
+PDFs are parsed and chunked in a process pool, embedded in large batches
+and written to the store thousands of chunks at a time; Document rows for
+the whole run are registered in one transaction at the end. Progress is
+kept in a state file, so an interrupted run picks up where it stopped:
+files already stored are not parsed or embedded again, and a document
+keeps its doc_id across attempts. A file that changed since it was
+ingested replaces its old document (chunks, summaries and row).
+
+    python -m app.ingest_cli /path/to/policies --admin-email admin@example.com [--processes 8]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import SessionLocal
+from app.models import Document
+from app.auth import get_user_by_email
+from app.rag import delete_document_chunks
+from app.summaries import delete_summaries
+from app.bulk_ingest import (
+    BulkIngester, prepare_files, register_documents,
+    BULK_PARSE_PROCESSES, BULK_EMBED_BATCH_SIZE, BULK_UPSERT_SIZE,
+)
+
+STATE_FILE = ".ingest_state.json"
+REPORT_EVERY_SECONDS = 5
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+def save_state(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+def find_pdfs(root: str):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".pdf"):
+                yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+def fingerprint(path: str) -> str:
+    """Size and mtime: a changed file is ingested again under a new doc_id"""
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def remove_document(doc_id: str):
+    """Delete a superseded document everywhere; safe to repeat if a run stopped midway"""
+    delete_document_chunks(doc_id)
+    delete_summaries(doc_id)
+    db = SessionLocal()
+    try:
+        db.query(Document).filter(Document.id == uuid.UUID(doc_id)).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def run(root: str, admin_email: str, processes: int, upsert_size: int, embed_batch_size: int, state_path: str | None = None):
+    state_path = state_path or os.path.join(root, STATE_FILE)
+    state = load_state(state_path)
+    files = state["files"]
+
+    db = SessionLocal()
+    try:
+        admin = get_user_by_email(db, admin_email)
+        if not admin:
+            raise SystemExit(f"No user {admin_email}")
+        admin_id = admin.id
+    finally:
+        db.close()
+
+    todo = []
+    replaced = 0
+    for rel in find_pdfs(root):
+        entry = files.get(rel)
+        fp = fingerprint(os.path.join(root, rel))
+        if entry and entry["fingerprint"] == fp and entry["status"] in ("stored", "registered"):
+            continue
+        if entry and entry["fingerprint"] != fp:
+            # The old version (even a partly written one) would otherwise stay searchable next to the new
+            remove_document(entry["doc_id"])
+            replaced += 1
+        if not entry or entry["fingerprint"] != fp:
+            # doc_id is fixed before any chunk is written so a retry overwrites, never duplicates
+            files[rel] = entry = {"fingerprint": fp, "doc_id": str(uuid.uuid4()), "status": "pending"}
+        todo.append(rel)
+    save_state(state_path, state)
+    print(f"📚 {len(todo)} PDFs to ingest under {root} ({len(files) - len(todo)} already done, {replaced} changed)")
+
+    last_report = time.perf_counter()
+
+    def on_stored(doc):
+        nonlocal last_report
+        files[doc["name"]].update(
+            status="stored", title=doc["title"], chunks=doc["chunks"],
+            byte_size=doc["byte_size"], ingest_ms=doc["ingest_ms"],
+        )
+        save_state(state_path, state)
+        if time.perf_counter() - last_report >= REPORT_EVERY_SECONDS:
+            last_report = time.perf_counter()
+            r = ingester.rates()
+            print(f"   {r['documents']}/{len(todo)} docs, {r['pages']} pages ({r['pages_per_sec']}/s), "
+                  f"{r['chunks']} chunks ({r['chunks_per_sec']}/s)")
+
+    ingester = BulkIngester(admin_id, is_global=True, upsert_size=upsert_size, embed_batch_size=embed_batch_size, on_stored=on_stored)
+    failed = 0
+    if todo:
+        paths = [os.path.join(root, rel) for rel in todo]
+        for prepared in prepare_files(paths, todo, processes):
+            if "error" in prepared:
+                failed += 1
+                files[prepared["name"]]["status"] = "failed"
+                print(f"⚠️ {prepared['name']}: {prepared['error']}")
+                continue
+            ingester.add(prepared, doc_id=files[prepared["name"]]["doc_id"])
+        ingester.finish()
+
+    # Everything stored, including by an earlier interrupted run, is registered together
+    to_register = {rel: e for rel, e in files.items() if e["status"] == "stored"}
+    db = SessionLocal()
+    try:
+        added = register_documents(db, admin_id, [{**e, "name": rel} for rel, e in to_register.items()])
+    finally:
+        db.close()
+    for entry in to_register.values():
+        entry["status"] = "registered"
+    save_state(state_path, state)
+
+    r = ingester.rates()
+    print(f"✅ {r['documents']} docs, {r['pages']} pages, {r['chunks']} chunks in {r['seconds']}s "
+          f"({r['pages_per_sec']} pages/s, {r['chunks_per_sec']} chunks/s); "
+          f"registered {added}, failed {failed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--admin-email", required=True, help="admin the documents are registered to")
+    parser.add_argument("--processes", type=int, default=BULK_PARSE_PROCESSES)
+    parser.add_argument("--upsert-size", type=int, default=BULK_UPSERT_SIZE)
+    parser.add_argument("--embed-batch-size", type=int, default=BULK_EMBED_BATCH_SIZE)
+    parser.add_argument("--state-file", help=f"defaults to <directory>/{STATE_FILE}")
+    args = parser.parse_args()
+    run(args.directory, args.admin_email, args.processes, args.upsert_size, args.embed_batch_size, args.state_file)
@@ -0,0 +1,200 @@
+import io, os, time, uuid, queue, asyncio, threading
+from typing import Any, AsyncIterator, Dict, List
+from dotenv import load_dotenv
+from pypdf import PdfReader
+from .pdf import iter_pdf_chunks, pdf_title
+from .rag import store, embedding_fn, document_meta, bump_corpus_version, INGEST_BATCH_SIZE
+from .extraction_cache import cache, content_hash, EXTRACTION_CACHE_ENABLED
+from .db import SessionLocal
+from .models import Document
+from . import metrics
+
+load_dotenv()
+
+# Chunk batches parsed ahead of the embedder; bounds memory when parsing outruns embedding
+INGEST_PIPELINE_DEPTH = int(os.getenv("INGEST_PIPELINE_DEPTH", "4"))
+# Minimum seconds between progress events while pages are being parsed
+INGEST_PROGRESS_SECONDS = float(os.getenv("INGEST_PROGRESS_SECONDS", "0.25"))
+
+_END = object()
+
+class IngestPipeline:
+    """Ingests one PDF in two overlapping stages and reports progress.
+
+    A parser thread extracts pages and chunks them into batches; an
+    embedder thread embeds and upserts each batch as soon as it arrives,
+    so early chunks are searchable while later pages are still being
+    parsed. The Document row is registered by the pipeline itself, so an
+    upload completes even if the client stops listening.
+
+    Events (dicts) are read with ``events()``: ``started``, repeated
+    ``progress`` (pages, chunks, embedded), then ``done`` or ``error``.
+    """
+
+    def __init__(self, data: bytes, name: str, title: str | None, user_id: int, is_global: bool = True,
+                 batch_size: int = INGEST_BATCH_SIZE, on_done=None):
+        self.data = data
+        self.name = name
+        self.title = title
+        self.user_id = user_id
+        self.is_global = is_global
+        self.batch_size = batch_size
+        self.on_done = on_done
+        self.doc_id = str(uuid.uuid4())
+        self.pages = self.chunks = self.embedded = 0
+        self.started = time.perf_counter()
+        self._batches: "queue.Queue" = queue.Queue(maxsize=INGEST_PIPELINE_DEPTH)
+        self._failed = threading.Event()
+        self._last_progress = 0.0
+        self._loop = None
+        self._events: asyncio.Queue | None = None
+
+    def start(self) -> "IngestPipeline":
+        self._loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue()
+        threading.Thread(target=self._parse, name="ingest-parse", daemon=True).start()
+        threading.Thread(target=self._embed, name="ingest-embed", daemon=True).start()
+        return self
+
+    def _emit(self, event: Dict[str, Any]):
+        try:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, event)
+        except RuntimeError:
+            # Event loop gone; keep ingesting, there's just nobody to tell
+            pass
+
+    def _progress(self, force: bool = False):
+        now = time.perf_counter()
+        if force or now - self._last_progress >= INGEST_PROGRESS_SECONDS:
+            self._last_progress = now
+            self._emit({"event": "progress", "pages": self.pages, "chunks": self.chunks, "embedded": self.embedded})
+
+    def _fail(self, detail: str):
+        if not self._failed.is_set():
+            self._failed.set()
+            metrics.incr("ingest_stream_failed")
+            self._emit({"event": "error", "detail": detail})
+
+    def _parse(self):
+        """Stage 1: pages -> chunks -> batches for the embedder"""
+        parse_started = time.perf_counter()
+        digest = content_hash(self.data)
+        try:
+            cached = cache.get(digest) if EXTRACTION_CACHE_ENABLED else None
+            if cached is not None:
+                metrics.incr("extraction_cache_hit")
+                self.title = self.title or cached.get("pdf_title") or self.name
+                total_pages, chunks = cached["pages"], iter(cached["chunks"])
+            else:
+                reader = PdfReader(io.BytesIO(self.data))
+                embedded_title = pdf_title(reader)
+                self.title = self.title or embedded_title or self.name
+                total_pages = len(reader.pages)
+
+                def on_page(n):
+                    self.pages = n
+                    self._progress()
+                chunks = iter_pdf_chunks(reader, on_page)
+            self._emit({"event": "started", "doc_id": self.doc_id, "title": self.title, "total_pages": total_pages})
+
+            collected: List[Dict[str, Any]] = []
+            batch: List[Dict[str, Any]] = []
+            for chunk in chunks:
+                if self._failed.is_set():
+                    return
+                batch.append(chunk)
+                collected.append(chunk)
+                self.chunks += 1
+                if len(batch) >= self.batch_size:
+                    self._batches.put(batch)
+                    batch = []
+                    self._progress()
+            if batch:
+                self._batches.put(batch)
+            self.pages = total_pages
+            self._progress(force=True)
+
+            if not collected:
+                self._fail("No extractable text found.")
+            elif cached is None and EXTRACTION_CACHE_ENABLED:
+                metrics.incr("extraction_cache_miss")
+                cache.put(digest, {
+                    "name": self.name, "title": embedded_title or self.name, "pdf_title": embedded_title,
+                    "pages": total_pages, "byte_size": len(self.data), "chunks": collected,
+                    "parse_ms": int((time.perf_counter() - parse_started) * 1000),
+                })
+        except Exception as e:
+            self._fail(f"Failed to read PDF: {e}")
+        finally:
+            self._batches.put(_END)
+
+    def _embed(self):
+        """Stage 2: embed and upsert each batch as it arrives, then register the document"""
+        base_meta = None
+        offset = 0
+        while True:
+            batch = self._batches.get()
+            if batch is _END:
+                break
+            if self._failed.is_set():
+                continue
+            try:
+                # The title is settled before the parser queues its first batch
+                base_meta = base_meta or document_meta(self.user_id, self.doc_id, self.title, self.is_global)
+                ids = [f"{self.doc_id}_{offset + i}" for i in range(len(batch))]
+                documents = [c["text"] for c in batch]
+                metadatas = [
+                    {**base_meta, "page_start": c["page_start"], "page_end": c["page_end"], "tokens": c["terms"]}
+                    for c in batch
+                ]
+                store.upsert(ids, embedding_fn(documents), documents, metadatas)
+                offset += len(batch)
+                self.embedded += len(batch)
+                self._progress(force=True)
+            except Exception as e:
+                self._fail(f"Failed to store chunks: {e}")
+
+        if self._failed.is_set():
+            # Don't leave a half-ingested document searchable
+            if offset:
+                try:
+                    store.delete_document(self.doc_id)
+                except Exception as e:
+                    print(f"Error removing partial upload {self.doc_id}: {e}")
+            return
+        self._finish()
+
+    def _finish(self):
+        bump_corpus_version()
+        ingest_ms = int((time.perf_counter() - self.started) * 1000)
+        db = SessionLocal()
+        try:
+            db.add(Document(
+                id=uuid.UUID(self.doc_id), user_id=self.user_id, title=self.title, is_global=self.is_global,
+                chunk_count=self.embedded, byte_size=len(self.data), ingest_ms=ingest_ms,
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._fail(f"Failed to register document: {e}")
+            try:
+                store.delete_document(self.doc_id)
+            except Exception as delete_error:
+                print(f"Error removing unregistered upload {self.doc_id}: {delete_error}")
+            return
+        finally:
+            db.close()
+        if self.on_done:
+            self.on_done(self.doc_id)
+        metrics.observe("ingest_stream_ms", ingest_ms)
+        self._emit({
+            "event": "done", "doc_id": self.doc_id, "title": self.title,
+            "pages": self.pages, "chunks": self.embedded, "seconds": round(ingest_ms / 1000, 2),
+        })
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            event = await self._events.get()
+            yield event
+            if event["event"] in ("done", "error"):
+                return
@@ -0,0 +1,54 @@
+import time, queue, threading
+from typing import Any, Callable, Dict
+from . import metrics
+
+class JobRunner:
+    """One background thread running keyed jobs in submission order.
+
+    Scheduling a key that is already waiting is a no-op, so a burst of
+    triggers (e.g. several ingests) collapses into one run. A key scheduled
+    while it is running is queued again, so the latest state is always
+    picked up.
+    """
+
+    def __init__(self, name: str = "jobs"):
+        self.name = name
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        """Queue ``fn(*args, **kwargs)`` under ``key``; False if already queued"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = lambda: fn(*args, **kwargs)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name=self.name, daemon=True)
+                self._thread.start()
+        self._queue.put(key)
+        return True
+
+    def _work(self):
+        while True:
+            key = self._queue.get()
+            with self._lock:
+                job = self._pending.pop(key, None)
+            if job is None:
+                continue
+            # "summaries:<doc_id>" and the like are reported under their kind
+            kind = key.split(":", 1)[0]
+            start = time.perf_counter()
+            try:
+                job()
+                metrics.incr(f"job_ok.{kind}")
+            except Exception as e:
+                print(f"Background job {key} error: {e}")
+                metrics.incr(f"job_failed.{kind}")
+            metrics.observe(f"job_ms.{kind}", (time.perf_counter() - start) * 1000)
+
+runner = JobRunner()
+
+def schedule(key: str, fn: Callable[..., Any], *args, **kwargs) -> bool:
+    return runner.schedule(key, fn, *args, **kwargs)
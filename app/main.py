@@ -1,24 +1,45 @@
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.orm import Session
-from .db import Base, engine, get_db
-from .models import User, Document, Conversation, UserRole
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import Base, engine, get_db, get_async_db, SessionLocal, pool_status
+from .models import User, Document, Conversation, ConversationArchive, UserRole
 from .schemas import (
     UserCreate, AdminCreate, Token, UserOut, IngestRequest, IngestResponse, 
-    QueryRequest, QueryResponse, Source, ConversationMessage, ConversationHistory,
-    DocumentInfo
+    BulkIngestResponse, QueryRequest, QueryBatchRequest, QueryResponse, Source, ConversationMessage, ConversationHistory,
+    ConversationBulkSave, DocumentInfo
 )
 from .auth import (
-    get_current_user, get_admin_user, hash_password, verify_password, 
-    create_access_token, get_user_by_email, ADMIN_SECRET_KEY
+    get_current_user, get_admin_user, hash_password, verify_password, CachedUser,
+    create_access_token, aget_user_by_email, ADMIN_SECRET_KEY
 )
 from fastapi.security import OAuth2PasswordRequestForm
-from .rag import ingest_text, retrieve, generate_answer, generate_answer_stream
+from .rag import (
+    ingest_text, ingest_chunks, retrieve, generate_answer, generate_answer_stream, delete_document_chunks,
+    answer_batch, corpus_version, GENERATION_MAX_TOKENS, INGEST_BATCH_SIZE
+)
+from .rerank import warmup as warmup_reranker
+from .sse import sse_answer_stream, SSE_HEADERS
+from .streaming import stream_tokens, TOKEN
+from . import metrics, hot_questions, retention
+from .writebehind import writer, save_messages, CONVERSATION_WRITE_BEHIND
+from .pagination import encode_cursor, decode_cursor, page_size
+from .extractive import extract_answer, EXTRACTIVE_ENABLED
+from .summaries import retrieve_summary, schedule_summaries, delete_summaries, SUMMARIES_ENABLED
 from dotenv import load_dotenv
 load_dotenv()
 
-import io, re, uuid
+import io, os, time, uuid, hashlib, zipfile
+from datetime import datetime
+from contextlib import aclosing
 from pypdf import PdfReader
+from .pdf import iter_pdf_chunks, pdf_title
+from .bulk_ingest import BulkIngester, prepare_uploads, register_documents
+from .extraction_cache import extract, lookup, cache as extraction_cache, chat_indexes, EXTRACTION_CACHE_ENABLED
+from .ingest_stream import IngestPipeline
+from rank_bm25 import BM25Okapi
 from typing import List
 from fastapi.responses import StreamingResponse
 import json
@@ -32,7 +53,14 @@ app = FastAPI(title="RAG System with Admin Control")
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    warmup_reranker()
+    hot_questions.start()
+    retention.start()
 
+@app.on_event("shutdown")
+def on_shutdown():
+    # Don't lose queued conversation rows on a clean stop
+    writer.flush()
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,49 +68,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 # ------------- Auth -------------
 @app.post("/auth/register", response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    existing = get_user_by_email(db, payload.email)
+async def register(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await aget_user_by_email(db, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Default role is USER
     user = User(
         email=payload.email, 
-        hashed_password=hash_password(payload.password),
+        hashed_password=await run_in_threadpool(hash_password, payload.password),
         role=UserRole.USER
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 @app.post("/auth/register-admin", response_model=UserOut)
-def register_admin(payload: AdminCreate, db: Session = Depends(get_db)):
+async def register_admin(payload: AdminCreate, db: AsyncSession = Depends(get_async_db)):
     # Verify admin secret key
     if payload.admin_key != ADMIN_SECRET_KEY:
         raise HTTPException(status_code=403, detail="Invalid admin key")
     
-    existing = get_user_by_email(db, payload.email)
+    existing = await aget_user_by_email(db, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user = User(
         email=payload.email, 
-        hashed_password=hash_password(payload.password),
+        hashed_password=await run_in_threadpool(hash_password, payload.password),
         role=UserRole.ADMIN
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 @app.post("/auth/login", response_model=Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user_by_email(db, form.username)
-    if not user or not verify_password(form.password, user.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await aget_user_by_email(db, form.username)
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not user or not await run_in_threadpool(verify_password, form.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     
     token = create_access_token({"sub": str(user.id)})
@@ -93,7 +123,7 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     }
 
 @app.get("/me", response_model=UserOut)
-def me(current_user: User = Depends(get_current_user)):
+def me(current_user: CachedUser = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
@@ -101,11 +131,6 @@ def me(current_user: User = Depends(get_current_user)):
     }
 
 # ------------- Helper functions -------------
-def clean_text(text: str) -> str:
-    text = re.sub(r"-\s*\n", "", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    return text.strip()
-
 def to_uuid_maybe(doc_id: str):
     try:
         return uuid.UUID(doc_id)
@@ -116,11 +141,12 @@ def to_uuid_maybe(doc_id: str):
 @app.post("/admin/ingest", response_model=IngestResponse)
 def admin_ingest(
     req: IngestRequest, 
-    admin_user: User = Depends(get_admin_user), 
+    admin_user: CachedUser = Depends(get_admin_user), 
     db: Session = Depends(get_db)
 ):
     """Admin-only: Ingest text that will be available to all users"""
-    doc_id = ingest_text(
+    started = time.perf_counter()
+    doc_id, chunk_count = ingest_text(
         user_id=admin_user.id, 
         text=req.text, 
         title=req.title,
@@ -130,86 +156,295 @@ def admin_ingest(
         id=to_uuid_maybe(doc_id), 
         user_id=admin_user.id, 
         title=req.title,
-        is_global=True
+        is_global=True,
+        chunk_count=chunk_count,
+        byte_size=len(req.text.encode("utf-8")),
+        ingest_ms=int((time.perf_counter() - started) * 1000)
     )
     db.add(doc)
     db.commit()
+    hot_questions.schedule_refresh()
+    if SUMMARIES_ENABLED:
+        schedule_summaries(str(doc_id))
     return {"doc_id": str(doc_id), "title": req.title}
 
 @app.post("/admin/ingest_pdf", response_model=IngestResponse)
 async def admin_ingest_pdf(
     file: UploadFile = File(...),
     title: str | None = Form(None),
-    admin_user: User = Depends(get_admin_user),
+    admin_user: CachedUser = Depends(get_admin_user),
     db: Session = Depends(get_db),
 ):
     """Admin-only: Upload PDF that will be available to all users"""
     if file.content_type not in ("application/pdf", "application/octet-stream"):
         raise HTTPException(status_code=400, detail="Please upload a PDF file.")
     
+    started = time.perf_counter()
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded.")
     
-    try:
-        reader = PdfReader(io.BytesIO(contents))
-        pages = []
-        for page in reader.pages:
-            try:
-                pages.append(page.extract_text() or "")
-            except Exception:
-                pages.append("")
-        raw_text = "\n\n".join(pages)
-        
-        pdf_title = None
-        if reader.metadata:
-            pdf_title = getattr(reader.metadata, "title", None) or reader.metadata.get("/Title")
-        final_title = title or pdf_title or file.filename
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read PDF: {e}")
-    
-    text = clean_text(raw_text)
-    if not text:
-        raise HTTPException(status_code=400, detail="No extractable text found.")
-    
-    doc_id = ingest_text(
-        user_id=admin_user.id, 
-        text=text, 
-        title=final_title,
-        is_global=True  # Mark as global
-    )
+    # A PDF uploaded before is not parsed again
+    digest, cached = await run_in_threadpool(lookup, contents, file.filename)
+    if cached is not None:
+        final_title = title or cached["title"]
+        def store_chunks():
+            ingester = BulkIngester(admin_user.id, is_global=True, upsert_size=INGEST_BATCH_SIZE)
+            stored = ingester.add(cached, title=final_title)
+            ingester.finish()
+            return stored["doc_id"], stored["chunks"]
+        doc_id, chunk_count = await run_in_threadpool(store_chunks)
+    else:
+        try:
+            reader = await run_in_threadpool(PdfReader, io.BytesIO(contents))
+            embedded_title = pdf_title(reader)
+            final_title = title or embedded_title or file.filename
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to read PDF: {e}")
+        def parse_and_store():
+            # Streamed page by page in INGEST_BATCH_SIZE upserts; only chunk text and terms
+            # are kept, for the extraction cache entry written once the ingest succeeds
+            collected, parse_s = [], 0.0
+            def collect():
+                nonlocal parse_s
+                chunks = iter_pdf_chunks(reader)
+                while True:
+                    # Only time spent parsing, not the embedding done between chunks
+                    t = time.perf_counter()
+                    chunk = next(chunks, None)
+                    parse_s += time.perf_counter() - t
+                    if chunk is None:
+                        return
+                    collected.append(chunk)
+                    yield chunk
+            stored = ingest_chunks(admin_user.id, collect(), title=final_title, is_global=True)
+            if EXTRACTION_CACHE_ENABLED:
+                extraction_cache.put(digest, {
+                    "name": file.filename, "title": embedded_title or file.filename, "pdf_title": embedded_title,
+                    "pages": len(reader.pages), "byte_size": len(contents), "chunks": collected,
+                    "parse_ms": int(parse_s * 1000),
+                })
+            return stored
+        try:
+            doc_id, chunk_count = await run_in_threadpool(parse_and_store)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="No extractable text found.")
     doc = Document(
         id=to_uuid_maybe(doc_id), 
         user_id=admin_user.id, 
         title=final_title,
-        is_global=True
+        is_global=True,
+        chunk_count=chunk_count,
+        byte_size=len(contents),
+        ingest_ms=int((time.perf_counter() - started) * 1000)
     )
     db.add(doc)
     db.commit()
+    hot_questions.schedule_refresh()
+    if SUMMARIES_ENABLED:
+        schedule_summaries(str(doc_id))
     
     return {"doc_id": str(doc_id), "title": final_title}
 
+def after_ingest(doc_id: str):
+    hot_questions.schedule_refresh()
+    if SUMMARIES_ENABLED:
+        schedule_summaries(doc_id)
+
+@app.post("/admin/ingest_pdf_stream")
+async def admin_ingest_pdf_stream(
+    file: UploadFile = File(...),
+    title: str | None = Form(None),
+    admin_user: CachedUser = Depends(get_admin_user),
+):
+    """Admin-only: /admin/ingest_pdf with NDJSON progress.
+
+    Emits `started` (doc_id, title, total_pages), `progress` (pages parsed,
+    chunks created, chunks embedded) as the pipeline advances, then `done`
+    or `error`. Chunks become searchable batch by batch while later pages
+    are still being parsed; the upload finishes even if the client leaves.
+    """
+    if file.content_type not in ("application/pdf", "application/octet-stream"):
+        raise HTTPException(status_code=400, detail="Please upload a PDF file.")
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Empty file uploaded.")
+    
+    pipeline = IngestPipeline(contents, file.filename, title, admin_user.id, is_global=True, on_done=after_ingest).start()
+    
+    async def stream_events():
+        async for event in pipeline.events():
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+# Limits for one bulk request, after ZIPs are expanded
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "500"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def expand_uploads(files: List[UploadFile]) -> List[tuple]:
+    """(name, bytes) for every PDF uploaded directly or inside a ZIP"""
+    pdfs, total = [], 0
+    def take(name: str, data: bytes):
+        nonlocal total
+        total += len(data)
+        if len(pdfs) >= BULK_MAX_FILES or total > BULK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_FILES} PDFs and {BULK_MAX_BYTES} bytes per request")
+        pdfs.append((name, data))
+    for upload in files:
+        name = upload.filename or "upload"
+        data = upload.file.read()
+        if name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(io.BytesIO(data))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{name} is not a valid ZIP")
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                    continue
+                # Check the declared size before inflating anything
+                if total + info.file_size > BULK_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_BYTES} bytes per request")
+                take(os.path.basename(info.filename), archive.read(info))
+        elif data:
+            take(name, data)
+    return pdfs
+
+@app.post("/admin/ingest_bulk", response_model=BulkIngestResponse)
+def admin_ingest_bulk(
+    files: List[UploadFile] = File(...),
+    admin_user: CachedUser = Depends(get_admin_user),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: ingest many PDFs, or ZIPs of PDFs, in one request.
+
+    Files are parsed in a process pool, their chunks embedded and upserted
+    in shared batches, and all Document rows committed in one transaction.
+    Files that can't be read are reported under `failed`; the rest are
+    still ingested.
+    """
+    pdfs = expand_uploads(files)
+    if not pdfs:
+        raise HTTPException(status_code=400, detail="No PDF files uploaded.")
+    
+    ingester = BulkIngester(admin_user.id, is_global=True)
+    failed = []
+    for prepared in prepare_uploads(pdfs):
+        if "error" in prepared:
+            failed.append({"name": prepared["name"], "error": prepared["error"]})
+        else:
+            ingester.add(prepared)
+    stored = ingester.finish()
+    register_documents(db, admin_user.id, stored)
+    if stored:
+        hot_questions.schedule_refresh()
+        if SUMMARIES_ENABLED:
+            for doc in stored:
+                schedule_summaries(doc["doc_id"])
+    
+    return {
+        "documents": [{"doc_id": d["doc_id"], "title": d["title"]} for d in stored],
+        "failed": failed,
+        **{k: v for k, v in ingester.rates().items() if k != "documents"},
+    }
+
+DOCUMENT_SORTS = ("created_at", "title")
+
+def catalog_etag(db: Session, params: str) -> str:
+    """Changes whenever a global document is added or removed.
+
+    The corpus version is read before the table so a document committed
+    in between still changes the tag on the next request.
+    """
+    version = corpus_version()
+    count, latest = db.query(func.count(Document.id), func.max(Document.created_at)) \
+        .filter(Document.is_global == True).one()
+    raw = f"{version}:{count}:{latest}:{params}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
 @app.get("/admin/documents", response_model=List[DocumentInfo])
 def list_admin_documents(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    admin_user: CachedUser = Depends(get_admin_user),
+    db: Session = Depends(get_db),
+    limit: int = 50,
+    cursor: str | None = None,
+    title: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    sort: str = "created_at",
+    order: str = "desc"
 ):
-    """Admin-only: List all documents uploaded by admins"""
-    docs = db.query(Document).filter(Document.is_global == True).all()
+    """Admin-only: one page of admin-uploaded documents.
+
+    The cursor for the next page is returned in the X-Next-Cursor header
+    (absent on the last page). Responses carry an ETag; a matching
+    If-None-Match gets 304 without the catalog being read.
+    """
+    if sort not in DOCUMENT_SORTS or order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"sort must be one of {DOCUMENT_SORTS}, order asc or desc")
+    limit = page_size(limit)
+    
+    etag = catalog_etag(db, str(request.query_params))
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    key = Document.created_at if sort == "created_at" else func.coalesce(Document.title, "")
+    query = db.query(Document).filter(Document.is_global == True)
+    if title:
+        query = query.filter(Document.title.ilike(f"%{title}%"))
+    if created_after:
+        query = query.filter(Document.created_at >= created_after)
+    if created_before:
+        query = query.filter(Document.created_at < created_before)
+    if cursor:
+        try:
+            last_key, last_id = decode_cursor(cursor)
+            last_id = uuid.UUID(last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = tuple_(key, Document.id) > tuple_(last_key, last_id) if order == "asc" \
+            else tuple_(key, Document.id) < tuple_(last_key, last_id)
+        query = query.filter(after)
+    ordering = (key.asc(), Document.id.asc()) if order == "asc" else (key.desc(), Document.id.desc())
+    docs = query.order_by(*ordering).limit(limit + 1).all()
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            last.created_at if sort == "created_at" else (last.title or ""), last.id
+        )
+    response.headers["ETag"] = etag
     return [
         {
             "id": str(doc.id),
             "title": doc.title,
             "uploaded_by": "Admin",
-            "created_at": doc.created_at
+            "created_at": doc.created_at,
+            "chunk_count": doc.chunk_count,
+            "byte_size": doc.byte_size,
+            "ingest_ms": doc.ingest_ms
         }
         for doc in docs
     ]
 
+@app.get("/admin/documents/count")
+def count_admin_documents(
+    admin_user: CachedUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Admin-only: catalog totals in one aggregate query"""
+    count, chunks, size = db.query(
+        func.count(Document.id), func.sum(Document.chunk_count), func.sum(Document.byte_size)
+    ).filter(Document.is_global == True).one()
+    return {"count": count, "chunks": chunks or 0, "bytes": size or 0}
+
 @app.delete("/admin/document/{doc_id}")
 def delete_document(
     doc_id: str,
-    admin_user: User = Depends(get_admin_user),
+    admin_user: CachedUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     """Admin-only: Delete a document"""
@@ -219,91 +454,338 @@ def delete_document(
     
     # Delete from ChromaDB
     try:
-        from .rag import collection
-        # Delete all chunks for this document
-        collection.delete(where={"doc_id": doc_id})
+        # Delete all chunks for this document, and its summaries
+        delete_document_chunks(doc_id)
+        delete_summaries(doc_id)
     except Exception as e:
         print(f"Error deleting from ChromaDB: {e}")
     
     # Delete from Postgres
     db.delete(doc)
     db.commit()
+    hot_questions.schedule_refresh()
     
     return {"status": "deleted", "doc_id": doc_id}
 
+@app.post("/admin/document/{doc_id}/summarize")
+def summarize_document_endpoint(
+    doc_id: str,
+    admin_user: CachedUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Admin-only: (re)build a document's section and document summaries in the background"""
+    if not SUMMARIES_ENABLED:
+        raise HTTPException(status_code=400, detail="Document summaries are disabled (SUMMARIES_ENABLED=false)")
+    doc = db.query(Document).filter(Document.id == to_uuid_maybe(doc_id)).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "scheduled" if schedule_summaries(str(doc.id)) else "already scheduled", "doc_id": doc_id}
+
+@app.post("/admin/conversations/retention")
+def run_retention_endpoint(admin_user: CachedUser = Depends(get_admin_user)):
+    """Admin-only: archive and purge old conversations now instead of at the next interval"""
+    return {"status": "scheduled" if retention.schedule_retention() else "already scheduled"}
+
+@app.get("/admin/metrics")
+def get_metrics(admin_user: CachedUser = Depends(get_admin_user)):
+    """Admin-only: this worker's counters (streams started/completed/cancelled, tokens saved, ...)"""
+    return {**metrics.snapshot(), "db_pool": pool_status()}
+
 # ------------- User Endpoints (Query) -------------
+def has_private_documents(db: Session, user_id: int) -> bool:
+    return db.query(Document.id).filter(Document.user_id == user_id, Document.is_global == False).first() is not None
+
+def precomputed_answer(user_id: int, query: str, top_k: int):
+    """Answer that needs no retrieval pipeline or LLM call.
+
+    Hot questions are built over the global documents, so they are skipped
+    for users with private ones. With SUMMARIES_ENABLED, summary-type
+    questions are answered from the closest precomputed document or
+    section summary.
+    """
+    hot_questions.record(query)
+    entry = hot_questions.lookup(query, top_k)
+    if entry is not None:
+        # Only hot hits need the database
+        with SessionLocal() as db:
+            private = has_private_documents(db, user_id)
+        if not private:
+            return {**entry, "path": "precomputed"}
+    hits = retrieve_summary(query, user_id) if SUMMARIES_ENABLED else []
+    if hits:
+        title = hits[0]["meta"].get("title")
+        answer = f"**{title}**\n\n{hits[0]['chunk']}" if title else hits[0]["chunk"]
+        return {"answer": answer, "hits": hits, "path": "summary"}
+    return None
+
+@app.get("/rag/hot_questions")
+def get_hot_questions(current_user: CachedUser = Depends(get_current_user)):
+    """Suggested questions (configured, then most asked) and whether their answers are precomputed"""
+    return {"questions": hot_questions.status()}
+
+def source_dict(h, with_chunk: bool = True) -> dict:
+    return {
+        "doc_id": h["meta"]["doc_id"], "score": h["score"],
+        "page_start": h["meta"].get("page_start"), "page_end": h["meta"].get("page_end"),
+        **({"chunk": h["chunk"]} if with_chunk else {})
+    }
+
+def fast_path_answer(req: QueryRequest, hits):
+    """Extractive answer when enabled for this request and retrieval is decisive"""
+    enabled = EXTRACTIVE_ENABLED if req.fast_path is None else req.fast_path
+    return extract_answer(req.query, hits) if enabled and hits else None
+
+def record_path(path: str, started: float):
+    """Hit rate and latency (to the first answer text) per answer path"""
+    metrics.incr(f"answer_path.{path}")
+    metrics.observe(f"answer_latency_ms.{path}", (time.perf_counter() - started) * 1000)
+
+def timed_tokens(tokens, path: str, started: float):
+    """Pass tokens through, recording the path's latency at the first one"""
+    first = True
+    for token in tokens:
+        if first:
+            record_path(path, started)
+            first = False
+        yield token
+
 @app.post("/rag/query", response_model=QueryResponse)
-def rag_query(req: QueryRequest, current_user: User = Depends(get_current_user)):
+def rag_query(req: QueryRequest, current_user: CachedUser = Depends(get_current_user)):
     """All users can query admin-uploaded documents"""
-    hits = retrieve(query=req.query, user_id=current_user.id, top_k=req.top_k)
-    if not hits:
-        return {"answer": "I don't know.", "sources": []}
-    answer = generate_answer(req.query, hits)
-    sources = [Source(doc_id=h["meta"]["doc_id"], score=h["score"], chunk=h["chunk"]) for h in hits]
-    return {"answer": answer, "sources": sources}
+    started = time.perf_counter()
+    hot = precomputed_answer(current_user.id, req.query, req.top_k)
+    if hot:
+        hits, answer, path = hot["hits"], hot["answer"], hot["path"]
+    else:
+        hits = retrieve(query=req.query, user_id=current_user.id, top_k=req.top_k)
+        if not hits:
+            record_path("empty", started)
+            return {"answer": "I don't know.", "sources": [], "path": "empty"}
+        fast = fast_path_answer(req, hits)
+        if fast:
+            # The span's chunk leads the sources
+            answer, path = fast["answer"], "extractive"
+            hits = [fast["hit"]] + [h for h in hits if h is not fast["hit"]]
+        else:
+            answer, path = generate_answer(req.query, hits), "llm"
+    record_path(path, started)
+    sources = [Source(**source_dict(h)) for h in hits]
+    return {"answer": answer, "sources": sources, "path": path}
+
+def persist_exchange(req: QueryRequest, user_id: int, answer: str):
+    if req.persist:
+        save_messages(user_id, [("user", req.query), ("assistant", answer)], req.thread_id)
 
 @app.post("/rag/query_stream")
-def rag_query_stream(req: QueryRequest, current_user: User = Depends(get_current_user)):
+async def rag_query_stream(
+    req: QueryRequest, request: Request, current_user: CachedUser = Depends(get_current_user)
+):
     """Streaming query for all users"""
-    hits = retrieve(query=req.query, user_id=current_user.id, top_k=req.top_k)
+    started = time.perf_counter()
+    hot = await run_in_threadpool(precomputed_answer, current_user.id, req.query, req.top_k)
+    if hot:
+        record_path(hot["path"], started)
+        def precomputed_stream():
+            yield json.dumps({"chunk": hot["answer"]}) + "\n"
+            sources = [{"doc_id": h["meta"]["doc_id"], "score": h["score"], "chunk": h["chunk"]} for h in hot["hits"]]
+            yield json.dumps({"sources": sources, "complete": True}) + "\n"
+            persist_exchange(req, current_user.id, hot["answer"])
+        return StreamingResponse(precomputed_stream(), media_type="application/x-ndjson")
+    
+    hits = await run_in_threadpool(retrieve, query=req.query, user_id=current_user.id, top_k=req.top_k)
     if not hits:
+        record_path("empty", started)
         def empty_stream():
-            yield json.dumps({"answer": "I don't know.", "sources": []})
-        return StreamingResponse(empty_stream(), media_type="application/json")
+            yield json.dumps({"chunk": "I don't know."}) + "\n"
+            yield json.dumps({"sources": [], "complete": True}) + "\n"
+            persist_exchange(req, current_user.id, "I don't know.")
+        return StreamingResponse(empty_stream(), media_type="application/x-ndjson")
     
-    def stream_response():
-        try:
-            for chunk in generate_answer_stream(req.query, hits):
-                yield json.dumps({"chunk": chunk}) + "\n"
-            
-            sources = [{"doc_id": h["meta"]["doc_id"], "score": h["score"], "chunk": h["chunk"]} for h in hits]
-            yield json.dumps({"sources": sources, "complete": True}) + "\n"
-        except Exception as e:
-            answer = generate_answer(req.query, hits)
-            yield json.dumps({"chunk": answer}) + "\n"
+    fast = fast_path_answer(req, hits)
+    
+    async def stream_response():
+        answer_parts = []
+        if fast:
+            record_path("extractive", started)
+            answer_parts.append(fast["answer"])
+            yield json.dumps({"chunk": fast["answer"], "extractive": True, "source": source_dict(fast["hit"], with_chunk=False)}) + "\n"
+        
+        if not fast or req.elaborate:
+            if fast:
+                answer_parts.append("\n\n")
+                yield json.dumps({"chunk": "\n\n"}) + "\n"
+            # Generation is abandoned (and its slot freed) if the client disconnects
+            tokens = stream_tokens(
+                request, lambda cancel: generate_answer_stream(req.query, hits, cancel=cancel),
+                endpoint="query_stream", max_tokens=GENERATION_MAX_TOKENS
+            )
+            first = not fast
+            async with aclosing(tokens):
+                async for kind, value in tokens:
+                    if first:
+                        record_path("llm", started)
+                        first = False
+                    if kind == TOKEN:
+                        answer_parts.append(value)
+                        yield json.dumps({"chunk": value}) + "\n"
+                    else:
+                        answer = await run_in_threadpool(generate_answer, req.query, hits)
+                        answer_parts.append(answer)
+                        yield json.dumps({"chunk": answer}) + "\n"
+        
+        sources = [{"doc_id": h["meta"]["doc_id"], "score": h["score"], "chunk": h["chunk"]} for h in hits]
+        yield json.dumps({"sources": sources, "complete": True}) + "\n"
+        # Not reached when the client disconnects mid-answer, so partial answers aren't saved
+        await run_in_threadpool(persist_exchange, req, current_user.id, "".join(answer_parts))
     
     return StreamingResponse(stream_response(), media_type="application/x-ndjson")
 
+@app.post("/rag/query_sse")
+async def rag_query_sse(
+    req: QueryRequest, request: Request, current_user: CachedUser = Depends(get_current_user)
+):
+    """Server-Sent Events query: a `sources` event as soon as retrieval is done,
+    then `token` events while the model writes, then `done`. A fast-path
+    answer arrives as an `extractive` event right after the sources."""
+    started = time.perf_counter()
+    hot = await run_in_threadpool(precomputed_answer, current_user.id, req.query, req.top_k)
+    hits = hot["hits"] if hot else await run_in_threadpool(retrieve, query=req.query, user_id=current_user.id, top_k=req.top_k)
+    sources = [source_dict(h) for h in hits]
+    fast = None if hot else fast_path_answer(req, hits)
+    preface = []
+    # Answers already in hand skip GenerationStream, so they never queue for a generation slot
+    make_tokens, answer = None, None
+    if hot:
+        record_path(hot["path"], started)
+        answer = hot["answer"]
+    elif fast:
+        record_path("extractive", started)
+        preface.append(("extractive", {"text": fast["answer"], "source": source_dict(fast["hit"], with_chunk=False)}))
+        if req.elaborate:
+            make_tokens = lambda cancel: generate_answer_stream(req.query, hits, cancel=cancel)
+    elif hits:
+        make_tokens = lambda cancel: timed_tokens(generate_answer_stream(req.query, hits, cancel=cancel), "llm", started)
+    else:
+        record_path("empty", started)
+        answer = "I don't know."
+    return StreamingResponse(
+        sse_answer_stream(request, sources, make_tokens, max_tokens=GENERATION_MAX_TOKENS, preface=preface, answer=answer),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "1000"))
+
+@app.post("/rag/query_batch")
+def rag_query_batch(req: QueryBatchRequest, current_user: CachedUser = Depends(get_current_user)):
+    """Answer many queries in one request; one NDJSON line per query, in completion order"""
+    if len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    
+    def stream_results():
+        started = time.perf_counter()
+        for index, answer, hits in answer_batch(req.queries, current_user.id, top_k=req.top_k):
+            sources = [source_dict(h, with_chunk=req.include_chunks) for h in hits]
+            yield json.dumps({"index": index, "query": req.queries[index], "answer": answer, "sources": sources}) + "\n"
+        metrics.incr("batch_queries", len(req.queries))
+        metrics.observe("batch_ms", (time.perf_counter() - started) * 1000)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 # ------------- Conversations -------------
+MAX_BULK_MESSAGES = int(os.getenv("MAX_BULK_MESSAGES", "500"))
+
 @app.post("/conversations/save")
 def save_conversation(
     message: ConversationMessage,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    conv = Conversation(
-        user_id=current_user.id,
-        role=message.role,
-        content=message.content
-    )
-    db.add(conv)
-    db.commit()
-    return {"status": "saved"}
+    """Save one message. With write-behind on, the row is queued and committed
+    within WRITE_BEHIND_FLUSH_MS; "queued" is not yet durable (see writebehind.py)."""
+    save_messages(current_user.id, [(message.role, message.content)], message.thread_id, db=db)
+    return {"status": "queued" if CONVERSATION_WRITE_BEHIND else "saved"}
+
+@app.post("/conversations/save_bulk")
+async def save_conversation_bulk(
+    payload: ConversationBulkSave,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Save several messages in one transaction, e.g. a question and its answer"""
+    if len(payload.messages) > MAX_BULK_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_MESSAGES} messages per request")
+    # Anything this user still has queued goes first, keeping history in order
+    await run_in_threadpool(writer.flush, current_user.id)
+    now = datetime.utcnow()
+    db.add_all([
+        Conversation(
+            user_id=current_user.id, thread_id=m.thread_id or payload.thread_id,
+            role=m.role, content=m.content, created_at=now
+        )
+        for m in payload.messages
+    ])
+    await db.commit()
+    return {"status": "saved", "count": len(payload.messages)}
 
 @app.get("/conversations/history", response_model=ConversationHistory)
-def get_conversation_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    limit: int = 50
+async def get_conversation_history(
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = 50,
+    before: str | None = None,
+    thread_id: str | None = None
 ):
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(Conversation.created_at.desc()).limit(limit).all()
+    """The newest `limit` messages (of one thread, if given), oldest first.
+
+    Pages walk backwards with a keyset cursor on (created_at, id), so each
+    page is an index range scan however long the history is.
+    """
+    limit = page_size(limit)
+    # Read-your-writes: commit this user's queued messages first
+    await run_in_threadpool(writer.flush, current_user.id)
+    stmt = select(Conversation.id, Conversation.thread_id, Conversation.role, Conversation.content, Conversation.created_at) \
+        .where(Conversation.user_id == current_user.id)
+    if thread_id is not None:
+        stmt = stmt.where(Conversation.thread_id == thread_id)
+    if before:
+        try:
+            created_at, row_id = decode_cursor(before)
+            row_id = int(row_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(created_at, row_id))
+    # One extra row tells whether an older page exists
+    result = await db.execute(
+        stmt.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
     
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
     messages = [
-        ConversationMessage(role=c.role, content=c.content)
-        for c in reversed(conversations)
+        ConversationMessage(role=r.role, content=r.content, thread_id=r.thread_id)
+        for r in reversed(rows)
     ]
-    return {"messages": messages}
+    return {"messages": messages, "next_cursor": next_cursor}
 
 @app.delete("/conversations/clear")
-def clear_conversations(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def clear_conversations(
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    thread_id: str | None = None
 ):
-    db.query(Conversation).filter(Conversation.user_id == current_user.id).delete()
-    db.commit()
-    return {"status": "cleared"}
+    """Delete the user's history, or only one thread of it, including archived messages"""
+    await run_in_threadpool(writer.discard, current_user.id, thread_id)
+    deleted = 0
+    for model in (Conversation, ConversationArchive):
+        criteria = [model.user_id == current_user.id]
+        if thread_id is not None:
+            criteria.append(model.thread_id == thread_id)
+        deleted += await retention.delete_in_batches(db, model, *criteria)
+    return {"status": "cleared", "deleted": deleted}
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -321,36 +803,27 @@ async def chat_upload_pdf(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF.")
 
     session_id = str(uuid.uuid4())
+    contents = await file.read()
     
-    try:
-        contents = await file.read()
-        reader = PdfReader(io.BytesIO(contents))
-        
-        # Extract text
-        raw_text = "\n\n".join([page.extract_text() or "" for page in reader.pages])
-        cleaned_text = clean_text(raw_text)
-        
-        if not cleaned_text:
-            raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
-            
-        # Chunk the text using your existing RAG function
-        from .rag import chunk_text
-        chunks = chunk_text(cleaned_text)
-        
-        # Store in our in-memory session store
-        chat_sessions[session_id] = {
-            "title": file.filename,
-            "chunks": chunks
-        }
-        
-        return {"session_id": session_id, "filename": file.filename}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {e}")
+    # The same handbook uploaded into many sessions is parsed and indexed once
+    digest, prepared = await run_in_threadpool(extract, contents, file.filename)
+    if "error" in prepared:
+        raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
+    
+    def build_index():
+        # Analyzed once here so queries only tokenize the question
+        chunks = [c["text"] for c in prepared["chunks"]]
+        return {"chunks": chunks, "bm25": BM25Okapi([c["terms"].split() for c in prepared["chunks"]])}
+    index = await run_in_threadpool(chat_indexes.get_or_build, digest, build_index)
+    
+    # Sessions on the same PDF share chunks and BM25 index; both are read-only
+    chat_sessions[session_id] = {"title": file.filename, **index}
+    return {"session_id": session_id, "filename": file.filename}
 
 
 @app.post("/chat/query")
 async def chat_query(
+    request: Request,
     query: str = Form(...),
     session_id: str = Form(...),
     top_k: int = Form(5)
@@ -366,14 +839,9 @@ async def chat_query(
     chunks = session_data["chunks"]
     
     # --- Simplified In-Memory RAG Pipeline ---
-    from rank_bm25 import BM25Okapi
-    from .rag import normalize_text
+    from .analyzer import analyzer
 
-    tokenized_docs = [normalize_text(doc).split() for doc in chunks]
-    bm25 = BM25Okapi(tokenized_docs)
-    
-    tokenized_query = normalize_text(query).split()
-    doc_scores = bm25.get_scores(tokenized_query)
+    doc_scores = session_data["bm25"].get_scores(analyzer.tokens(query))
     
     # Get top_k chunks
     top_indices = sorted(range(len(doc_scores)), key=lambda i: doc_scores[i], reverse=True)[:top_k]
@@ -387,19 +855,22 @@ async def chat_query(
         return StreamingResponse(empty_stream(), media_type="application/x-ndjson")
 
     # Generate Answer (Streaming)
-    from .rag import generate_answer_stream
-    
-    def stream_response():
-        try:
-            # Stream the answer chunks
-            for chunk in generate_answer_stream(query, hits):
-                yield json.dumps({"chunk": chunk}) + "\n"
-            
-            # Finally, yield the sources
-            sources = [{"doc_id": "session_doc", "score": h["score"], "chunk": h["chunk"]} for h in hits[:3]]
-            yield json.dumps({"sources": sources, "complete": True}) + "\n"
-        except Exception as e:
-            print(f"Streaming error: {e}")
-            yield json.dumps({"chunk": "Sorry, I encountered an error generating the response.", "complete": True}) + "\n"
+    async def stream_response():
+        tokens = stream_tokens(
+            request, lambda cancel: generate_answer_stream(query, hits, cancel=cancel),
+            endpoint="chat_query", max_tokens=GENERATION_MAX_TOKENS
+        )
+        async with aclosing(tokens):
+            async for kind, value in tokens:
+                if kind == TOKEN:
+                    # Stream the answer chunks
+                    yield json.dumps({"chunk": value}) + "\n"
+                else:
+                    yield json.dumps({"chunk": "Sorry, I encountered an error generating the response.", "complete": True}) + "\n"
+                    return
+        
+        # Finally, yield the sources
+        sources = [{"doc_id": "session_doc", "score": h["score"], "chunk": h["chunk"]} for h in hits[:3]]
+        yield json.dumps({"sources": sources, "complete": True}) + "\n"
 
-    return StreamingResponse(stream_response(), media_type="application/x-ndjson")
\ No newline at end of file
+    return StreamingResponse(stream_response(), media_type="application/x-ndjson")
@@ -0,0 +1,39 @@
+import time, threading
+from typing import Any, Dict
+
+# In-process counters; each worker reports its own since startup
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+_started = time.time()
+
+def incr(name: str, value: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def gauge(name: str, delta: float):
+    """Adjust a level such as in-flight requests"""
+    with _lock:
+        _gauges[name] = _gauges.get(name, 0) + delta
+
+def observe(name: str, value: float):
+    """Record one sample (count, sum, max) of a duration or size"""
+    with _lock:
+        t = _timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        t["count"] += 1
+        t["sum"] += value
+        t["max"] = max(t["max"], value)
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        timings = {
+            name: {**t, "avg": t["sum"] / t["count"] if t["count"] else 0.0}
+            for name, t in _timings.items()
+        }
+        return {
+            "uptime_s": round(time.time() - _started, 1),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": timings,
+        }
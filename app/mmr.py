@@ -0,0 +1,47 @@
+import os
+from typing import List
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+# 1.0 ranks purely by relevance, 0.0 purely by novelty
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Maximal Marginal Relevance over a candidate embedding matrix.
+
+    ``relevance`` holds one score per candidate (any scale; it is min-max
+    normalised) and ``embeddings`` the matching rows. All pairwise
+    similarities come from a single matrix product and the running
+    max-similarity to the selected set is updated with one vector op per
+    pick. Returns candidate indices in selection order.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    rel = np.asarray(relevance, dtype=np.float32)
+    spread = rel.max() - rel.min()
+    rel = (rel - rel.min()) / spread if spread > 0 else np.ones_like(rel)
+
+    X = np.asarray(embeddings, dtype=np.float32)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    sim = X @ X.T
+
+    selected = [int(np.argmax(rel))]
+    max_sim = sim[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    for _ in range(k - 1):
+        scores = lambda_mult * rel - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(max_sim, sim[pick], out=max_sim)
+
+    return selected
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text, Boolean, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from .db import Base
@@ -25,11 +25,42 @@ class Document(Base):
     title = Column(String, nullable=True)
     is_global = Column(Boolean, default=False, nullable=False)  # True for admin uploads
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Recorded at ingest; None for documents ingested before these existed
+    chunk_count = Column(Integer, nullable=True)
+    byte_size = Column(BigInteger, nullable=True)
+    ingest_ms = Column(Integer, nullable=True)
+    # Catalog pages walk (created_at, id) within the global documents
+    __table_args__ = (
+        Index("ix_documents_global_created_id", "is_global", "created_at", "id"),
+    )
 
 class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    thread_id = Column(String(64), nullable=True)  # None for messages saved before threads existed
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # History pages walk these newest-first: (created_at, id) is the keyset cursor
+    __table_args__ = (
+        Index("ix_conversations_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_conversations_user_thread_created_id", "user_id", "thread_id", "created_at", "id"),
+        # Lets the retention job find the oldest rows without scanning every user
+        Index("ix_conversations_created_at", "created_at"),
+    )
+
+class ConversationArchive(Base):
+    """Conversation rows past CONVERSATION_RETENTION_DAYS, moved out of the hot table"""
+    __tablename__ = "conversations_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id the row had in conversations
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    thread_id = Column(String(64), nullable=True)
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (
+        Index("ix_conversations_archive_user_created", "user_id", "created_at"),
+        Index("ix_conversations_archive_archived_at", "archived_at"),
+    )
\ No newline at end of file
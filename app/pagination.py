@@ -0,0 +1,24 @@
+import base64, json
+from datetime import datetime
+from typing import Any, Tuple
+
+# Largest page any listing endpoint returns
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(key: datetime | str, row_id: Any) -> str:
+    """Opaque keyset cursor for the row a page ended on: its sort key and id"""
+    tagged = ["t", key.isoformat()] if isinstance(key, datetime) else ["s", str(key)]
+    raw = json.dumps(tagged + [str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime | str, str]:
+    """(sort key, id) from encode_cursor; ValueError if it wasn't made there"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, key, row_id = json.loads(raw)
+        return (datetime.fromisoformat(key) if kind == "t" else key), row_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
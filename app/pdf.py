@@ -0,0 +1,64 @@
+"""PDF text extraction, kept free of model and database imports so it can
+run in worker processes."""
+import io, re, time
+from typing import Any, Callable, Dict, Iterator, List
+from pypdf import PdfReader
+from .chunking import iter_chunks
+from .analyzer import analyzer
+
+def clean_text(text: str) -> str:
+    text = re.sub(r"-\s*\n", "", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+def iter_pdf_pages(reader: PdfReader) -> Iterator[str]:
+    """Extract and clean PDF pages lazily so only one page is held at a time"""
+    for page in reader.pages:
+        try:
+            yield clean_text(page.extract_text() or "")
+        except Exception:
+            yield ""
+
+def pdf_title(reader: PdfReader) -> str | None:
+    if reader.metadata:
+        return getattr(reader.metadata, "title", None) or reader.metadata.get("/Title")
+    return None
+
+def iter_pdf_chunks(reader: PdfReader, on_page: Callable[[int], None] | None = None) -> Iterator[Dict[str, Any]]:
+    """Chunks with their BM25 terms, produced as pages are extracted.
+
+    on_page is called with the running page count after each page, so a
+    caller can report parsing progress while chunks are still flowing.
+    """
+    def pages():
+        for n, text in enumerate(iter_pdf_pages(reader), start=1):
+            yield text
+            if on_page:
+                on_page(n)
+    for chunk in iter_chunks(pages()):
+        yield {
+            "text": chunk["text"], "page_start": chunk["page_start"], "page_end": chunk["page_end"],
+            "terms": " ".join(analyzer.tokens(chunk["text"])),
+        }
+
+def prepare_pdf(data: bytes, name: str) -> Dict[str, Any]:
+    """Parse and chunk one PDF: everything ingest does short of embedding.
+
+    Returns title, page and byte counts, and chunks with their BM25 terms,
+    or an "error" when the file can't be read or has no text. Module-level
+    and picklable so a process pool can run it.
+    """
+    start = time.perf_counter()
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        embedded_title = pdf_title(reader)
+        chunks: List[Dict[str, Any]] = list(iter_pdf_chunks(reader))
+    except Exception as e:
+        return {"name": name, "error": f"Failed to read PDF: {e}"}
+    if not chunks:
+        return {"name": name, "error": "No extractable text found."}
+    return {
+        "name": name, "title": embedded_title or name, "pdf_title": embedded_title,
+        "pages": len(reader.pages), "byte_size": len(data), "chunks": chunks,
+        "parse_ms": int((time.perf_counter() - start) * 1000),
+    }
@@ -1,27 +1,50 @@
-import os, uuid, re
-from typing import List, Dict, Any
+import os, uuid, time, threading
+from typing import Iterable, Iterator, List, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import chromadb
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from dotenv import load_dotenv
 import google.generativeai as genai
 from rank_bm25 import BM25Okapi
 import numpy as np
+from .chunking import iter_chunks, EMBEDDING_MODEL, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from .rerank import rerank, RERANK_ENABLED, RERANK_KEEP
+from .mmr import mmr_select, MMR_ENABLED, MMR_LAMBDA
+from .analyzer import analyzer, LEXICON
+from .fusion import weighted_rrf, FUSION_METHODS
+from .vectorstore import make_store, CHROMA_PATH
+from .streaming import generation_slots
 
 load_dotenv()
 
-CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_data")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+BM25_POOL_SIZE = int(os.getenv("BM25_POOL_SIZE", "100"))
+# Per-request retrieval budget; reranking only spends what is left of it
+RETRIEVAL_BUDGET_MS = float(os.getenv("RETRIEVAL_BUDGET_MS", "300"))
+MAX_QUERY_VARIANTS = int(os.getenv("MAX_QUERY_VARIANTS", "6"))
+# Fusion weight of synonym rewrites relative to the user's own wording
+EXPANSION_WEIGHT = float(os.getenv("EXPANSION_WEIGHT", "0.5"))
+# "rrf" (weighted reciprocal rank), "combsum" or "combmnz" (normalised scores)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf").lower()
+# Fused hits handed to rerank/MMR before the final top_k cut
+CANDIDATE_POOL_SIZE = int(os.getenv("CANDIDATE_POOL_SIZE", "16"))
+GENERATION_MAX_TOKENS = int(os.getenv("GENERATION_MAX_TOKENS", "700"))
+# Touched on every ingest/delete so caches in any worker can tell the corpus changed
+CORPUS_VERSION_FILE = os.getenv("CORPUS_VERSION_FILE", os.path.join(CHROMA_PATH, "corpus_version"))
+# Batch queries: answers generated at once, and queries per shared retrieval pass
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RETRIEVAL_SIZE = int(os.getenv("BATCH_RETRIEVAL_SIZE", "32"))
 
 # Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-2.0-flash')
 
 # Embeddings
-embedding_fn = SentenceTransformerEmbeddingFunction(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embedding_fn = SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL)
 
-client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = client.get_or_create_collection(name="docs", embedding_function=embedding_fn)
+# Vector store: Chroma by default, or the memory-mapped backend (VECTOR_STORE=mmap)
+store = make_store(embedding_function=embedding_fn)
 
 def get_current_date_info() -> Dict[str, str]:
     """Get current date information for context"""
@@ -34,190 +57,273 @@ def get_current_date_info() -> Dict[str, str]:
         "year": now.strftime("%Y"),  # 2025
     }
 
-def chunk_text(text: str, chunk_size: int = 600, overlap: int = 100) -> List[str]:
-    """Smart chunking that preserves paragraph structure"""
-    text = text.strip()
-    if not text:
-        return []
-    
-    sections = re.split(r'\n\s*\n', text)
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for section in sections:
-        section = section.strip()
-        if not section:
-            continue
-            
-        section_size = len(section)
-        
-        if current_size + section_size > chunk_size and current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
-            current_chunk = [current_chunk[-1]] if len(current_chunk) > 1 else []
-            current_size = len(current_chunk[0]) if current_chunk else 0
-        
-        current_chunk.append(section)
-        current_size += section_size
-    
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
-    return [c.strip() for c in chunks if c.strip()]
+def corpus_version() -> int:
+    try:
+        return os.stat(CORPUS_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
 
-def ingest_text(user_id: int, text: str, title: str | None = None, doc_id: str | None = None, is_global: bool = False) -> str:
-    """Ingest text with global flag for admin uploads"""
+def bump_corpus_version():
+    os.makedirs(os.path.dirname(CORPUS_VERSION_FILE) or ".", exist_ok=True)
+    tmp = f"{CORPUS_VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, CORPUS_VERSION_FILE)
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Sentence-aware chunking sized in embedding-model tokens"""
+    return [c["text"] for c in iter_chunks([text.strip()], max_tokens=max_tokens, overlap_tokens=overlap)]
+
+def document_meta(user_id: int, doc_id: str, title: str | None, is_global: bool) -> Dict[str, Any]:
+    """Metadata shared by every chunk of a document"""
+    return {
+        "user_id": str(user_id) if not is_global else "global",
+        "doc_id": doc_id,
+        "title": title or "",
+        "is_global": str(is_global),
+        "uploaded_by": str(user_id)
+    }
+
+def ingest_chunks(user_id: int, chunks: Iterable[Dict[str, Any]], title: str | None = None, doc_id: str | None = None, is_global: bool = False) -> Tuple[str, int]:
+    """Ingest chunks carrying their BM25 terms, upserting in fixed-size batches; returns (doc_id, chunk count)"""
     doc_id = doc_id or str(uuid.uuid4())
-    chunks = chunk_text(text)
-    if not chunks:
+    base_meta = document_meta(user_id, doc_id, title, is_global)
+
+    count = 0
+    ids, documents, metadatas = [], [], []
+    for chunk in chunks:
+        ids.append(f"{doc_id}_{count}")
+        documents.append(chunk["text"])
+        metadatas.append({
+            **base_meta,
+            "page_start": chunk["page_start"],
+            "page_end": chunk["page_end"],
+            "tokens": chunk["terms"],
+        })
+        count += 1
+        if len(ids) >= INGEST_BATCH_SIZE:
+            store.upsert(ids, embedding_fn(documents), documents, metadatas)
+            ids, documents, metadatas = [], [], []
+
+    if ids:
+        store.upsert(ids, embedding_fn(documents), documents, metadatas)
+    if not count:
         raise ValueError("No text to ingest")
+    bump_corpus_version()
+    return doc_id, count
 
-    ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-    
-    # Store metadata with global flag
-    metadatas = [
-        {
-            "user_id": str(user_id) if not is_global else "global",
-            "doc_id": doc_id,
-            "title": title or "",
-            "is_global": str(is_global),
-            "uploaded_by": str(user_id)
-        } 
-        for _ in chunks
-    ]
-    
-    collection.upsert(documents=chunks, ids=ids, metadatas=metadatas)
-    return doc_id
+def ingest_pages(user_id: int, pages: Iterable[str], title: str | None = None, doc_id: str | None = None, is_global: bool = False) -> Tuple[str, int]:
+    """Ingest a document page by page, upserting chunks in fixed-size batches; returns (doc_id, chunk count)"""
+    chunks = ({**chunk, "terms": " ".join(analyzer.tokens(chunk["text"]))} for chunk in iter_chunks(pages))
+    return ingest_chunks(user_id, chunks, title=title, doc_id=doc_id, is_global=is_global)
+
+def ingest_text(user_id: int, text: str, title: str | None = None, doc_id: str | None = None, is_global: bool = False) -> Tuple[str, int]:
+    """Ingest text with global flag for admin uploads"""
+    return ingest_pages(user_id, [text], title=title, doc_id=doc_id, is_global=is_global)
+
+def delete_document_chunks(doc_id: str):
+    store.delete_document(doc_id)
+    bump_corpus_version()
 
 def normalize_text(text: str) -> str:
-    text = text.lower().strip()
-    typo_map = {
-        "polocies": "policies", "polcy": "policy", "referal": "referral",
-        "bonu": "bonus", "experiance": "experience", "employe": "employee"
-    }
-    for typo, correct in typo_map.items():
-        text = text.replace(typo, correct)
-    return text
+    return analyzer.normalize(text)
 
-def expand_query(query: str) -> List[str]:
+def chunk_tokens(chunk: str, meta: Dict[str, Any] | None = None) -> List[str]:
+    """BM25 tokens for a chunk, persisted at ingest; older chunks are analyzed on the fly"""
+    stored = (meta or {}).get("tokens")
+    return stored.split() if stored is not None else analyzer.tokens(chunk)
+
+def expand_query_weighted(query: str) -> List[tuple]:
+    """Query variants as (text, weight): the query itself, then synonym rewrites"""
     base_query = normalize_text(query)
-    queries = [base_query, query]
-    
-    expansions = {
-        "pip": ["pip", "performance improvement plan"],
-        "referral": ["referral", "refer", "reference", "employee recommendation"],
-        "bonus": ["bonus", "incentive", "reward", "compensation"],
-        "leave": ["leave", "absence", "time off", "vacation"],
-        "policy": ["policy", "policies", "rule", "regulation"],
-        "wfh": ["wfh", "work from home", "remote"],
-        "holiday": ["holiday", "holidays", "public holiday", "festival", "celebration"],
-        "upcoming": ["upcoming", "next", "future", "coming"],
-    }
+    raw_query = query.strip()
+    variants = {raw_query: 1.0}
+    # The embedding model is uncased, so a variant that only lowercases the query
+    # would embed identically and double its weight; keep it only when typos were fixed
+    if base_query != raw_query.lower():
+        variants[base_query] = 1.0
     
-    query_lower = base_query.lower()
-    for key, terms in expansions.items():
-        if key in query_lower:
-            queries.extend(terms)
+    expansion_re = LEXICON["expansion_re"]
+    if expansion_re is not None:
+        for match in expansion_re.finditer(base_query):
+            for term in LEXICON["expansions"][match.group(1)]:
+                if len(variants) >= MAX_QUERY_VARIANTS:
+                    break
+                rewritten = base_query[:match.start()] + term + base_query[match.end():]
+                variants.setdefault(rewritten, EXPANSION_WEIGHT)
     
-    return list(set(queries))
+    return list(variants.items())
 
-def reciprocal_rank_fusion(results_list: List[List[tuple]], k: int = 60) -> List[tuple]:
-    fused_scores = {}
-    
-    for results in results_list:
-        for rank, (doc_id, score) in enumerate(results):
-            if doc_id not in fused_scores:
-                fused_scores[doc_id] = 0
-            fused_scores[doc_id] += 1 / (k + rank + 1)
+def expand_query(query: str) -> List[str]:
+    return [text for text, _ in expand_query_weighted(query)]
+
+def reciprocal_rank_fusion(results_list: List[List[tuple]], k: int = 60, weights: List[float] | None = None, top_k: int | None = None) -> List[tuple]:
+    return weighted_rrf([([doc_id for doc_id, _ in r], None) for r in results_list], weights=weights, k=k, top_k=top_k)
+
+def top_scored(ids: List[str], scores: np.ndarray, n: int) -> tuple:
+    """Best n positive-scoring ids as an (ids, scores) leg, by partial selection"""
+    scores = np.asarray(scores)
+    if n < len(scores):
+        picked = np.argpartition(-scores, n - 1)[:n]
+        picked = picked[np.argsort(-scores[picked], kind="stable")]
+    else:
+        picked = np.argsort(-scores, kind="stable")
+    picked = picked[scores[picked] > 0]
+    return [ids[i] for i in picked], scores[picked]
+
+def diversify(results: List[Dict[str, Any]], k: int, lambda_mult: float = MMR_LAMBDA, vectors: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    """Pick k results by MMR so overlapping neighbour chunks don't crowd the prompt"""
+    ids = [r["id"] for r in results]
+    if not ids:
+        return results
+    if vectors is None:
+        fetched = store.get(ids, include=["embeddings"])
+        vectors = dict(zip(fetched["ids"], fetched["embeddings"]))
+    if any(i not in vectors for i in ids):
+        return results[:k]
     
-    return sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+    order = mmr_select(
+        np.array([r["score"] for r in results]),
+        np.array([vectors[i] for i in ids]),
+        k,
+        lambda_mult,
+    )
+    return [results[i] for i in order]
+
+def hydrate(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in chunk text and metadata with one batched get.
+
+    Retrieval ranks ids and scores only; this runs on the few survivors.
+    Results that already carry text are left alone, and ids deleted since
+    they were ranked are dropped.
+    """
+    missing = [r["id"] for r in results if "chunk" not in r]
+    if not missing:
+        return results
+    fetched = store.get(missing, include=["documents", "metadatas"])
+    found = {i: (doc, meta) for i, doc, meta in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])}
+    hydrated = []
+    for r in results:
+        if "chunk" not in r:
+            if r["id"] not in found:
+                continue
+            r["chunk"], r["meta"] = found[r["id"]]
+        hydrated.append(r)
+    return hydrated
+
+def pool_tokens(pool: Dict[str, List[Any]]) -> List[List[str]]:
+    """BM25 tokens for a metadata-only scan; chunks ingested before tokens
+    were stored get their text fetched in one batch and analyzed"""
+    metas = pool["metadatas"]
+    legacy = [doc_id for doc_id, meta in zip(pool["ids"], metas) if "tokens" not in meta]
+    texts = {}
+    if legacy:
+        fetched = store.get(legacy, include=["documents"])
+        texts = dict(zip(fetched["ids"], fetched["documents"]))
+    return [chunk_tokens(texts.get(doc_id, ""), meta) for doc_id, meta in zip(pool["ids"], metas)]
 
-def retrieve(query: str, user_id: int, top_k: int = 8):
+def retrieve(query: str, user_id: int, top_k: int = 8, deadline: float | None = None):
     """HYBRID RETRIEVAL: Access both user's own docs and global (admin) docs"""
+    if deadline is None:
+        deadline = time.perf_counter() + RETRIEVAL_BUDGET_MS / 1000
+    return retrieve_batch([query], user_id, top_k=top_k, deadline=deadline)[0]
+
+def retrieve_batch(queries: List[str], user_id: int, top_k: int = 8, deadline: float | None = None) -> List[List[Dict[str, Any]]]:
+    """Hybrid retrieval for many queries with one shared candidate pass.
+
+    The BM25 pool is scanned and indexed once, every query variant is
+    embedded in one encoder batch and searched in one store round trip, and
+    the final chunks of all queries are hydrated with one get. Fusion,
+    rerank and MMR still run per query. Without a deadline each query gets
+    its own RETRIEVAL_BUDGET_MS for reranking.
+    """
     try:
-        # Build the where clause to get:
-        # 1. Documents uploaded by admin (is_global = "True")
-        # 2. Documents specific to this user
-        where_clause = {
-            "$or": [
-                {"is_global": "True"},  # Admin documents
-                {"user_id": str(user_id)}  # User's own documents (if any)
-            ]
-        }
-        
-        # Get documents
-        all_results = collection.query(
-            query_texts=[""],
-            n_results=100,
-            where=where_clause
-        )
+        # Candidate pool for BM25: global (admin) documents plus this user's own.
+        # Only metadata is read here; stored tokens are all BM25 needs.
+        pool = store.scan(user_id=user_id, limit=BM25_POOL_SIZE, include=("metadatas",))
         
-        all_docs = all_results.get("documents", [[]])[0]
-        all_metas = all_results.get("metadatas", [[]])[0]
+        all_ids = pool["ids"]
+        if not all_ids or not queries:
+            return [[] for _ in queries]
         
-        if not all_docs:
-            return []
-        
-        # Semantic Search
-        query_variations = expand_query(query)
-        semantic_query = " ".join(query_variations)
-        
-        semantic_results = collection.query(
-            query_texts=[semantic_query], 
-            n_results=top_k * 2,
-            where=where_clause
-        )
+        # Semantic Search: every variant of every query embedded in one batch, searched in one round trip
+        variants = [expand_query_weighted(query) for query in queries]
+        variant_texts = [text for vs in variants for text, _ in vs]
         
-        semantic_docs = semantic_results.get("documents", [[]])[0]
-        semantic_ids = semantic_results.get("ids", [[]])[0]
-        semantic_dists = semantic_results.get("distances", [[]])[0]
+        semantic_results = store.query(embedding_fn(variant_texts), n_results=top_k * 2, user_id=user_id)
         
-        semantic_rankings = [
-            (doc_id, 1 / (1 + dist)) 
-            for doc_id, dist in zip(semantic_ids, semantic_dists)
+        semantic_legs = [
+            (ids, 1 / (1 + np.asarray(dists)))
+            for ids, dists in zip(semantic_results["ids"], semantic_results["distances"])
         ]
         
-        # BM25 Search
-        tokenized_docs = [normalize_text(doc).split() for doc in all_docs]
-        bm25 = BM25Okapi(tokenized_docs)
+        bm25 = BM25Okapi(pool_tokens(pool))
         
-        normalized_query = normalize_text(semantic_query)
-        tokenized_query = normalized_query.split()
-        bm25_scores = bm25.get_scores(tokenized_query)
-        
-        all_ids = all_results.get("ids", [[]])[0]
-        
-        bm25_rankings = [
-            (doc_id, score) 
-            for doc_id, score in zip(all_ids, bm25_scores)
-            if score > 0
-        ]
-        bm25_rankings.sort(key=lambda x: x[1], reverse=True)
-        bm25_rankings = bm25_rankings[:top_k * 2]
-        
-        # Fusion
-        fused_rankings = reciprocal_rank_fusion([semantic_rankings, bm25_rankings])
+        # Fusion over ids and scores only; text is looked up for the survivors
+        limit = max(top_k, CANDIDATE_POOL_SIZE) if RERANK_ENABLED or MMR_ENABLED else top_k
+        candidates = []
+        offset = 0
+        for query, query_variants in zip(queries, variants):
+            texts = [text for text, _ in query_variants]
+            weights = [weight for _, weight in query_variants]
+            legs = semantic_legs[offset:offset + len(texts)]
+            # Cosine similarity to the query itself, kept beside the fused score: fused
+            # scores depend on FUSION_METHOD and say little about how decisive a hit is
+            similarity = dict(zip(semantic_results["ids"][offset], 1 - np.asarray(semantic_results["distances"][offset])))
+            offset += len(texts)
+            
+            # BM25 Search: the query's own terms, plus the expansion terms as a weaker leg
+            base_tokens = analyzer.tokens(query)
+            expansion_tokens = sorted({
+                token for text in texts[1:] for token in analyzer.tokens(text)
+            } - set(base_tokens))
+            
+            bm25_legs, bm25_weights = [], []
+            for tokens, weight in ((base_tokens, 1.0), (expansion_tokens, EXPANSION_WEIGHT)):
+                if not tokens:
+                    continue
+                bm25_legs.append(top_scored(all_ids, bm25.get_scores(tokens), top_k * 2))
+                bm25_weights.append(weight)
+            
+            fused_rankings = FUSION_METHODS[FUSION_METHOD](
+                legs + bm25_legs,
+                weights=weights + bm25_weights,
+                top_k=limit
+            )
+            candidates.append([
+                {"id": doc_id, "score": fused_score, "similarity": float(similarity.get(doc_id, 0.0))}
+                for doc_id, fused_score in fused_rankings
+            ])
         
-        # Get results
-        results = []
-        doc_map = {
-            doc_id: {"chunk": doc, "meta": meta}
-            for doc_id, doc, meta in zip(all_ids, all_docs, all_metas)
-        }
+        vectors = None
+        candidate_ids = sorted({r["id"] for results in candidates for r in results})
+        if MMR_ENABLED and len(queries) > 1 and candidate_ids:
+            # One embeddings fetch for every query's candidates
+            fetched = store.get(candidate_ids, include=["embeddings"])
+            vectors = dict(zip(fetched["ids"], fetched["embeddings"]))
         
-        for doc_id, fused_score in fused_rankings[:top_k]:
-            if doc_id in doc_map:
-                results.append({
-                    "chunk": doc_map[doc_id]["chunk"],
-                    "meta": doc_map[doc_id]["meta"],
-                    "score": fused_score
-                })
+        selected = []
+        for query, results in zip(queries, candidates):
+            # Optional cross-encoder pass; when it runs, fewer but better chunks go to the LLM
+            final_k = top_k
+            if RERANK_ENABLED:
+                budget = deadline if deadline is not None else time.perf_counter() + RETRIEVAL_BUDGET_MS / 1000
+                # The cross-encoder reads text, so the candidate pool is hydrated up front
+                results, reranked = rerank(query, hydrate(results), budget)
+                if reranked:
+                    final_k = min(top_k, RERANK_KEEP)
+            
+            if MMR_ENABLED and len(results) > final_k:
+                results = diversify(results, final_k, vectors=vectors)
+            selected.append(results[:final_k])
         
-        return results
+        # Text and metadata only for the chunks that are actually returned
+        hydrate([r for results in selected for r in results])
+        return [[r for r in results if "chunk" in r] for results in selected]
         
     except Exception as e:
         print(f"Retrieval error: {e}")
-        return []
+        return [[] for _ in queries]
 
 def generate_answer(query: str, contexts: List[Dict[str, Any]]) -> str:
     if not contexts:
@@ -267,7 +373,7 @@ ANSWER:"""
             prompt,
             generation_config=genai.types.GenerationConfig(
                 temperature=0.2,  # Slightly increased for better reasoning
-                max_output_tokens=700,
+                max_output_tokens=GENERATION_MAX_TOKENS,
                 top_p=0.9,
             )
         )
@@ -276,7 +382,39 @@ ANSWER:"""
         print(f"Gemini API error: {e}")
         return "Sorry, I couldn't generate a response. Please try again."
 
-def generate_answer_stream(query: str, contexts: List[Dict[str, Any]]):
+def answer_batch(queries: List[str], user_id: int, top_k: int = 8, concurrency: int = BATCH_CONCURRENCY) -> Iterator[Tuple[int, str, List[Dict[str, Any]]]]:
+    """Answer many queries, yielding (index, answer, hits) as each one completes.
+
+    Retrieval runs in shared passes of BATCH_RETRIEVAL_SIZE queries; answers
+    are generated on at most ``concurrency`` threads, each also holding a
+    generation slot so bulk work can't crowd out interactive streams.
+    Closing the iterator early cancels generations that haven't started.
+    """
+    def answer(i: int, query: str, hits: List[Dict[str, Any]]):
+        with generation_slots:
+            return i, generate_answer(query, hits), hits
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="answer_batch")
+    try:
+        pending = set()
+        for start in range(0, len(queries), BATCH_RETRIEVAL_SIZE):
+            batch = queries[start:start + BATCH_RETRIEVAL_SIZE]
+            for offset, (query, hits) in enumerate(zip(batch, retrieve_batch(batch, user_id, top_k=top_k))):
+                if hits:
+                    pending.add(executor.submit(answer, start + offset, query, hits))
+                else:
+                    yield start + offset, "I don't know.", []
+            # Hand back whatever finished while the next pass is prepared
+            for future in [f for f in pending if f.done()]:
+                pending.discard(future)
+                yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def generate_answer_stream(query: str, contexts: List[Dict[str, Any]], cancel: threading.Event | None = None):
+    """Yield answer text as Gemini streams it; stops early once ``cancel`` is set"""
     if not contexts:
         yield "I couldn't find any relevant information in the documents."
         return
@@ -318,16 +456,20 @@ ANSWER:"""
             prompt,
             generation_config=genai.types.GenerationConfig(
                 temperature=0.2,
-                max_output_tokens=700,
+                max_output_tokens=GENERATION_MAX_TOKENS,
                 top_p=0.9,
             ),
             stream=True
         )
         
         for chunk in response:
+            if cancel is not None and cancel.is_set():
+                # Dropping the response closes the upstream stream
+                break
             if chunk.text:
                 yield chunk.text
                 
     except Exception as e:
         print(f"Gemini streaming error: {e}")
-        yield generate_answer(query, contexts)
\ No newline at end of file
+        if cancel is None or not cancel.is_set():
+            yield generate_answer(query, contexts)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Rebuild the active Chroma collection with new HNSW parameters.
+
+Copies stored embeddings, documents and metadata into a fresh collection
+(no re-embedding) and catches up on writes that landed during the copy.
+Writes are then briefly frozen while a last sync runs and the
+active-collection pointer is atomically flipped; from then on every write
+goes to the new collection and the old one is never read again. Queries
+keep being served throughout; ingests and deletes just wait out the freeze.
+
+    python -m app.rebuild_index --space cosine --m 32 --construction-ef 200 --search-ef 100
+
+With VECTOR_STORE=mmap there is no HNSW graph; ``--build-ivf`` trains the
+IVF lists that MMAP_STORE_INDEX=ivf searches (``--to-mmap`` does this too
+when IVF is configured). The memory-mapped store only appends, so
+``--compact`` rewrites it without replaced and deleted rows; ``--to-mmap``
+and ``--build-ivf`` compact first.
+"""
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.rag import store, embedding_fn
+from app.vectorstore import (
+    ChromaStore, MmapStore, MMAP_STORE_PATH, MMAP_STORE_DTYPE, MMAP_STORE_INDEX, IVF_NLIST, hnsw_metadata, active_collection_name, write_freeze, ACTIVE_COLLECTION_FILE,
+    CHROMA_COLLECTION, HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF,
+)
+
+BATCH_SIZE = 2000
+
+def copy_ids(source, target, ids):
+    """Copy the given ids from source to target in batches"""
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = source.get(ids=ids[start:start + BATCH_SIZE], include=["embeddings", "documents", "metadatas"])
+        if batch["ids"]:
+            target.upsert(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+            )
+
+def all_ids(coll):
+    return set(coll.get(include=[])["ids"])
+
+def sync(source, target) -> int:
+    """Make target hold source's ids; returns how many rows changed.
+
+    Only valid while source is the active collection: once the pointer has
+    flipped, target's extra ids are new writes, not stale rows.
+    """
+    source_ids, target_ids = all_ids(source), all_ids(target)
+    missing = sorted(source_ids - target_ids)
+    stale = sorted(target_ids - source_ids)
+    copy_ids(source, target, missing)
+    if stale:
+        target.delete(ids=stale)
+    return len(missing) + len(stale)
+
+def flip_pointer(name: str):
+    tmp = ACTIVE_COLLECTION_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, ACTIVE_COLLECTION_FILE)
+
+def rebuild(space: str, m: int, construction_ef: int, search_ef: int, drop_old: bool = False) -> str:
+    if not isinstance(store, ChromaStore):
+        raise SystemExit("HNSW parameters only apply to the Chroma backend (VECTOR_STORE=chroma)")
+    client = store.client
+    source_name = active_collection_name()
+    source = client.get_collection(name=source_name, embedding_function=embedding_fn)
+    target_name = f"{CHROMA_COLLECTION}_{int(time.time())}"
+    target = client.create_collection(
+        name=target_name,
+        embedding_function=embedding_fn,
+        metadata=hnsw_metadata(space, m, construction_ef, search_ef),
+    )
+    print(f"🔄 Rebuilding '{source_name}' ({source.count()} chunks) into '{target_name}'")
+    print(f"   space={space} M={m} construction_ef={construction_ef} search_ef={search_ef}")
+
+    start = time.perf_counter()
+    copied = sync(source, target)
+    print(f"   copied {copied} chunks in {time.perf_counter() - start:.1f}s")
+
+    # Catch up on ingests/deletes that happened while copying
+    for _ in range(5):
+        changed = sync(source, target)
+        if not changed:
+            break
+        print(f"   caught up {changed} changed chunks")
+
+    # Writers resolve the active collection after taking their side of this lock,
+    # so once it is released every write lands in target and source is frozen for good
+    frozen = time.perf_counter()
+    with write_freeze():
+        changed = sync(source, target)
+        flip_pointer(target_name)
+    print(f"✅ Active collection is now '{target_name}' (writes paused {time.perf_counter() - frozen:.1f}s, {changed} final changes)")
+
+    if drop_old:
+        client.delete_collection(name=source_name)
+        print(f"🗑️ Dropped '{source_name}'")
+    else:
+        print(f"   '{source_name}' kept for rollback; point {ACTIVE_COLLECTION_FILE} back to it to revert")
+    return target_name
+
+def export_to_mmap(path: str = MMAP_STORE_PATH, dtype: str = MMAP_STORE_DTYPE):
+    """Copy the active Chroma collection into a memory-mapped store (VECTOR_STORE=mmap)"""
+    if not isinstance(store, ChromaStore):
+        raise SystemExit("Run the export with VECTOR_STORE=chroma")
+    source = store.collection
+    target = MmapStore(path=path, dtype=dtype)
+    ids = sorted(all_ids(source))
+    print(f"🔄 Exporting {len(ids)} chunks to {path} ({dtype})")
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = source.get(ids=ids[start:start + BATCH_SIZE], include=["embeddings", "documents", "metadatas"])
+        target.upsert(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+    # Exporting over an existing store replaced its rows rather than overwriting them
+    compact(path, dtype)
+    print(f"✅ Exported {target.count()} chunks; set VECTOR_STORE=mmap to serve from it")
+    if MMAP_STORE_INDEX == "ivf":
+        build_ivf(path, dtype)
+
+def compact(path: str = MMAP_STORE_PATH, dtype: str = MMAP_STORE_DTYPE):
+    """Drop replaced and deleted rows from a memory-mapped store (and its summaries side store)"""
+    for store_path in (path, os.path.join(path, "summaries")):
+        if not os.path.exists(os.path.join(store_path, "columns.npz")):
+            continue
+        start = time.perf_counter()
+        dropped = MmapStore(path=store_path, dtype=dtype).compact()
+        print(f"🧹 Compacted {store_path}: dropped {dropped} dead rows in {time.perf_counter() - start:.1f}s")
+
+def build_ivf(path: str = MMAP_STORE_PATH, dtype: str = MMAP_STORE_DTYPE, nlist: int = IVF_NLIST):
+    """Train IVF lists for a memory-mapped store; rows added later are assigned as they arrive"""
+    target = MmapStore(path=path, dtype=dtype, index="ivf")
+    target.compact()
+    start = time.perf_counter()
+    target.build_ivf(nlist=nlist)
+    print(f"✅ Built IVF index ({nlist} lists) over {target.count()} chunks in {time.perf_counter() - start:.1f}s; "
+          f"set MMAP_STORE_INDEX=ivf to search it")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--space", default=HNSW_SPACE, choices=["cosine", "l2", "ip"])
+    parser.add_argument("--m", type=int, default=HNSW_M)
+    parser.add_argument("--construction-ef", type=int, default=HNSW_CONSTRUCTION_EF)
+    parser.add_argument("--search-ef", type=int, default=HNSW_SEARCH_EF)
+    parser.add_argument("--drop-old", action="store_true")
+    parser.add_argument("--to-mmap", action="store_true", help="export to the memory-mapped backend instead")
+    parser.add_argument("--build-ivf", action="store_true", help="(re)train the memory-mapped store's IVF index")
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF lists for --build-ivf")
+    parser.add_argument("--compact", action="store_true", help="drop dead rows from the memory-mapped store")
+    args = parser.parse_args()
+    if args.compact:
+        compact()
+    elif args.build_ivf:
+        build_ivf(nlist=args.nlist)
+    elif args.to_mmap:
+        export_to_mmap()
+    else:
+        rebuild(args.space, args.m, args.construction_ef, args.search_ef, args.drop_old)
@@ -0,0 +1,108 @@
+import os, time, math, hashlib, threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_KEEP = int(os.getenv("RERANK_KEEP", "4"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# Cost estimate used until the first batch has been timed
+RERANK_INITIAL_MS_PER_PAIR = float(os.getenv("RERANK_INITIAL_MS_PER_PAIR", "3"))
+
+_model = None
+_model_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+_cache_lock = threading.Lock()
+_ms_per_pair = RERANK_INITIAL_MS_PER_PAIR
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                _model = CrossEncoder(RERANK_MODEL, device="cpu", max_length=512)
+    return _model
+
+def warmup():
+    """Load the model and time one pair so the first request isn't charged for it"""
+    if RERANK_ENABLED:
+        _score_pairs([("warmup", "warmup")])
+
+def _score_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+    global _ms_per_pair
+    model = get_model()
+    start = time.perf_counter()
+    logits = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    # Exponentially weighted so the estimate tracks current CPU load
+    _ms_per_pair = 0.7 * _ms_per_pair + 0.3 * (elapsed_ms / len(pairs))
+    return [1 / (1 + math.exp(-float(x))) for x in logits]
+
+def _cache_key(query: str, chunk: str) -> Tuple[str, str]:
+    # Keyed on the text, not the chunk id: an upsert can rewrite an id in place
+    # (e.g. a resumed ingest under new chunk settings), and a score must not outlive its text
+    return query, hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+def _cache_get(key):
+    with _cache_lock:
+        score = _cache.get(key)
+        if score is not None:
+            _cache.move_to_end(key)
+        return score
+
+def _cache_put(key, score: float):
+    with _cache_lock:
+        _cache[key] = score
+        _cache.move_to_end(key)
+        while len(_cache) > RERANK_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def rerank(query: str, candidates: List[Dict[str, Any]], deadline: float | None = None) -> Tuple[List[Dict[str, Any]], bool]:
+    """Rescore fused candidates with a cross-encoder within a latency budget.
+
+    Candidates must be in fused order and carry "id" and "chunk". Cached
+    (query, chunk) scores are free; the remaining pairs are scored in one
+    batch, truncated to the best-ranked ones that fit before ``deadline``
+    (a ``time.perf_counter()`` value). Returns the candidates and whether
+    any reranking happened.
+    """
+    if not candidates:
+        return candidates, False
+
+    scores = {}
+    pending = []
+    keys = {c["id"]: _cache_key(query, c["chunk"]) for c in candidates}
+    for c in candidates:
+        cached = _cache_get(keys[c["id"]])
+        if cached is None:
+            pending.append(c)
+        else:
+            scores[c["id"]] = cached
+
+    if pending and deadline is not None:
+        remaining_ms = (deadline - time.perf_counter()) * 1000
+        affordable = int(remaining_ms // _ms_per_pair) if remaining_ms > 0 else 0
+        pending = pending[:affordable]
+
+    if pending:
+        try:
+            fresh = _score_pairs([(query, c["chunk"]) for c in pending])
+        except Exception as e:
+            print(f"Rerank error: {e}")
+            fresh = []
+        for c, score in zip(pending, fresh):
+            scores[c["id"]] = score
+            _cache_put(keys[c["id"]], score)
+
+    if not scores:
+        return candidates, False
+
+    # Scored candidates first by cross-encoder score; unscored keep fused order behind them
+    scored = [{**c, "fused_score": c["score"], "score": scores[c["id"]]} for c in candidates if c["id"] in scores]
+    scored.sort(key=lambda c: c["score"], reverse=True)
+    unscored = [c for c in candidates if c["id"] not in scores]
+    return scored + unscored, True
@@ -0,0 +1,120 @@
+import os, time, threading
+from datetime import datetime, timedelta
+from typing import Dict
+from dotenv import load_dotenv
+from sqlalchemy import select, delete, insert
+from .db import SessionLocal
+from .models import Conversation, ConversationArchive
+from . import jobs, metrics
+
+load_dotenv()
+
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "true").lower() == "true"
+# Conversation rows older than this move to conversations_archive
+CONVERSATION_RETENTION_DAYS = int(os.getenv("CONVERSATION_RETENTION_DAYS", "90"))
+# Archived rows older than this (by archive date) are deleted; 0 keeps them forever
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+# Rows moved or deleted per transaction; keeps locks short and lets vacuum keep up
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+# Pause between batches so retention never saturates the database
+RETENTION_BATCH_PAUSE_MS = int(os.getenv("RETENTION_BATCH_PAUSE_MS", "50"))
+# Upper bound on batches per run; the rest is picked up by the next run
+RETENTION_MAX_BATCHES = int(os.getenv("RETENTION_MAX_BATCHES", "500"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+
+def archive_batch(cutoff: datetime, batch: int = RETENTION_BATCH_SIZE) -> int:
+    """Move up to `batch` of the oldest rows created before cutoff into the archive.
+
+    Rows locked by another worker's run are skipped, so several workers can
+    run retention at once without waiting on each other.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Conversation.id, Conversation.user_id, Conversation.thread_id,
+                   Conversation.role, Conversation.content, Conversation.created_at)
+            .where(Conversation.created_at < cutoff)
+            .order_by(Conversation.created_at)
+            .limit(batch)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            return 0
+        now = datetime.utcnow()
+        db.execute(insert(ConversationArchive), [{**row._mapping, "archived_at": now} for row in rows])
+        db.execute(delete(Conversation).where(Conversation.id.in_([row.id for row in rows])))
+        db.commit()
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def purge_archive_batch(cutoff: datetime, batch: int = RETENTION_BATCH_SIZE) -> int:
+    """Delete up to `batch` archived rows archived before cutoff"""
+    db = SessionLocal()
+    try:
+        ids = select(ConversationArchive.id) \
+            .where(ConversationArchive.archived_at < cutoff) \
+            .limit(batch) \
+            .with_for_update(skip_locked=True) \
+            .scalar_subquery()
+        deleted = db.execute(delete(ConversationArchive).where(ConversationArchive.id.in_(ids))).rowcount
+        db.commit()
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def delete_in_batches(db, model, *criteria, batch: int = RETENTION_BATCH_SIZE) -> int:
+    """DELETE matching rows `batch` at a time, committing after each batch.
+
+    A user's whole history in one statement holds row locks for the
+    duration and leaves one large burst of dead tuples; short batches keep
+    both bounded.
+    """
+    total = 0
+    while True:
+        ids = select(model.id).where(*criteria).limit(batch).scalar_subquery()
+        deleted = (await db.execute(delete(model).where(model.id.in_(ids)))).rowcount
+        await db.commit()
+        total += deleted
+        if deleted < batch:
+            return total
+
+def _drain(step, cutoff: datetime, counter: str) -> int:
+    total = 0
+    for _ in range(RETENTION_MAX_BATCHES):
+        n = step(cutoff)
+        total += n
+        metrics.incr(counter, n)
+        if n < RETENTION_BATCH_SIZE:
+            break
+        time.sleep(RETENTION_BATCH_PAUSE_MS / 1000)
+    return total
+
+def run_retention() -> Dict[str, int]:
+    """One retention pass: archive old conversations, then purge old archive rows"""
+    now = datetime.utcnow()
+    archived = _drain(archive_batch, now - timedelta(days=CONVERSATION_RETENTION_DAYS), "retention_archived")
+    purged = 0
+    if ARCHIVE_RETENTION_DAYS > 0:
+        purged = _drain(purge_archive_batch, now - timedelta(days=ARCHIVE_RETENTION_DAYS), "retention_purged")
+    if archived or purged:
+        print(f"🗄️ Retention: archived {archived} conversation rows, purged {purged} archived rows")
+    return {"archived": archived, "purged": purged}
+
+def schedule_retention() -> bool:
+    return jobs.schedule("retention", run_retention)
+
+def _every_interval():
+    while True:
+        schedule_retention()
+        time.sleep(RETENTION_INTERVAL_SECONDS)
+
+def start():
+    if RETENTION_ENABLED:
+        threading.Thread(target=_every_interval, name="retention", daemon=True).start()
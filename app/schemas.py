@@ -33,31 +33,65 @@ class IngestResponse(BaseModel):
     doc_id: str
     title: Optional[str] = None
 
+class BulkIngestFailure(BaseModel):
+    name: str
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    documents: List[IngestResponse]
+    failed: List[BulkIngestFailure]
+    pages: int
+    chunks: int
+    seconds: float
+    pages_per_sec: float
+    chunks_per_sec: float
+
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 8
+    fast_path: Optional[bool] = None  # extractive answer when retrieval is decisive; None = server default
+    elaborate: bool = False  # streaming only: follow a fast-path answer with the LLM's answer
+    persist: bool = False  # streaming only: save the question and answer to the conversation history
+    thread_id: Optional[str] = None  # conversation thread the persisted exchange belongs to
+
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 8
+    include_chunks: bool = False  # sources carry chunk text only when asked
 
 class Source(BaseModel):
     doc_id: str
     score: float
     chunk: str
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Source]
+    path: Optional[str] = None  # "llm", "extractive", "precomputed", "summary" or "empty"
 
 class ConversationMessage(BaseModel):
     role: str
     content: str
+    thread_id: Optional[str] = None
+
+class ConversationBulkSave(BaseModel):
+    messages: List[ConversationMessage]
+    thread_id: Optional[str] = None  # applies to messages that don't name their own
 
 class ConversationHistory(BaseModel):
     messages: List[ConversationMessage]
+    next_cursor: Optional[str] = None  # pass as `before` to load the previous page; None at the start
 
 class DocumentInfo(BaseModel):
     id: str
     title: Optional[str]
     uploaded_by: str
     created_at: datetime
+    chunk_count: Optional[int] = None
+    byte_size: Optional[int] = None
+    ingest_ms: Optional[int] = None
     
     class Config:
         from_attributes_mode = True
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os, json, time, asyncio, threading
+from typing import Any, Callable, Dict, Iterator, List
+from dotenv import load_dotenv
+from .streaming import GenerationStream, TOKEN, ERROR
+
+load_dotenv()
+
+# Comment frames keep proxies and load balancers from buffering or timing out an idle stream
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Tokens are coalesced into one frame until this much time or text has accumulated
+SSE_FLUSH_MS = float(os.getenv("SSE_FLUSH_MS", "50"))
+SSE_FLUSH_CHARS = int(os.getenv("SSE_FLUSH_CHARS", "64"))
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # nginx: pass frames through as they arrive
+}
+
+def sse_event(event: str, data: Dict[str, Any], event_id: int | None = None) -> str:
+    """One Server-Sent Events frame with a JSON payload"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def sse_answer_stream(
+    request,
+    sources: List[Dict[str, Any]],
+    make_tokens: Callable[[threading.Event], Iterator[str]] | None,
+    max_tokens: int,
+    endpoint: str = "query_sse",
+    preface: List[tuple] = (),
+    answer: str | None = None,
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+    flush_ms: float = SSE_FLUSH_MS,
+    flush_chars: int = SSE_FLUSH_CHARS,
+):
+    """Sources first, then coalesced answer tokens, then a done event.
+
+    ``preface`` holds extra ``(event, data)`` frames sent right after the
+    sources, e.g. an extractive answer ahead of the LLM's.
+
+    ``make_tokens(cancel)`` returns the (blocking) token iterator; it runs in
+    a worker thread (see ``GenerationStream``) and is cancelled when the
+    client disconnects or the response is torn down. Pass ``make_tokens=None``
+    for an answer that is already known (precomputed, extractive, fallback):
+    ``answer``, if any, is sent as one token frame without waiting for a
+    generation slot.
+    """
+    event_id = 0
+
+    def frame(event: str, data: Dict[str, Any]) -> str:
+        nonlocal event_id
+        event_id += 1
+        return sse_event(event, data, event_id)
+
+    yield frame("sources", {"sources": sources})
+    for event, data in preface:
+        yield frame(event, data)
+    if make_tokens is None:
+        if answer:
+            yield frame("token", {"text": answer})
+        yield frame("done", {"complete": True})
+        return
+    stream = GenerationStream(make_tokens, endpoint, max_tokens).start()
+
+    buffer: List[str] = []
+    buffered = 0
+    first_token_at = 0.0
+    last_frame_at = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            if buffer:
+                timeout = first_token_at + flush_ms / 1000 - now
+                if timeout <= 0:
+                    # Tokens keep arriving faster than they fill a frame: flush on time
+                    yield frame("token", {"text": "".join(buffer)})
+                    buffer, buffered = [], 0
+                    last_frame_at = now
+                    continue
+            else:
+                timeout = max(0.0, last_frame_at + heartbeat - now)
+            try:
+                kind, value = await stream.get(timeout)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                if buffer:
+                    yield frame("token", {"text": "".join(buffer)})
+                    buffer, buffered = [], 0
+                else:
+                    yield ": ping\n\n"
+                last_frame_at = time.monotonic()
+                continue
+
+            if kind == TOKEN:
+                if not buffer:
+                    first_token_at = time.monotonic()
+                buffer.append(value)
+                buffered += len(value)
+                if buffered >= flush_chars:
+                    yield frame("token", {"text": "".join(buffer)})
+                    buffer, buffered = [], 0
+                    last_frame_at = time.monotonic()
+                continue
+
+            if kind == ERROR:
+                if buffer:
+                    yield frame("token", {"text": "".join(buffer)})
+                    buffer, buffered = [], 0
+                yield frame("error", {"detail": "Sorry, I couldn't generate a response. Please try again."})
+                continue
+
+            # DONE
+            stream.finished()
+            if buffer:
+                yield frame("token", {"text": "".join(buffer)})
+            yield frame("done", {"complete": True})
+            return
+    finally:
+        # Client disconnected, response cancelled or finished: stop the generator thread
+        stream.close()
@@ -0,0 +1,132 @@
+import os, time, asyncio, threading
+from typing import Any, Callable, Iterator, Tuple
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+# Upstream LLM streams allowed at once per worker; the rest wait for a slot
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "8"))
+# How often an idle stream checks whether its client is still there
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+# Rough characters per token, for the tokens-streamed count and saved-tokens bound
+CHARS_PER_TOKEN = 4
+
+TOKEN, ERROR, DONE = "token", "error", "done"
+
+generation_slots = threading.BoundedSemaphore(GENERATION_CONCURRENCY)
+
+class GenerationStream:
+    """Runs a blocking token iterator in a worker thread for an async response.
+
+    ``make_tokens(cancel)`` builds the iterator (typically a Gemini stream)
+    once a generation slot is free; it should stop when ``cancel`` is set.
+    The consumer reads ``(kind, value)`` items with ``get`` and must call
+    ``close`` when done. Closing before the iterator finished (client gone,
+    response cancelled) sets ``cancel``, so the worker stops pulling from
+    the provider and returns its slot.
+    """
+
+    def __init__(self, make_tokens: Callable[[threading.Event], Iterator[str]], endpoint: str, max_tokens: int):
+        self.make_tokens = make_tokens
+        self.endpoint = endpoint
+        self.max_tokens = max_tokens
+        self.cancel = threading.Event()
+        self.chars = 0
+        self._finished = False
+        self._closed = False
+        self._loop = None
+        self._queue: asyncio.Queue | None = None
+
+    def start(self) -> "GenerationStream":
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        metrics.incr(f"stream_started.{self.endpoint}")
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _put(self, item: Tuple[str, Any]):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed: nobody is listening
+            self.cancel.set()
+
+    def _run(self):
+        waited = time.perf_counter()
+        while not generation_slots.acquire(timeout=0.5):
+            if self.cancel.is_set():
+                self._put((DONE, None))
+                return
+        metrics.observe("generation_slot_wait_ms", (time.perf_counter() - waited) * 1000)
+        metrics.gauge("generation_active", 1)
+        tokens = None
+        try:
+            if self.cancel.is_set():
+                return
+            tokens = self.make_tokens(self.cancel)
+            for token in tokens:
+                if self.cancel.is_set():
+                    break
+                if token:
+                    self.chars += len(token)
+                    self._put((TOKEN, token))
+        except Exception as e:
+            print(f"Generation stream error: {e}")
+            self._put((ERROR, str(e)))
+        finally:
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+            generation_slots.release()
+            metrics.gauge("generation_active", -1)
+            self._put((DONE, None))
+
+    async def get(self, timeout: float | None = None) -> Tuple[str, Any]:
+        """Next item; raises ``asyncio.TimeoutError`` if none arrives in time"""
+        if timeout is None:
+            return await self._queue.get()
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def finished(self):
+        """The consumer saw DONE: the stream ran to completion"""
+        self._finished = True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.cancel.set()
+        tokens = self.chars // CHARS_PER_TOKEN
+        metrics.incr(f"stream_tokens.{self.endpoint}", tokens)
+        if self._finished:
+            metrics.incr(f"stream_completed.{self.endpoint}")
+        else:
+            metrics.incr(f"stream_cancelled.{self.endpoint}")
+            # Not an estimate of real savings: assumes the answer would have run to the output cap
+            metrics.incr("generation_tokens_saved_upper_bound", max(0, self.max_tokens - tokens))
+
+async def stream_tokens(request, make_tokens: Callable[[threading.Event], Iterator[str]], endpoint: str, max_tokens: int):
+    """Async iterator over ``(kind, value)`` that abandons generation on disconnect.
+
+    Yields TOKEN and ERROR items and returns after the iterator is exhausted.
+    Starlette cancels the response when the client goes away; idle streams
+    also poll ``request.is_disconnected``. Either way ``close`` runs.
+    """
+    stream = GenerationStream(make_tokens, endpoint, max_tokens).start()
+    try:
+        while True:
+            try:
+                kind, value = await stream.get(DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                continue
+            if kind == DONE:
+                stream.finished()
+                return
+            yield kind, value
+    finally:
+        stream.close()
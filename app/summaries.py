@@ -0,0 +1,156 @@
+import os, re, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+import google.generativeai as genai
+from .rag import store, embedding_fn, model, GENERATION_MAX_TOKENS
+from .vectorstore import make_store
+from .analyzer import analyzer
+from .streaming import generation_slots
+from . import jobs, metrics
+
+load_dotenv()
+
+# Summarize documents in the background after ingest
+SUMMARIES_ENABLED = os.getenv("SUMMARIES_ENABLED", "false").lower() == "true"
+# Consecutive chunks summarized together as one section
+SUMMARY_SECTION_CHUNKS = int(os.getenv("SUMMARY_SECTION_CHUNKS", "8"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Cosine distance above which a summary is not considered about the question
+SUMMARY_MAX_DISTANCE = float(os.getenv("SUMMARY_MAX_DISTANCE", "0.6"))
+
+SUMMARY_QUERY_RE = re.compile(r"\b(summar\w*|overview|outline|gist|tl;?dr|key points|main points|in brief|briefly)\b", re.I)
+
+_summary_store = None
+_summary_store_lock = threading.Lock()
+
+def get_summary_store():
+    """Summaries live in their own store so they never crowd chunk retrieval; opened on first use"""
+    global _summary_store
+    if _summary_store is None:
+        with _summary_store_lock:
+            if _summary_store is None:
+                _summary_store = make_store(embedding_function=embedding_fn, name="summaries")
+    return _summary_store
+
+def is_summary_query(query: str) -> bool:
+    return bool(SUMMARY_QUERY_RE.search(query))
+
+def document_chunks(doc_id: str, batch: int = 256) -> Dict[str, List[Any]]:
+    """All chunks of a document in order; ingest numbers them {doc_id}_0, _1, ..."""
+    ids, documents, metadatas = [], [], []
+    start = 0
+    while True:
+        wanted = [f"{doc_id}_{i}" for i in range(start, start + batch)]
+        fetched = store.get(wanted, include=["documents", "metadatas"])
+        found = dict(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+        for i in wanted:
+            if i not in found:
+                return {"ids": ids, "documents": documents, "metadatas": metadatas}
+            ids.append(i)
+            documents.append(found[i][0])
+            metadatas.append(found[i][1])
+        start += batch
+
+def _summarize(text: str, instruction: str) -> str:
+    with generation_slots:
+        response = model.generate_content(
+            f"{instruction}\n\nTEXT:\n{text}\n\nSUMMARY:",
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.1,
+                max_output_tokens=min(SUMMARY_MAX_TOKENS, GENERATION_MAX_TOKENS),
+            )
+        )
+    return response.text.strip()
+
+SECTION_PROMPT = (
+    "Summarize this section of a company document in a few bullet points (•). "
+    "Keep every specific number, date, limit and eligibility rule. Do not add anything that is not in the text."
+)
+DOCUMENT_PROMPT = (
+    "These are summaries of consecutive sections of one company document. "
+    "Write a short overview of the whole document: its purpose, then its main rules as bullet points (•), "
+    "keeping specific numbers and dates."
+)
+
+def summarize_document(doc_id: str) -> int:
+    """Build section and document summaries for one document; returns entries written.
+
+    Sections are summarized in parallel (bounded by SUMMARY_CONCURRENCY and
+    the shared generation slots), the document summary is reduced from the
+    section summaries, and all entries are embedded in one batch.
+    """
+    start = time.perf_counter()
+    chunks = document_chunks(doc_id)
+    if not chunks["ids"]:
+        return 0
+    base = chunks["metadatas"][0]
+    sections = [
+        (chunks["documents"][i:i + SUMMARY_SECTION_CHUNKS], chunks["metadatas"][i:i + SUMMARY_SECTION_CHUNKS])
+        for i in range(0, len(chunks["ids"]), SUMMARY_SECTION_CHUNKS)
+    ]
+    with ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY, thread_name_prefix="summaries") as executor:
+        section_texts = list(executor.map(lambda s: _summarize("\n\n".join(s[0]), SECTION_PROMPT), sections))
+
+    if len(sections) == 1:
+        document_text = section_texts[0]
+    else:
+        document_text = _summarize("\n\n---\n\n".join(section_texts), DOCUMENT_PROMPT)
+
+    def meta(level: str, metas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "doc_id": doc_id,
+            "title": base.get("title", ""),
+            "user_id": base.get("user_id", ""),
+            "is_global": base.get("is_global", "False"),
+            "level": level,
+            "page_start": metas[0].get("page_start", 1),
+            "page_end": metas[-1].get("page_end", 1),
+        }
+
+    ids = [f"{doc_id}_summary"] + [f"{doc_id}_section_{n}" for n in range(len(sections))]
+    documents = [document_text] + section_texts
+    metadatas = [meta("document", chunks["metadatas"])] + [meta("section", metas) for _, metas in sections]
+    for m, text in zip(metadatas, documents):
+        m["tokens"] = " ".join(analyzer.tokens(text))
+    # Titles are embedded with the text so "summarize the leave policy" finds the right entry
+    embed_texts = [f"{base.get('title', '')}\n{text}" for text in documents]
+    get_summary_store().upsert(ids, embedding_fn(embed_texts), documents, metadatas)
+    metrics.observe("summaries_ms", (time.perf_counter() - start) * 1000)
+    print(f"📝 Summarized '{base.get('title', doc_id)}': {len(sections)} sections")
+    return len(ids)
+
+def schedule_summaries(doc_id: str) -> bool:
+    return jobs.schedule(f"summaries:{doc_id}", summarize_document, doc_id)
+
+def delete_summaries(doc_id: str):
+    # Also when disabled: summaries built while they were enabled must not outlive their document
+    get_summary_store().delete_document(doc_id)
+
+def retrieve_summary(query: str, user_id: int) -> List[Dict[str, Any]]:
+    """The closest precomputed summary for a summary-type question, as a one-item hit list.
+
+    Empty when the question isn't asking for a summary or nothing close
+    enough has been summarized yet; callers then fall back to chunk retrieval.
+    """
+    if not is_summary_query(query):
+        return []
+    try:
+        summary_store = get_summary_store()
+        res = summary_store.query(embedding_fn([query]), n_results=3, user_id=user_id)
+        ids, dists = res["ids"][0], res["distances"][0]
+        if not ids or dists[0] > SUMMARY_MAX_DISTANCE:
+            return []
+        fetched = summary_store.get(ids[:1], include=["documents", "metadatas"])
+        if not fetched["ids"]:
+            return []
+        return [{
+            "id": fetched["ids"][0],
+            "chunk": fetched["documents"][0],
+            "meta": fetched["metadatas"][0],
+            "score": 1 - dists[0],
+        }]
+    except Exception as e:
+        print(f"Summary retrieval error: {e}")
+        return []
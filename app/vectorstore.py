@@ -0,0 +1,609 @@
+import os, json, fcntl, threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext as _nullcontext
+from typing import List, Dict, Any, Sequence
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "chroma" or "mmap"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_data")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "docs")
+ACTIVE_COLLECTION_FILE = os.path.join(CHROMA_PATH, "active_collection")
+# HNSW index parameters, applied when a collection is created.
+# MiniLM embeddings are meant to be compared by cosine similarity.
+HNSW_SPACE = os.getenv("HNSW_SPACE", "cosine")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "64"))
+
+MMAP_STORE_PATH = os.getenv("MMAP_STORE_PATH", "./vector_data")
+# "float16" or "int8" (per-row symmetric scale)
+MMAP_STORE_DTYPE = os.getenv("MMAP_STORE_DTYPE", "float16")
+# "exact" or "ivf"; IVF falls back to exact until `python -m app.rebuild_index --build-ivf` has run
+MMAP_STORE_INDEX = os.getenv("MMAP_STORE_INDEX", "exact")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "256"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+# Rows scored per matrix product, bounding temporary float32 memory
+SEARCH_BLOCK_ROWS = 65536
+
+def hnsw_metadata(
+    space: str = HNSW_SPACE,
+    m: int = HNSW_M,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF,
+) -> Dict[str, Any]:
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+def active_collection_name(pointer_file: str = ACTIVE_COLLECTION_FILE, default: str = CHROMA_COLLECTION) -> str:
+    """Collection currently serving queries; rebuild_index.py flips this pointer"""
+    try:
+        with open(pointer_file, encoding="utf-8") as f:
+            return f.read().strip() or default
+    except FileNotFoundError:
+        return default
+
+@contextmanager
+def _flocked(path: str, mode: int):
+    with open(path, "w") as lock:
+        fcntl.flock(lock, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def write_freeze(pointer_file: str = ACTIVE_COLLECTION_FILE):
+    """Hold off ChromaStore writes in every process until the block exits.
+
+    rebuild_index.py holds this across its final sync and the pointer flip,
+    so no write can land in the old collection after it was last copied.
+    """
+    return _flocked(pointer_file + ".lock", fcntl.LOCK_EX)
+
+try:
+    from chromadb.errors import NotFoundError
+    # Older Chroma releases raise ValueError for a missing collection
+    _COLLECTION_MISSING = (ValueError, NotFoundError)
+except ImportError:
+    _COLLECTION_MISSING = (ValueError,)
+
+class VectorStore(ABC):
+    """Storage behind retrieval and ingest.
+
+    Every search is scoped to a user: it sees global (admin) chunks plus the
+    chunks owned by ``user_id``; ``user_id=None`` searches everything.
+    Distances are "smaller is closer" in the backend's metric.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def query(self, embeddings: Sequence[Sequence[float]], n_results: int, user_id: int | str | None = None) -> Dict[str, List[List[Any]]]:
+        """One ranked list per query embedding: {"ids": [[...]], "distances": [[...]]}"""
+
+    @abstractmethod
+    def get(self, ids: List[str], include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, List[Any]]:
+        """Rows for the given ids (missing ids are skipped) with the requested fields"""
+
+    @abstractmethod
+    def scan(self, user_id: int | str | None = None, limit: int = 100, include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, List[Any]]:
+        """Up to ``limit`` in-scope rows in storage order"""
+
+    @abstractmethod
+    def delete_document(self, doc_id: str):
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+class ChromaStore(VectorStore):
+    def __init__(self, client, embedding_function=None, collection_name: str = CHROMA_COLLECTION, pointer_file: str = ACTIVE_COLLECTION_FILE):
+        self.client = client
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.pointer_file = pointer_file
+        self._active = {"mtime": None, "collection": None}
+
+    @property
+    def collection(self):
+        """The active collection, reopened when the pointer file changes"""
+        try:
+            mtime = os.stat(self.pointer_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._active["collection"] is None or mtime != self._active["mtime"]:
+            name = active_collection_name(self.pointer_file, self.collection_name)
+            try:
+                # HNSW parameters are fixed at creation; existing collections keep theirs
+                coll = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+            except _COLLECTION_MISSING:
+                coll = self.client.create_collection(name=name, embedding_function=self.embedding_function, metadata=hnsw_metadata())
+            self._active.update(mtime=mtime, collection=coll)
+        return self._active["collection"]
+
+    @staticmethod
+    def _where(user_id):
+        if user_id is None:
+            return None
+        return {
+            "$or": [
+                {"is_global": "True"},  # Admin documents
+                {"user_id": str(user_id)}  # User's own documents (if any)
+            ]
+        }
+
+    def _writing(self):
+        """Shared with other writers, exclusive with write_freeze(); the collection is resolved inside it"""
+        return _flocked(self.pointer_file + ".lock", fcntl.LOCK_SH)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        with self._writing():
+            self.collection.upsert(ids=ids, embeddings=[list(map(float, e)) for e in embeddings], documents=documents, metadatas=metadatas)
+
+    def query(self, embeddings, n_results, user_id=None):
+        res = self.collection.query(
+            query_embeddings=[list(map(float, e)) for e in embeddings],
+            n_results=n_results,
+            where=self._where(user_id),
+            include=["distances"],
+        )
+        return {"ids": res["ids"], "distances": res["distances"]}
+
+    def get(self, ids, include=("documents", "metadatas")):
+        ids = list(ids)
+        if not ids:
+            # Chroma rejects get(ids=[]), and older versions return the whole collection
+            return {key: [] for key in ("ids", *include)}
+        res = self.collection.get(ids=ids, include=list(include))
+        return {key: res[key] for key in ("ids", *include)}
+
+    def scan(self, user_id=None, limit=100, include=("documents", "metadatas")):
+        res = self.collection.get(where=self._where(user_id), limit=limit, include=list(include))
+        return {key: res[key] for key in ("ids", *include)}
+
+    def delete_document(self, doc_id):
+        with self._writing():
+            self.collection.delete(where={"doc_id": doc_id})
+
+    def count(self):
+        return self.collection.count()
+
+class _Snapshot:
+    """One committed version of an MmapStore, swapped in whole so readers never mix versions"""
+
+    def __init__(self, store: "MmapStore", manifest: Dict[str, Any], columns: Dict[str, np.ndarray], stamp):
+        self.manifest = manifest
+        self.columns = columns
+        self.stamp = stamp
+        n, dim = manifest["count"], manifest["dim"]
+        np_dtype = np.float16 if store.dtype == "float16" else np.int8
+        self.vectors = np.memmap(store._data("vectors.bin", manifest), dtype=np_dtype, mode="r", shape=(n, dim)) if n else np.zeros((0, dim), dtype=np_dtype)
+        self.scales = (
+            np.memmap(store._data("scales.bin", manifest), dtype=np.float32, mode="r", shape=(n,))
+            if n and store.dtype == "int8" else None
+        )
+        self.doc_codes = {d: i for i, d in enumerate(manifest["docs"])}
+        self.user_codes = {u: i for i, u in enumerate(manifest["users"])}
+        self._store = store
+        self._row_list = None
+        self._ids = None
+
+    def id_list(self) -> List[str]:
+        """Row -> id for every committed row, live or not"""
+        if self._row_list is None:
+            if self.manifest["count"]:
+                with open(self._store._data("ids.txt", self.manifest), "rb") as f:
+                    data = f.read(self.manifest["ids_bytes"])
+                self._row_list = data.decode("utf-8").split("\n")[:self.manifest["count"]]
+            else:
+                self._row_list = []
+        return self._row_list
+
+    def row_ids(self) -> Dict[str, int]:
+        """Live id -> row"""
+        if self._ids is None:
+            row_list = self.id_list()
+            self._ids = {row_list[row]: int(row) for row in np.flatnonzero(self.columns["alive"])}
+        return self._ids
+
+    def rows(self, rows) -> np.ndarray:
+        """Dequantised float32 vectors for a slice or an index array"""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[rows])[:, None]
+        return block
+
+    def scope_mask(self, user_id) -> np.ndarray:
+        alive = self.columns["alive"]
+        if user_id is None:
+            return alive
+        code = self.user_codes.get(str(user_id), -1)
+        return alive & (self.columns["is_global"] | (self.columns["user_code"] == code))
+
+    def read_rows(self, rows) -> List[Dict[str, Any]]:
+        offsets = self.columns["offsets"]
+        out = []
+        with open(self._store._data("rows.jsonl", self.manifest), "rb") as f:
+            for row in rows:
+                f.seek(int(offsets[row]))
+                out.append(json.loads(f.read(int(offsets[row + 1] - offsets[row]))))
+        return out
+
+class MmapStore(VectorStore):
+    """Append-only, memory-mapped vector store shared across worker processes.
+
+    Layout under ``path``:
+      vectors.bin        row-major float16 or int8 embeddings (L2-normalised)
+      scales.bin         float32 per-row scale (int8 only)
+      ids.txt            one chunk id per line, row-aligned
+      rows.jsonl         one {"id", "document", "metadata"} record per row
+      columns.npz        offsets, alive mask, doc/user codes, global flag, IVF lists,
+                         plus the manifest (row count, dimension, dtype, code
+                         tables, generation); replacing this one file is the commit
+
+    Upserts and deletes only append rows and clear alive bits; ``compact``
+    rewrites the live rows into the next generation of data files
+    (``vectors.<gen>.bin`` ...), dropping retired ones.
+
+    Vectors are read through ``np.memmap`` so every worker maps the same
+    page-cache pages instead of holding a private copy. Writers take an
+    exclusive ``flock``, append, then atomically replace columns.npz;
+    readers notice the new file and remap. Scope filters are vectorised
+    over the columnar metadata. Distances are cosine distances.
+    """
+
+    def __init__(self, path: str = MMAP_STORE_PATH, dtype: str = MMAP_STORE_DTYPE, index: str = MMAP_STORE_INDEX):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.index = index
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._snap = None
+        self._warned_no_ivf = False
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _data(self, name: str, manifest: Dict[str, Any] | int) -> str:
+        """A data file of the manifest's generation; generation 0 keeps the plain names"""
+        gen = manifest if isinstance(manifest, int) else manifest.get("gen", 0)
+        if not gen:
+            return self._file(name)
+        stem, ext = os.path.splitext(name)
+        return self._file(f"{stem}.{gen}{ext}")
+
+    # ---------- reading ----------
+    def _snapshot(self, force: bool = False) -> _Snapshot:
+        """Current committed version; one stat() when nothing changed"""
+        try:
+            st = os.stat(self._file("columns.npz"))
+            # os.replace gives every commit a new inode, so this can't miss one
+            stamp = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            stamp = None
+        snap = self._snap
+        if snap is not None and snap.stamp == stamp and not force:
+            return snap
+        with self._lock if not force else _nullcontext():
+            if stamp is None:
+                manifest = {"count": 0, "dim": 0, "dtype": self.dtype, "ids_bytes": 0, "docs": [], "users": []}
+                columns = {
+                    "offsets": np.zeros(1, dtype=np.int64),
+                    "alive": np.zeros(0, dtype=bool),
+                    "doc_code": np.zeros(0, dtype=np.int32),
+                    "user_code": np.zeros(0, dtype=np.int32),
+                    "is_global": np.zeros(0, dtype=bool),
+                }
+            else:
+                # One file, one read: the manifest can't come from a different commit than the columns
+                with np.load(self._file("columns.npz")) as data:
+                    columns = {k: data[k] for k in data.files if k != "manifest"}
+                    if "manifest" in data.files:
+                        manifest = json.loads(str(data["manifest"]))
+                    else:
+                        # Written before the manifest moved into columns.npz; upgraded on the next write
+                        with open(self._file("manifest.json"), encoding="utf-8") as f:
+                            manifest = json.load(f)
+            if manifest["count"] and manifest["dtype"] != self.dtype:
+                raise ValueError(f"Store at {self.path} holds {manifest['dtype']} vectors")
+            self._snap = _Snapshot(self, manifest, columns, stamp)
+        return self._snap
+
+    def _candidate_rows(self, snap: _Snapshot, q: np.ndarray, mask: np.ndarray) -> np.ndarray | None:
+        """Rows to score for one query under IVF, or None for an exact scan"""
+        lists = snap.columns.get("ivf_assign")
+        if self.index != "ivf":
+            return None
+        if lists is None:
+            if not self._warned_no_ivf:
+                self._warned_no_ivf = True
+                print(f"MMAP_STORE_INDEX=ivf but {self.path} has no IVF index; using exact search "
+                      "(build it with python -m app.rebuild_index --build-ivf)")
+            return None
+        centroids = snap.columns["ivf_centroids"]
+        nprobe = min(IVF_NPROBE, len(centroids))
+        probe = np.argpartition(-(centroids @ q), nprobe - 1)[:nprobe]
+        return np.flatnonzero(mask & np.isin(lists, probe))
+
+    def query(self, embeddings, n_results, user_id=None):
+        snap = self._snapshot()
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        n = snap.manifest["count"]
+        mask = snap.scope_mask(user_id)
+        if not n or not mask.any():
+            return {"ids": [[] for _ in queries], "distances": [[] for _ in queries]}
+
+        row_list = snap.id_list()
+        out_ids, out_dists = [], []
+        exact = None
+        for qi, q in enumerate(queries):
+            rows = self._candidate_rows(snap, q, mask)
+            if rows is None:
+                if exact is None:
+                    # All queries against each block in one product
+                    exact = np.empty((len(queries), n), dtype=np.float32)
+                    for start in range(0, n, SEARCH_BLOCK_ROWS):
+                        stop = min(start + SEARCH_BLOCK_ROWS, n)
+                        exact[:, start:stop] = queries @ snap.rows(slice(start, stop)).T
+                    exact[:, ~mask] = -np.inf
+                scores = exact[qi]
+                rows = np.arange(n)
+            else:
+                scores = snap.rows(rows) @ q
+            k = min(n_results, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                out_ids.append([])
+                out_dists.append([])
+                continue
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            out_ids.append([row_list[int(rows[i])] for i in top])
+            out_dists.append([float(1 - scores[i]) for i in top])
+        return {"ids": out_ids, "distances": out_dists}
+
+    def get(self, ids, include=("documents", "metadatas")):
+        snap = self._snapshot()
+        row_ids = snap.row_ids()
+        rows = [row_ids[i] for i in ids if i in row_ids]
+        return self._materialize(snap, rows, include)
+
+    def scan(self, user_id=None, limit=100, include=("documents", "metadatas")):
+        snap = self._snapshot()
+        rows = np.flatnonzero(snap.scope_mask(user_id))[:limit]
+        return self._materialize(snap, [int(r) for r in rows], include)
+
+    def _materialize(self, snap: _Snapshot, rows: List[int], include) -> Dict[str, List[Any]]:
+        out = {"ids": [snap.id_list()[r] for r in rows]}
+        if "documents" in include or "metadatas" in include:
+            records = snap.read_rows(rows)
+            if "documents" in include:
+                out["documents"] = [r["document"] for r in records]
+            if "metadatas" in include:
+                out["metadatas"] = [r["metadata"] for r in records]
+        if "embeddings" in include:
+            out["embeddings"] = snap.rows(np.asarray(rows, dtype=np.int64)).tolist() if rows else []
+        return out
+
+    def count(self):
+        return int(self._snapshot().columns["alive"].sum())
+
+    # ---------- writing ----------
+    @contextmanager
+    def _writer(self):
+        """Exclusive across threads and processes; yields a private copy of the latest version"""
+        with self._lock, open(self._file("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another process may have committed since we last looked
+                snap = self._snapshot(force=True)
+                manifest = json.loads(json.dumps(snap.manifest))
+                columns = dict(snap.columns)
+                yield snap, manifest, columns
+                self._commit(manifest, columns)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _commit(self, manifest: Dict[str, Any], columns: Dict[str, np.ndarray]):
+        """Persist columns and manifest together; the columns.npz replace is the commit point"""
+        columns_tmp = self._file("columns.tmp.npz")
+        np.savez(columns_tmp, manifest=np.array(json.dumps(manifest)), **columns)
+        os.replace(columns_tmp, self._file("columns.npz"))
+        self._snapshot(force=True)
+
+    def _truncate_uncommitted(self, manifest: Dict[str, Any], columns: Dict[str, np.ndarray]):
+        """Drop bytes a crashed writer appended past the last commit"""
+        n, dim = manifest["count"], manifest["dim"]
+        width = 2 if self.dtype == "float16" else 1
+        for name, size in (
+            ("vectors.bin", n * dim * width),
+            ("scales.bin", n * 4 if self.dtype == "int8" else 0),
+            ("ids.txt", manifest["ids_bytes"]),
+            ("rows.jsonl", int(columns["offsets"][-1])),
+        ):
+            path = self._data(name, manifest)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        # Last write wins for ids repeated within the batch
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) != len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+
+        with self._writer() as (snap, manifest, cols):
+            if manifest["count"] == 0:
+                manifest["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != manifest["dim"]:
+                raise ValueError(f"Expected {manifest['dim']}-d embeddings, got {vectors.shape[1]}")
+            self._truncate_uncommitted(manifest, cols)
+
+            # Upserts replace: retire earlier rows with the same ids
+            alive = cols["alive"].copy()
+            row_ids = snap.row_ids()
+            alive[[row_ids[i] for i in ids if i in row_ids]] = False
+
+            if self.dtype == "int8":
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+                stored = np.round(vectors / scales[:, None]).astype(np.int8)
+                with open(self._data("scales.bin", manifest), "ab") as f:
+                    f.write(scales.astype(np.float32).tobytes())
+            else:
+                stored = vectors.astype(np.float16)
+            with open(self._data("vectors.bin", manifest), "ab") as f:
+                f.write(stored.tobytes())
+
+            # Newline-terminated so the next append starts a fresh line
+            id_bytes = "".join(f"{i}\n" for i in ids).encode("utf-8")
+            with open(self._data("ids.txt", manifest), "ab") as f:
+                f.write(id_bytes)
+            manifest["ids_bytes"] += len(id_bytes)
+
+            offsets = [int(cols["offsets"][-1])]
+            with open(self._data("rows.jsonl", manifest), "ab") as f:
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    line = (json.dumps({"id": doc_id, "document": document, "metadata": metadata}) + "\n").encode("utf-8")
+                    f.write(line)
+                    offsets.append(offsets[-1] + len(line))
+
+            doc_codes = {d: i for i, d in enumerate(manifest["docs"])}
+            user_codes = {u: i for i, u in enumerate(manifest["users"])}
+            doc_code = [_code(manifest["docs"], doc_codes, m.get("doc_id", "")) for m in metadatas]
+            user_code = [_code(manifest["users"], user_codes, str(m.get("user_id", ""))) for m in metadatas]
+            cols["offsets"] = np.concatenate([cols["offsets"], np.asarray(offsets[1:], dtype=np.int64)])
+            cols["alive"] = np.concatenate([alive, np.ones(len(ids), dtype=bool)])
+            cols["doc_code"] = np.concatenate([cols["doc_code"], np.asarray(doc_code, dtype=np.int32)])
+            cols["user_code"] = np.concatenate([cols["user_code"], np.asarray(user_code, dtype=np.int32)])
+            cols["is_global"] = np.concatenate([cols["is_global"], np.asarray([m.get("is_global") == "True" for m in metadatas], dtype=bool)])
+            if "ivf_centroids" in cols:
+                assign = np.argmax(vectors @ cols["ivf_centroids"].T, axis=1).astype(np.int32)
+                cols["ivf_assign"] = np.concatenate([cols["ivf_assign"], assign])
+            manifest["count"] += len(ids)
+
+    def delete_document(self, doc_id):
+        with self._writer() as (snap, manifest, cols):
+            code = snap.doc_codes.get(doc_id)
+            if code is not None:
+                cols["alive"] = cols["alive"] & (cols["doc_code"] != code)
+
+    def compact(self) -> int:
+        """Rewrite live rows into a new generation of data files; returns rows dropped.
+
+        The previous generation stays on disk for reads already in flight and
+        is removed by the next compaction.
+        """
+        if self._snapshot().columns["alive"].all():
+            return 0
+        with self._writer() as (snap, manifest, cols):
+            self._truncate_uncommitted(manifest, cols)
+            live = np.flatnonzero(cols["alive"])
+            dropped = manifest["count"] - len(live)
+            if not dropped:
+                return 0
+            gen = manifest.get("gen", 0) + 1
+            self._remove_generation(gen - 2)
+
+            with open(self._data("vectors.bin", gen), "wb") as f:
+                for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(snap.vectors[live[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+            if snap.scales is not None:
+                with open(self._data("scales.bin", gen), "wb") as f:
+                    f.write(np.ascontiguousarray(snap.scales[live]).tobytes())
+            row_list = snap.id_list()
+            id_bytes = "".join(f"{row_list[r]}\n" for r in live).encode("utf-8")
+            with open(self._data("ids.txt", gen), "wb") as f:
+                f.write(id_bytes)
+
+            old_offsets = cols["offsets"]
+            offsets = np.zeros(len(live) + 1, dtype=np.int64)
+            with open(self._data("rows.jsonl", manifest), "rb") as src, open(self._data("rows.jsonl", gen), "wb") as dst:
+                for i, row in enumerate(live):
+                    src.seek(int(old_offsets[row]))
+                    line = src.read(int(old_offsets[row + 1] - old_offsets[row]))
+                    dst.write(line)
+                    offsets[i + 1] = offsets[i] + len(line)
+
+            cols["offsets"] = offsets
+            cols["alive"] = np.ones(len(live), dtype=bool)
+            for key in ("doc_code", "user_code", "is_global", "ivf_assign"):
+                if key in cols:
+                    cols[key] = cols[key][live]
+            manifest.update(count=len(live), ids_bytes=len(id_bytes), gen=gen)
+        return dropped
+
+    def _remove_generation(self, gen: int):
+        if gen < 0:
+            return
+        for name in ("vectors.bin", "scales.bin", "ids.txt", "rows.jsonl"):
+            try:
+                os.remove(self._data(name, gen))
+            except FileNotFoundError:
+                pass
+
+    def build_ivf(self, nlist: int = IVF_NLIST, iterations: int = 10, sample: int = 100_000):
+        """Train k-means centroids on a sample and assign every row to its nearest list"""
+        with self._writer() as (snap, manifest, cols):
+            n = manifest["count"]
+            if not n:
+                return
+            rng = np.random.default_rng(0)
+            nlist = min(nlist, n)
+            data = snap.rows(np.sort(rng.choice(n, size=min(sample, n), replace=False)))
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+            for _ in range(iterations):
+                assign = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, data)
+                filled = np.bincount(assign, minlength=nlist) > 0
+                centroids[filled] = _normalize(sums[filled])
+            lists = np.empty(n, dtype=np.int32)
+            for start in range(0, n, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, n)
+                lists[start:stop] = np.argmax(snap.rows(slice(start, stop)) @ centroids.T, axis=1)
+            cols["ivf_centroids"] = centroids.astype(np.float32)
+            cols["ivf_assign"] = lists
+
+def _code(table: List[str], codes: Dict[str, int], value: str) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(table)
+        table.append(value)
+    return code
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+def make_store(backend: str = VECTOR_STORE, embedding_function=None, name: str | None = None) -> VectorStore:
+    """The configured store; ``name`` opens a separate side store (e.g. "summaries")"""
+    if backend == "mmap":
+        return MmapStore(path=os.path.join(MMAP_STORE_PATH, name) if name else MMAP_STORE_PATH)
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=CHROMA_PATH)
+        if name:
+            return ChromaStore(
+                client, embedding_function,
+                collection_name=f"{CHROMA_COLLECTION}_{name}",
+                pointer_file=os.path.join(CHROMA_PATH, f"active_{name}_collection"),
+            )
+        return ChromaStore(client, embedding_function)
+    raise ValueError(f"Unknown VECTOR_STORE backend: {backend}")
@@ -0,0 +1,188 @@
+import os, time, threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from .db import SessionLocal
+from .models import Conversation
+from . import metrics
+
+load_dotenv()
+
+# Buffer conversation rows and commit them in groups instead of one transaction per message.
+# Trades durability for throughput: see ConversationWriter before enabling it, especially with several workers.
+CONVERSATION_WRITE_BEHIND = os.getenv("CONVERSATION_WRITE_BEHIND", "false").lower() == "true"
+# Longest a queued row waits before it is committed
+WRITE_BEHIND_FLUSH_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "250"))
+# A buffer this large is flushed right away
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))
+# Rows kept for retry after a failed flush; older ones are dropped beyond this
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+def conversation_rows(user_id: int, messages: List[Tuple[str, str]], thread_id: str | None = None) -> List[Dict]:
+    now = datetime.utcnow()
+    return [
+        {"user_id": user_id, "thread_id": thread_id, "role": role, "content": content, "created_at": now}
+        for role, content in messages
+    ]
+
+class ConversationWriter:
+    """Write-behind buffer for conversation rows.
+
+    Rows are stamped with created_at when queued, so history order is the
+    order messages were saved in, not the order flushes happened in. A
+    single background thread commits whatever is buffered every
+    WRITE_BEHIND_FLUSH_MS (sooner when the buffer fills) in one
+    transaction. Readers call flush(user_id) first so a user always sees
+    their own writes.
+
+    Limits, accepted in exchange for fewer transactions:
+
+    - Durability: a queued row lives only in this process's memory until it
+      is flushed. A clean shutdown flushes, but a crash or kill loses up to
+      WRITE_BEHIND_FLUSH_MS of saves that were already acknowledged.
+    - One worker: the buffer is per process, so flush(user_id) only drains
+      the current worker's rows. With several uvicorn workers a read served
+      by another worker can miss writes still queued here. Run one worker,
+      or leave CONVERSATION_WRITE_BEHIND off, where read-your-writes matters.
+
+    A batch rejected by the database (e.g. one row violating a constraint) is
+    retried row by row, so only the offending rows are dropped; when the
+    database is unreachable the whole batch is kept for the next attempt.
+    """
+
+    def __init__(self, flush_ms: int = WRITE_BEHIND_FLUSH_MS, max_rows: int = WRITE_BEHIND_MAX_ROWS):
+        self.flush_ms = flush_ms
+        self.max_rows = max_rows
+        self._rows: List[Dict] = []
+        self._lock = threading.Lock()
+        # Serializes flushes so rows are never committed twice or out of order
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def enqueue(self, user_id: int, messages: List[Tuple[str, str]], thread_id: str | None = None):
+        """Queue (role, content) pairs for one user"""
+        rows = conversation_rows(user_id, messages, thread_id)
+        with self._lock:
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.max_rows
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="conversation-writer", daemon=True)
+                self._thread.start()
+        metrics.incr("conversation_rows_queued", len(rows))
+        if full:
+            self._wake.set()
+
+    def pending(self, user_id: int | None = None) -> int:
+        with self._lock:
+            if user_id is None:
+                return len(self._rows)
+            return sum(1 for r in self._rows if r["user_id"] == user_id)
+
+    def discard(self, user_id: int, thread_id: str | None = None) -> int:
+        """Drop a user's queued rows, or one thread's (their history is being cleared)"""
+        with self._flush_lock, self._lock:
+            before = len(self._rows)
+            self._rows = [
+                r for r in self._rows
+                if r["user_id"] != user_id or (thread_id is not None and r["thread_id"] != thread_id)
+            ]
+            return before - len(self._rows)
+
+    def flush(self, user_id: int | None = None) -> int:
+        """Commit buffered rows now; with user_id, only if that user has any queued"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._rows or (user_id is not None and not any(r["user_id"] == user_id for r in self._rows)):
+                    return 0
+                rows, self._rows = self._rows, []
+            start = time.perf_counter()
+            try:
+                try:
+                    self._insert(rows)
+                except OperationalError:
+                    raise
+                except Exception as e:
+                    print(f"Conversation write-behind error, retrying row by row: {e}")
+                    metrics.incr("conversation_flush_failed")
+                    rows = self._insert_each(rows)
+            except Exception as e:
+                print(f"Conversation write-behind error: {e}")
+                metrics.incr("conversation_flush_failed")
+                with self._lock:
+                    # Database unavailable: keep the rows for the next attempt, oldest first, within bounds
+                    self._rows = (rows + self._rows)[-WRITE_BEHIND_MAX_PENDING:]
+                return 0
+            metrics.incr("conversation_rows_written", len(rows))
+            metrics.observe("conversation_flush_rows", len(rows))
+            metrics.observe("conversation_flush_ms", (time.perf_counter() - start) * 1000)
+            return len(rows)
+
+    @staticmethod
+    def _insert(rows: List[Dict]):
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(Conversation, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _insert_each(rows: List[Dict]) -> List[Dict]:
+        """Insert rows one savepoint at a time, dropping the ones the database rejects; returns those written"""
+        written = []
+        db = SessionLocal()
+        try:
+            for row in rows:
+                try:
+                    with db.begin_nested():
+                        db.bulk_insert_mappings(Conversation, [row])
+                except OperationalError:
+                    raise
+                except Exception as e:
+                    print(f"Dropping conversation row for user {row['user_id']}: {e}")
+                    metrics.incr("conversation_rows_rejected")
+                    continue
+                written.append(row)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return written
+
+    def _work(self):
+        while True:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            self.flush()
+
+writer = ConversationWriter()
+
+def save_messages(user_id: int, messages: List[Tuple[str, str]], thread_id: str | None = None, db: Session | None = None):
+    """Queue messages when write-behind is on; otherwise commit them now.
+
+    Without write-behind the rows go into db, the caller's session (a new one
+    when None), and a failed commit raises to the caller instead of being
+    retried in the background.
+    """
+    if CONVERSATION_WRITE_BEHIND:
+        writer.enqueue(user_id, messages, thread_id)
+        return
+    rows = conversation_rows(user_id, messages, thread_id)
+    if db is None:
+        ConversationWriter._insert(rows)
+    else:
+        try:
+            db.bulk_insert_mappings(Conversation, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    metrics.incr("conversation_rows_written", len(rows))
@@ -0,0 +1,79 @@
+"""Analyzer throughput: MB of chunk text tokenized per second.
+
+Compares the compiled single-pass analyzer with the previous
+lower/str.replace/split normalisation. Pass a UTF-8 text file to measure on
+real corpus text; otherwise a synthetic policy-like corpus is used.
+
+    python benchmarks/bench_analyzer.py [corpus.txt] [--mb 8]
+"""
+import os, sys, time, random, argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.analyzer import Analyzer, LEXICON
+
+WORDS = (
+    "employee employees policy policies leave holiday holidays bonus referral performance "
+    "improvement plan remote work from home manager approval days annual sick casual the of "
+    "and to in for is are will be with on per year month notice period eligible 2025 10 15"
+).split()
+
+def legacy_normalize(text: str):
+    text = text.lower().strip()
+    for typo, correct in LEXICON["typos"].items():
+        text = text.replace(typo, correct)
+    return text.split()
+
+def synthetic_corpus(mb: float) -> str:
+    rng = random.Random(0)
+    target = int(mb * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + ". "
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+def measure(fn, chunks, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for chunk in chunks:
+            fn(chunk)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?")
+    parser.add_argument("--mb", type=float, default=8.0)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_corpus(args.mb)
+    # Roughly chunk-sized pieces, as BM25 sees them
+    chunks = [text[i:i + 1200] for i in range(0, len(text), 1200)]
+    mb = len(text.encode("utf-8")) / (1024 * 1024)
+
+    rows = [
+        ("legacy normalize+split", legacy_normalize),
+        ("analyzer (stem+stopwords)", Analyzer(LEXICON, stem=True, stopwords=True).tokens),
+        ("analyzer (plain)", Analyzer(LEXICON, stem=False, stopwords=False).tokens),
+    ]
+    print(f"corpus: {mb:.2f} MB in {len(chunks)} chunks")
+    for name, fn in rows:
+        elapsed = measure(fn, chunks)
+        print(f"{name:<28} {mb / elapsed:8.2f} MB/s  ({elapsed * 1000:.1f} ms)")
+
+    # What a query pays to build BM25 input over the 100-chunk candidate pool
+    pool = chunks[:100]
+    stored = [" ".join(rows[1][1](c)) for c in pool]
+    before = measure(legacy_normalize, pool, repeat=20)
+    after = measure(str.split, stored, repeat=20)
+    print(f"per-query pool prep: re-normalize {before * 1000:.2f} ms -> stored tokens {after * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Authentication throughput: per-request user lookup vs the cached path.
+
+Both paths decode and verify the same JWT. The uncached path then loads
+the user from the configured database (DATABASE_URL), as get_current_user
+used to on every request. The cached path is the current get_current_user,
+which only reads the database on a miss. Threads mimic concurrent
+requests in one worker.
+
+    python benchmarks/bench_auth.py --email admin@example.com [--threads 8] [--seconds 5]
+"""
+import os, sys, time, asyncio, argparse, threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from jose import jwt
+from app.db import SessionLocal
+from app.models import User
+from app.auth import get_current_user, create_access_token, get_user_by_email, SECRET_KEY, ALGORITHM
+
+def uncached(token: str):
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    db = SessionLocal()
+    try:
+        return db.query(User).get(int(payload["sub"]))
+    finally:
+        db.close()
+
+_loops = threading.local()
+
+def cached(token: str):
+    # get_current_user is a coroutine; each thread drives it on its own loop
+    loop = getattr(_loops, "loop", None)
+    if loop is None:
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(get_current_user(token=token))
+
+def qps(fn, token: str, threads: int, seconds: float) -> float:
+    counts = [0] * threads
+    stop = time.perf_counter() + seconds
+
+    def work(i):
+        n = 0
+        while time.perf_counter() < stop:
+            fn(token)
+            n += 1
+        counts[i] = n
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--email", required=True, help="an existing user to authenticate as")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = get_user_by_email(db, args.email)
+        if not user:
+            sys.exit(f"No user {args.email}")
+        token = create_access_token({"sub": str(user.id)})
+    finally:
+        db.close()
+
+    print(f"{'threads':>7} {'uncached qps':>13} {'cached qps':>11} {'speedup':>8}")
+    for threads in args.threads:
+        before = qps(uncached, token, threads, args.seconds)
+        cached(token)  # warm the cache, as the first request would
+        after = qps(cached, token, threads, args.seconds)
+        print(f"{threads:>7} {before:>13.0f} {after:>11.0f} {after / before:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
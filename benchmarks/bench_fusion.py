@@ -0,0 +1,62 @@
+"""Fusion cost for many legs of many candidates.
+
+Compares app.fusion (integer-coded NumPy accumulation with partial top-k
+selection) against the previous dict-and-full-sort RRF.
+
+    python benchmarks/bench_fusion.py [--legs 8] [--depth 500] [--top-k 16]
+"""
+import os, sys, time, random, argparse, uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from app.fusion import weighted_rrf, comb_sum, comb_mnz
+
+def legacy_rrf(results_list, k=60):
+    fused_scores = {}
+    for results in results_list:
+        for rank, (doc_id, score) in enumerate(results):
+            if doc_id not in fused_scores:
+                fused_scores[doc_id] = 0
+            fused_scores[doc_id] += 1 / (k + rank + 1)
+    return sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+
+def timeit(fn, repeat: int = 200) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legs", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    universe = [f"{uuid.UUID(int=rng.getrandbits(128))}_{i}" for i in range(args.depth * 2)]
+    legs = []
+    for _ in range(args.legs):
+        ids = rng.sample(universe, args.depth)
+        legs.append((ids, np.sort(np.random.default_rng(0).random(args.depth))[::-1]))
+    tuples = [list(zip(ids, scores)) for ids, scores in legs]
+
+    top = weighted_rrf(legs, top_k=args.top_k)
+    expected = legacy_rrf(tuples)[:args.top_k]
+    assert np.allclose([s for _, s in top], [s for _, s in expected])
+
+    print(f"{args.legs} legs x {args.depth} candidates, top {args.top_k}")
+    rows = [
+        ("legacy dict + sort", lambda: legacy_rrf(tuples)[:args.top_k]),
+        ("weighted_rrf", lambda: weighted_rrf(legs, top_k=args.top_k)),
+        ("comb_sum", lambda: comb_sum(legs, top_k=args.top_k)),
+        ("comb_mnz", lambda: comb_mnz(legs, top_k=args.top_k)),
+    ]
+    for name, fn in rows:
+        print(f"{name:<20} {timeit(fn):9.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Per-query cost of the retrieval data path: eager text vs lazy hydration.
+
+The eager path is what ``retrieve`` used to do: scan the BM25 pool with
+documents and metadatas, then look up text for every fused hit. The lazy
+path scans metadata only (stored BM25 tokens), ranks ids and scores, and
+fetches text and metadata for the final top-k in one ``get``. Embedding and
+generation are left out; the corpus is synthetic, with realistic chunk sizes.
+
+Reports median latency and the tracemalloc peak per query for each backend.
+
+    python benchmarks/bench_retrieve.py [--rows 5000] [--pool 100] [--k 8]
+"""
+import os, sys, time, random, shutil, tempfile, argparse, tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import chromadb
+from rank_bm25 import BM25Okapi
+from app.analyzer import analyzer
+from app.fusion import weighted_rrf
+from app.vectorstore import ChromaStore, MmapStore
+from bench_analyzer import synthetic_corpus
+
+def corpus(rows: int, dim: int = 384):
+    rng = np.random.default_rng(0)
+    text = synthetic_corpus(rows * 1200 / (1024 * 1024))  # ~1.2 KB per chunk, like 256-token chunks
+    step = len(text) // rows
+    ids, docs, metas = [], [], []
+    for i in range(rows):
+        chunk = text[i * step:(i + 1) * step]
+        ids.append(f"doc{i // 40}_{i}")
+        docs.append(chunk)
+        metas.append({
+            "user_id": "global",
+            "doc_id": f"doc{i // 40}",
+            "title": f"Document {i // 40}",
+            "is_global": "True",
+            "uploaded_by": "1",
+            "page_start": 1,
+            "page_end": 1,
+            "tokens": " ".join(analyzer.tokens(chunk)),
+        })
+    return ids, rng.normal(size=(rows, dim)).astype(np.float32), docs, metas
+
+def eager(store, query, q_emb, pool, k):
+    res = store.scan(user_id=1, limit=pool)
+    ids, docs, metas = res["ids"], res["documents"], res["metadatas"]
+    semantic = store.query(q_emb, n_results=k * 2, user_id=1)
+    bm25 = BM25Okapi([m["tokens"].split() for m in metas])
+    scores = bm25.get_scores(analyzer.tokens(query))
+    top = np.argsort(-scores)[:k * 2]
+    fused = weighted_rrf([(semantic["ids"][0], None), ([ids[i] for i in top], None)], top_k=k)
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+    return [{"id": d, "chunk": docs[position[d]], "meta": metas[position[d]], "score": s} for d, s in fused if d in position]
+
+def lazy(store, query, q_emb, pool, k):
+    res = store.scan(user_id=1, limit=pool, include=("metadatas",))
+    ids, metas = res["ids"], res["metadatas"]
+    semantic = store.query(q_emb, n_results=k * 2, user_id=1)
+    bm25 = BM25Okapi([m["tokens"].split() for m in metas])
+    scores = bm25.get_scores(analyzer.tokens(query))
+    top = np.argsort(-scores)[:k * 2]
+    fused = weighted_rrf([(semantic["ids"][0], None), ([ids[i] for i in top], None)], top_k=k)
+    fetched = store.get([d for d, _ in fused], include=["documents", "metadatas"])
+    found = {i: (doc, meta) for i, doc, meta in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])}
+    return [{"id": d, "chunk": found[d][0], "meta": found[d][1], "score": s} for d, s in fused if d in found]
+
+def measure(paths, store, queries, emb, pool, k):
+    """Median latency (ms) and tracemalloc peak (KB) per path; paths are
+    interleaved per query so caching and drift hit them equally"""
+    for fn in paths.values():
+        for q, e in zip(queries[:3], emb[:3]):
+            fn(store, q, e[None, :], pool, k)  # warm caches and memory maps
+    latencies = {label: [] for label in paths}
+    peaks = {label: [] for label in paths}
+    for n, (q, e) in enumerate(zip(queries, emb)):
+        order = list(paths.items())
+        for label, fn in order if n % 2 else order[::-1]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            fn(store, q, e[None, :], pool, k)
+            latencies[label].append(time.perf_counter() - start)
+            peaks[label].append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return {label: (float(np.median(latencies[label]) * 1000), float(np.median(peaks[label]) / 1024)) for label in paths}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--pool", type=int, default=100)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    ids, emb, docs, metas = corpus(args.rows)
+    rng = random.Random(1)
+    queries = [" ".join(rng.choice(docs[rng.randrange(len(docs))].split()[:20]) for _ in range(5)) for _ in range(args.queries)]
+    q_emb = np.random.default_rng(1).normal(size=(args.queries, emb.shape[1])).astype(np.float32)
+
+    tmp = tempfile.mkdtemp(prefix="bench_retrieve_")
+    try:
+        stores = {
+            "chroma": ChromaStore(chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))),
+            "mmap": MmapStore(path=os.path.join(tmp, "mmap")),
+        }
+        print(f"{args.rows} chunks, pool {args.pool}, top-{args.k}, {args.queries} queries")
+        print(f"{'backend':<8} {'path':<6} {'p50 ms':>8} {'peak KB':>9}")
+        for name, store in stores.items():
+            for s in range(0, args.rows, 1000):
+                store.upsert(ids[s:s + 1000], emb[s:s + 1000], docs[s:s + 1000], metas[s:s + 1000])
+            results = measure({"eager": eager, "lazy": lazy}, store, queries, q_emb, args.pool, args.k)
+            for label, (ms, kb) in results.items():
+                print(f"{name:<8} {label:<6} {ms:>8.2f} {kb:>9.0f}")
+            (e_ms, e_kb), (l_ms, l_kb) = results["eager"], results["lazy"]
+            print(f"{name:<8} {'delta':<6} {l_ms - e_ms:>+8.2f} {l_kb - e_kb:>+9.0f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
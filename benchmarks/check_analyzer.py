@@ -0,0 +1,47 @@
+"""Conformance check: chunk text and queries must analyze to matching terms.
+
+BM25 only scores exact term matches, so a word written differently in a
+chunk (possessive, or plural when stemming) must reduce to the same
+term as the plain query word. Exits non-zero on any mismatch.
+
+    python benchmarks/check_analyzer.py
+"""
+import os, sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.analyzer import Analyzer, LEXICON
+
+failures = []
+
+def check(cond: bool, message: str):
+    print(("  ok    " if cond else "  FAIL  ") + message)
+    if not cond:
+        failures.append(message)
+
+# (chunk text, query, query word that must match a chunk term)
+POSSESSIVES = [
+    ("The employee's leave policy", "employee leave", "employee"),
+    ("See the manager's approval form", "manager approval", "manager"),
+    ("HR's holiday calendar", "hr holiday", "hr"),
+]
+# Only equal once plurals are stemmed
+PLURALS = [
+    ("All employees' benefits are listed", "employee benefit", "employee"),
+    ("Leave policies apply", "leave policy", "policy"),
+]
+
+def main():
+    for stem in (True, False):
+        analyzer = Analyzer(LEXICON, stem=stem, stopwords=True)
+        print(f"stem={stem}")
+        for chunk, query, word in POSSESSIVES + (PLURALS if stem else []):
+            chunk_terms = analyzer.tokens(chunk)
+            term = analyzer.tokens(word)[0]
+            check(term in analyzer.tokens(query) and term in chunk_terms, f"{chunk!r} matches {query!r} on {term!r}")
+            check(not any(t.endswith("'") for t in chunk_terms), f"{chunk!r} leaves no dangling apostrophe {chunk_terms}")
+    print(f"\n{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
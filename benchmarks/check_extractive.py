@@ -0,0 +1,71 @@
+"""Conformance check: the extractive fast path's margin gate under every fusion method.
+
+Builds hits the way retrieve_batch does: semantic and BM25 legs fused by
+each FUSION_METHOD, with the query's cosine similarity kept per hit. A
+clear single-chunk hit must pass the gate and be answered extractively;
+near-ties, on similarity or on rerank probability, must go to the LLM.
+Exits non-zero on any failure.
+
+    python benchmarks/check_extractive.py
+"""
+import os, sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.extractive import extract_answer, score_margin, EXTRACTIVE_MIN_MARGIN
+from app.fusion import FUSION_METHODS
+
+failures = []
+
+def check(cond: bool, message: str):
+    print(("  ok    " if cond else "  FAIL  ") + message)
+    if not cond:
+        failures.append(message)
+
+QUERY = "How many days of annual leave do employees get?"
+CHUNKS = {
+    "leave_0": "Annual leave. Full-time employees get 24 days of annual leave per calendar year. Unused days lapse in March.",
+    "travel_3": "Travel claims must be filed within 30 days of the trip, with receipts attached.",
+    "holiday_1": "The office observes 12 public holidays each year; the list is published in December.",
+    "benefits_2": "Employees may enrol dependants in the health plan during the annual enrolment window.",
+}
+
+def hits_for(method: str, similarity: dict):
+    """Fused hits for one query: semantic leg ordered by similarity, BM25 leg with the same leader"""
+    semantic = sorted(similarity, key=similarity.get, reverse=True)
+    bm25 = ["leave_0", "benefits_2", "holiday_1", "travel_3"]
+    fused = FUSION_METHODS[method](
+        [(semantic, [1 / (2 - similarity[i]) for i in semantic]), (bm25, [9.1, 4.2, 3.8, 1.5])],
+        weights=[1.0, 1.0],
+        top_k=4,
+    )
+    return [{"id": i, "score": s, "similarity": similarity[i], "chunk": CHUNKS[i], "meta": {}} for i, s in fused]
+
+def main():
+    clear = {"leave_0": 0.71, "benefits_2": 0.42, "holiday_1": 0.38, "travel_3": 0.21}
+    tie = {"leave_0": 0.63, "benefits_2": 0.61, "holiday_1": 0.38, "travel_3": 0.21}
+    for method in FUSION_METHODS:
+        print(f"fusion={method}")
+        hits = hits_for(method, clear)
+        fused_margin = (hits[0]["score"] - hits[1]["score"]) / hits[0]["score"]
+        margin = score_margin(hits)
+        check(margin >= EXTRACTIVE_MIN_MARGIN, f"clear hit passes the gate: margin {margin:.2f} (fused-score margin {fused_margin:.2f})")
+        answer = extract_answer(QUERY, hits)
+        check(answer is not None and "24 days" in answer["answer"], f"clear hit answered extractively: {answer and answer['answer']!r}")
+        margin = score_margin(hits_for(method, tie))
+        check(margin < EXTRACTIVE_MIN_MARGIN, f"near-tie goes to the LLM: margin {margin:.2f}")
+
+    print("reranked")
+    hits = hits_for("rrf", tie)
+    reranked = [{**h, "fused_score": h["score"], "score": p} for h, p in zip(hits, [0.97, 0.12, 0.05, 0.01])]
+    check(score_margin(reranked) >= EXTRACTIVE_MIN_MARGIN, f"decisive rerank passes the gate: margin {score_margin(reranked):.2f}")
+    reranked = [{**h, "fused_score": h["score"], "score": p} for h, p in zip(hits, [0.97, 0.93, 0.05, 0.01])]
+    check(score_margin(reranked) < EXTRACTIVE_MIN_MARGIN, f"close rerank goes to the LLM: margin {score_margin(reranked):.2f}")
+    partial = reranked[:2] + hits[2:]
+    check(score_margin(partial) < EXTRACTIVE_MIN_MARGIN, "partly reranked hits fall back to similarity")
+
+    print(f"\n{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Conformance check: the memory-mapped backend must answer like Chroma.
+
+Loads the same synthetic corpus (clustered embeddings, global and per-user
+chunks) into a throwaway ChromaStore and MmapStore per configuration, then
+compares counts, scoped top-k search, get, scan, upsert-overwrite and
+delete. Exits non-zero on any mismatch.
+
+    python benchmarks/check_vectorstore_parity.py [--rows 3000] [--k 8]
+"""
+import os, sys, shutil, tempfile, argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import chromadb
+from app.vectorstore import ChromaStore, MmapStore
+
+failures = []
+
+def check(cond: bool, message: str):
+    print(("  ok    " if cond else "  FAIL  ") + message)
+    if not cond:
+        failures.append(message)
+
+def corpus(rows: int, dim: int = 384):
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(32, dim))
+    emb = centres[rng.integers(0, 32, rows)] + 0.3 * rng.normal(size=(rows, dim))
+    ids, docs, metas = [], [], []
+    for i in range(rows):
+        doc = f"doc{i // 50}"
+        owner = None if i % 5 else str(1 + (i // 5) % 3)  # 80% global, rest owned by users 1-3
+        ids.append(f"{doc}_{i}")
+        docs.append(f"chunk text {i}")
+        metas.append({
+            "user_id": owner or "global",
+            "doc_id": doc,
+            "title": doc,
+            "is_global": str(owner is None),
+            "uploaded_by": "1",
+        })
+    return ids, emb.astype(np.float32), docs, metas
+
+def load(store, ids, emb, docs, metas):
+    for s in range(0, len(ids), 1000):
+        store.upsert(ids[s:s + 1000], emb[s:s + 1000], docs[s:s + 1000], metas[s:s + 1000])
+
+def exact_search(live, queries, k, user):
+    """Brute-force float32 cosine search over the rows currently stored.
+
+    Returns the true top-k ids per query and a function giving the true
+    cosine distance of any (query, id) pair.
+    """
+    ids = [i for i, (_, meta) in live.items() if user is None or meta["is_global"] == "True" or meta["user_id"] == str(user)]
+    mat = np.stack([live[i][0] for i in ids]) if ids else np.zeros((0, queries.shape[1]), dtype=np.float32)
+    mat = mat / np.linalg.norm(mat, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    dist = 1 - q @ mat.T
+    order = np.argsort(dist, axis=1)[:, :k]
+    position = {i: n for n, i in enumerate(ids)}
+    return [[ids[j] for j in row] for row in order], lambda qi, doc_id: float(dist[qi, position[doc_id]])
+
+def recall(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / max(len(t), 1) for f, t in zip(found, truth)]))
+
+def compare_search(ref, cand, live, queries, k, min_recall, tol, label):
+    """Both backends are scored against exact search.
+
+    Quantised vectors may swap near-ties, so besides recall the mmap results
+    must be tolerance-equivalent: every returned chunk is truly within
+    ``tol`` of the exact k-th nearest distance.
+    """
+    for user in (None, 1, 2, 99):
+        truth, true_dist = exact_search(live, queries, k, user)
+        r = ref.query(queries, k, user_id=user)
+        c = cand.query(queries, k, user_id=user)
+        ref_recall, cand_recall = recall(r["ids"], truth), recall(c["ids"], truth)
+        slack = max(
+            (true_dist(qi, i) - true_dist(qi, t[-1]) for qi, (found, t) in enumerate(zip(c["ids"], truth)) for i in found),
+            default=0.0,
+        )
+        check(
+            cand_recall >= min(min_recall, ref_recall) or slack <= tol,
+            f"{label} user={user}: recall@{k} mmap {cand_recall:.3f} vs chroma {ref_recall:.3f}, worst slack {slack:.4f}",
+        )
+        check(all(len(a) == len(b) for a, b in zip(r["ids"], c["ids"])), f"{label} user={user}: same result counts")
+        reported = max(
+            (abs(d - true_dist(qi, i)) for qi, (found, ds) in enumerate(zip(c["ids"], c["distances"])) for i, d in zip(found, ds)),
+            default=0.0,
+        )
+        check(reported <= tol, f"{label} user={user}: max distance error {reported:.4f} <= {tol}")
+
+def run(rows: int, k: int, dtype: str, index: str):
+    print(f"\n== mmap {dtype}/{index} vs chroma ({rows} rows) ==")
+    tmp = tempfile.mkdtemp(prefix="vs_parity_")
+    try:
+        client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+        ref = ChromaStore(client, collection_name="parity", pointer_file=os.path.join(tmp, "pointer"))
+        cand = MmapStore(os.path.join(tmp, "mmap"), dtype=dtype, index=index)
+        ids, emb, docs, metas = corpus(rows)
+        load(ref, ids, emb, docs, metas)
+        load(cand, ids, emb, docs, metas)
+        live = {i: (e, m) for i, e, m in zip(ids, emb, metas)}
+        if index == "ivf":
+            cand.build_ivf(nlist=32)
+
+        rng = np.random.default_rng(1)
+        queries = emb[rng.choice(rows, 20, replace=False)] + 0.05 * rng.normal(size=(20, emb.shape[1])).astype(np.float32)
+        tol = 0.01 if dtype == "float16" else 0.02
+        min_recall = 0.99 if index == "exact" else 0.8
+
+        check(ref.count() == cand.count(), f"count {ref.count()} == {cand.count()}")
+        compare_search(ref, cand, live, queries, k, min_recall, tol, "search")
+
+        sample = [ids[i] for i in rng.choice(rows, 25, replace=False)] + ["missing_id"]
+        rg, cg = ref.get(sample), cand.get(sample)
+        check(
+            sorted(zip(rg["ids"], rg["documents"])) == sorted(zip(cg["ids"], cg["documents"])),
+            "get returns the same documents",
+        )
+        check(
+            {i: m for i, m in zip(rg["ids"], rg["metadatas"])} == {i: m for i, m in zip(cg["ids"], cg["metadatas"])},
+            "get returns the same metadata",
+        )
+        for user in (1, 3):
+            check(
+                set(ref.scan(user_id=user, limit=rows, include=())["ids"]) == set(cand.scan(user_id=user, limit=rows, include=())["ids"]),
+                f"scan scope for user {user}",
+            )
+
+        # Overwrite some rows with new vectors and text
+        new_ids = ids[:10]
+        new_emb = rng.normal(size=(10, emb.shape[1])).astype(np.float32)
+        ref.upsert(new_ids, new_emb, ["rewritten"] * 10, metas[:10])
+        cand.upsert(new_ids, new_emb, ["rewritten"] * 10, metas[:10])
+        check(ref.count() == cand.count(), "count after overwrite")
+        live.update({i: (e, m) for i, e, m in zip(new_ids, new_emb, metas[:10])})
+        check(cand.get(new_ids)["documents"] == ["rewritten"] * 10, "overwrite replaces documents")
+        compare_search(ref, cand, live, new_emb, k, min_recall, tol, "search after overwrite")
+
+        for doc in ("doc0", "doc7", "doc_missing"):
+            ref.delete_document(doc)
+            cand.delete_document(doc)
+            live = {i: v for i, v in live.items() if v[1]["doc_id"] != doc}
+        check(ref.count() == cand.count(), f"count after delete {ref.count()} == {cand.count()}")
+        check(not cand.get([i for i in ids if i.startswith("doc7_")])["ids"], "deleted chunks are gone")
+        compare_search(ref, cand, live, queries, k, min_recall, tol, "search after delete")
+
+        reopened = MmapStore(os.path.join(tmp, "mmap"), dtype=dtype, index=index)
+        check(reopened.count() == cand.count(), "reopened store sees committed state")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+    for dtype in ("float16", "int8"):
+        for index in ("exact", "ivf"):
+            run(args.rows, args.k, dtype, index)
+    print(f"\n{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Sweep HNSW parameters over the corpus: recall@k vs latency vs index size.
+
+Stored embeddings are read from the configured vector store and indexed into
+throwaway persistent collections, one per parameter combination. Ground
+truth is exact brute-force search in NumPy with the same metric. Queries are
+either a file of questions (embedded with the production model) or a sample
+of stored chunk embeddings.
+
+    python benchmarks/sweep_hnsw.py --queries questions.txt --k 8 \\
+        --m 8 16 32 --construction-ef 100 200 --search-ef 16 64 128
+"""
+import os, sys, time, shutil, tempfile, argparse, itertools
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import chromadb
+from app.rag import store, embedding_fn
+from app.vectorstore import hnsw_metadata
+
+def load_corpus(limit: int | None):
+    data = store.scan(limit=limit or store.count(), include=("embeddings",))
+    return data["ids"], np.asarray(data["embeddings"], dtype=np.float32)
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    if space == "cosine":
+        c = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = q @ c.T
+    elif space == "ip":
+        scores = queries @ corpus.T
+    else:
+        scores = -((queries ** 2).sum(1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def run(ids, corpus, queries, k, space, m, construction_ef, search_ef):
+    path = tempfile.mkdtemp(prefix="hnsw_sweep_")
+    try:
+        client = chromadb.PersistentClient(path=path)
+        coll = client.create_collection(name="sweep", metadata=hnsw_metadata(space, m, construction_ef, search_ef))
+        start = time.perf_counter()
+        for s in range(0, len(ids), 5000):
+            coll.add(ids=ids[s:s + 5000], embeddings=corpus[s:s + 5000].tolist())
+        build_s = time.perf_counter() - start
+
+        truth = exact_neighbours(corpus, queries, k, space)
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        latencies, hits = [], 0
+        for qi, q in enumerate(queries):
+            start = time.perf_counter()
+            res = coll.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+            latencies.append(time.perf_counter() - start)
+            found = {position[i] for i in res["ids"][0]}
+            hits += len(found & set(truth[qi].tolist()))
+        del coll, client
+        return {
+            "recall": hits / (len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "build_s": build_s,
+            "size_mb": dir_size(path) / (1024 * 1024),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", help="file with one question per line")
+    parser.add_argument("--sample", type=int, default=200, help="stored chunks to use as queries when --queries is absent")
+    parser.add_argument("--limit", type=int, help="index only the first N chunks")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--space", default="cosine", choices=["cosine", "l2", "ip"])
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 32, 64, 128])
+    args = parser.parse_args()
+
+    ids, corpus = load_corpus(args.limit)
+    if not ids:
+        sys.exit("The vector store is empty")
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = np.asarray(embedding_fn(questions), dtype=np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        queries = corpus[rng.choice(len(ids), size=min(args.sample, len(ids)), replace=False)]
+
+    print(f"{len(ids)} chunks, {len(queries)} queries, recall@{args.k}, space={args.space}")
+    print(f"{'M':>4} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} {'build s':>8} {'size MB':>8}")
+    for m, c_ef, s_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+        r = run(ids, corpus, queries, args.k, args.space, m, c_ef, s_ef)
+        print(f"{m:>4} {c_ef:>5} {s_ef:>5} {r['recall']:>7.3f} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['build_s']:>8.1f} {r['size_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -24,8 +24,38 @@ export const uploadDocument = (file, title = null) => {
   return apiClient.post('/admin/ingest_pdf', formData);
 };
 
-export const getDocuments = () => {
-  return apiClient.get('/admin/documents');
+// files: PDFs and/or ZIPs of PDFs, ingested in one request
+export const uploadDocumentsBulk = (files) => {
+  const formData = new FormData();
+  files.forEach((file) => formData.append('files', file));
+
+  return apiClient.post('/admin/ingest_bulk', formData);
+};
+
+// NDJSON progress events: started, progress (pages/chunks/embedded), then done or error
+export const uploadDocumentStream = async (file, title = null) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  if (title) formData.append('title', title);
+
+  return fetch(`${API_URL}/admin/ingest_pdf_stream`, {
+    method: 'POST',
+    headers: {
+      'Authorization': apiClient.defaults.headers.common['Authorization'],
+    },
+    body: formData,
+  });
+};
+
+// The next page's cursor is in the response's x-next-cursor header
+export const getDocuments = ({ limit, cursor, title, sort, order } = {}) => {
+  return apiClient.get('/admin/documents', {
+    params: { limit, cursor, title, sort, order },
+  });
+};
+
+export const getDocumentCount = () => {
+  return apiClient.get('/admin/documents/count');
 };
 
 export const deleteDocument = (docId) => {
@@ -49,13 +79,34 @@ export const queryRAGStream = async (query, topK = 8) => {
   return response;
 };
 
+// Server-Sent Events: `sources` first, then `token` frames, then `done`
+export const queryRAGEvents = async (query, topK = 8) => {
+  return fetch(`${API_URL}/rag/query_sse`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      'Authorization': apiClient.defaults.headers.common['Authorization'],
+    },
+    body: JSON.stringify({ query, top_k: topK }),
+  });
+};
+
 // Conversation endpoints
 export const saveMessage = (role, content) => {
   return apiClient.post('/conversations/save', { role, content });
 };
 
-export const getConversationHistory = () => {
-  return apiClient.get('/conversations/history');
+// messages: [{ role, content }, ...] saved in one transaction
+export const saveMessages = (messages) => {
+  return apiClient.post('/conversations/save_bulk', { messages });
+};
+
+// Pass the previous response's next_cursor as `before` to load older messages
+export const getConversationHistory = ({ limit, before, threadId } = {}) => {
+  return apiClient.get('/conversations/history', {
+    params: { limit, before, thread_id: threadId },
+  });
 };
 
 export const clearConversations = () => {
@@ -3,10 +3,43 @@ import requests
 import time
 import os
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # API configuration
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+# Seconds catalog and suggestion lookups are reused across reruns
+CACHE_TTL_SECONDS = int(os.getenv("ST_CACHE_TTL_SECONDS", "60"))
+
+@st.cache_resource
+def http():
+    """One keep-alive session for every API call, shared across reruns and users.
+
+    Connection failures are retried for any method (nothing was sent);
+    502/503/504 only for idempotent ones, so a question is never asked twice.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset(["GET", "HEAD", "DELETE"]),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def background():
+    """Runs writes the UI doesn't need to wait for"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="st_api")
+
+def auth_headers(token=None):
+    return {"Authorization": f"Bearer {token or st.session_state['token']}"}
 
 # --- Helper functions ---
 def register(email, password, role="user"):
@@ -17,7 +50,7 @@ def register(email, password, role="user"):
         admin_key = st.session_state.get("admin_key", "")
         payload["admin_key"] = admin_key
     
-    r = requests.post(f"{API_URL}{endpoint}", json=payload)
+    r = http().post(f"{API_URL}{endpoint}", json=payload)
     if r.status_code == 200:
         return True, "Registration successful! Please login."
     else:
@@ -27,7 +60,7 @@ def register(email, password, role="user"):
             return False, "Registration failed"
 
 def login(email, password):
-    r = requests.post(f"{API_URL}/auth/login", data={"username": email, "password": password})
+    r = http().post(f"{API_URL}/auth/login", data={"username": email, "password": password})
     if r.status_code == 200:
         data = r.json()
         st.session_state["token"] = data["access_token"]
@@ -40,41 +73,117 @@ def login(email, password):
         except:
             return False, "Login failed"
 
-def admin_upload_pdf(file, title=None):
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+def admin_upload_pdf_stream(file, title=None, on_progress=None):
+    """Upload with progress; on_progress gets each event as the server reports it"""
     files = {"file": (file.name, file, "application/pdf")}
     data = {"title": title} if title else {}
-    r = requests.post(f"{API_URL}/admin/ingest_pdf", files=files, data=data, headers=headers)
+    try:
+        r = http().post(
+            f"{API_URL}/admin/ingest_pdf_stream", files=files, data=data,
+            headers=auth_headers(), stream=True, timeout=600
+        )
+        if r.status_code != 200:
+            return False, None
+        for line in r.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line.decode("utf-8"))
+            if on_progress:
+                on_progress(event)
+            if event["event"] == "done":
+                invalidate_documents()
+                return True, event
+            if event["event"] == "error":
+                return False, event
+    except requests.exceptions.RequestException:
+        pass
+    return False, None
+
+def admin_upload_bulk(uploads):
+    """Several PDFs and/or ZIPs of PDFs in one request"""
+    files = [
+        ("files", (f.name, f, "application/zip" if f.name.lower().endswith(".zip") else "application/pdf"))
+        for f in uploads
+    ]
+    r = http().post(f"{API_URL}/admin/ingest_bulk", files=files, headers=auth_headers(), timeout=600)
     if r.status_code == 200:
+        invalidate_documents()
         return True, r.json()
-    else:
-        return False, None
+    return False, None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_documents(token, cursor, title, limit):
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    if title:
+        params["title"] = title
+    r = http().get(f"{API_URL}/admin/documents", headers=auth_headers(token), params=params, timeout=10)
+    r.raise_for_status()
+    return r.json(), r.headers.get("X-Next-Cursor")
 
-def get_admin_documents():
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+def get_admin_documents(cursor=None, title=None, limit=50):
+    """One page of the catalog and the cursor for the next (None on the last page)"""
     try:
-        r = requests.get(f"{API_URL}/admin/documents", headers=headers)
-        if r.status_code == 200:
-            return r.json()
+        return _fetch_documents(st.session_state["token"], cursor, title, limit)
     except:
-        pass
-    return []
+        return [], None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_document_count(token):
+    r = http().get(f"{API_URL}/admin/documents/count", headers=auth_headers(token), timeout=5)
+    r.raise_for_status()
+    return r.json()["count"]
+
+def get_document_count():
+    try:
+        return _fetch_document_count(st.session_state["token"])
+    except:
+        return 0
+
+def invalidate_documents():
+    """Drop cached catalog data after an upload or delete"""
+    _fetch_documents.clear()
+    _fetch_document_count.clear()
+    st.session_state.pop("doc_pages_filter", None)
 
 def delete_document(doc_id):
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    headers = auth_headers()
     try:
-        r = requests.delete(f"{API_URL}/admin/document/{doc_id}", headers=headers)
+        r = http().delete(f"{API_URL}/admin/document/{doc_id}", headers=headers)
+        if r.status_code == 200:
+            invalidate_documents()
         return r.status_code == 200
     except:
         return False
 
+DEFAULT_SUGGESTIONS = [
+    "What are the policies?",
+    "Employee benefits?",
+    "Upcoming holidays?",
+]
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_hot_questions(token):
+    r = http().get(f"{API_URL}/rag/hot_questions", headers=auth_headers(token), timeout=5)
+    r.raise_for_status()
+    return [q["question"] for q in r.json()["questions"]]
+
+def get_hot_questions():
+    """Suggested questions from the API; answers to these are precomputed server-side"""
+    try:
+        return _fetch_hot_questions(st.session_state["token"]) or DEFAULT_SUGGESTIONS
+    except:
+        return DEFAULT_SUGGESTIONS
+
 def query_rag_stream(query):
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    headers = auth_headers()
     
     try:
-        response = requests.post(
+        response = http().post(
             f"{API_URL}/rag/query_stream",
-            json={"query": query, "top_k": 8},
+            # The server saves the question and answer once the stream completes
+            json={"query": query, "top_k": 8, "persist": True, "thread_id": st.session_state.thread_id},
             headers=headers,
             stream=True,
             timeout=30
@@ -96,36 +205,55 @@ def query_rag_stream(query):
         yield query_rag_fallback(query)
 
 def query_rag_fallback(query):
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    headers = auth_headers()
     try:
-        r = requests.post(
+        r = http().post(
             f"{API_URL}/rag/query",
             json={"query": query, "top_k": 8},
             headers=headers,
             timeout=30
         )
         if r.status_code == 200:
-            return r.json()["answer"]
+            answer = r.json()["answer"]
+            # /rag/query doesn't persist, so save the exchange in one request
+            save_messages_to_db([("user", query), ("assistant", answer)])
+            return answer
     except:
         pass
     return "Sorry, I couldn't process your question. Please try again."
 
-def save_message_to_db(role, content):
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+def _post_messages(token, thread_id, messages):
     try:
-        requests.post(
-            f"{API_URL}/conversations/save",
-            json={"role": role, "content": content},
-            headers=headers,
+        http().post(
+            f"{API_URL}/conversations/save_bulk",
+            json={
+                "messages": [{"role": role, "content": content} for role, content in messages],
+                "thread_id": thread_id,
+            },
+            headers=auth_headers(token),
             timeout=5
         )
     except:
         pass
 
+def save_messages_to_db(messages):
+    """Save in the background; session state is read here since worker threads can't"""
+    background().submit(_post_messages, st.session_state["token"], st.session_state.thread_id, list(messages))
+
 def load_conversation_history():
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    """Latest page of the most recent thread, which the chat then continues"""
+    headers = auth_headers()
     try:
-        r = requests.get(f"{API_URL}/conversations/history", headers=headers, timeout=5)
+        # The newest message names the thread; the server then pages that thread alone
+        r = http().get(f"{API_URL}/conversations/history", headers=headers, params={"limit": 1}, timeout=5)
+        if r.status_code != 200:
+            return []
+        latest = r.json()["messages"]
+        params = {"limit": 50}
+        if latest and latest[-1].get("thread_id"):
+            params["thread_id"] = latest[-1]["thread_id"]
+            st.session_state.thread_id = params["thread_id"]
+        r = http().get(f"{API_URL}/conversations/history", headers=headers, params=params, timeout=5)
         if r.status_code == 200:
             return r.json()["messages"]
     except:
@@ -133,9 +261,9 @@ def load_conversation_history():
     return []
 
 def clear_conversation_history():
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    headers = auth_headers()
     try:
-        requests.delete(f"{API_URL}/conversations/clear", headers=headers, timeout=5)
+        http().delete(f"{API_URL}/conversations/clear", headers=headers, timeout=5)
     except:
         pass
 
@@ -262,6 +390,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "history_loaded" not in st.session_state:
     st.session_state.history_loaded = False
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = str(uuid.uuid4())
 
 # --- User Profile Component ---
 def show_user_profile():
@@ -354,8 +484,7 @@ elif st.session_state.get("user_role") == "admin":
         show_current_date()
         
         st.markdown("### Quick Stats")
-        docs = get_admin_documents()
-        st.metric("Documents", len(docs))
+        st.metric("Documents", get_document_count())
         
         st.markdown("---")
         if st.button("🚪 Logout", use_container_width=True):
@@ -371,23 +500,51 @@ elif st.session_state.get("user_role") == "admin":
     
     with tab1:
         st.subheader("Upload Document")
-        uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
-        title = st.text_input("Title (optional)")
+        uploaded_files = st.file_uploader("Choose PDF files, or a ZIP of PDFs", type=["pdf", "zip"], accept_multiple_files=True)
+        single = len(uploaded_files) == 1 and uploaded_files[0].name.lower().endswith(".pdf")
+        title = st.text_input("Title (optional)") if single else None
         
-        if uploaded_file:
+        if uploaded_files:
             if st.button("Upload", type="primary", use_container_width=True):
-                with st.spinner("Processing..."):
-                    success, result = admin_upload_pdf(uploaded_file, title)
-                    if success:
+                if single:
+                    bar = st.progress(0.0, text="Uploading...")
+                    total = {"pages": 0}
+                    def show_progress(event):
+                        if event["event"] == "started":
+                            total["pages"] = event["total_pages"]
+                        elif event["event"] == "progress":
+                            done = event["pages"] / total["pages"] if total["pages"] else 0.0
+                            # Parsing is most of the bar; embedding the last batches fills the rest
+                            fraction = 0.8 * done + 0.2 * (event["embedded"] / event["chunks"] if event["chunks"] else 0.0)
+                            bar.progress(min(fraction, 1.0), text=(
+                                f"{event['pages']}/{total['pages']} pages · {event['chunks']} chunks · "
+                                f"{event['embedded']} embedded"
+                            ))
+                    success, result = admin_upload_pdf_stream(uploaded_files[0], title, on_progress=show_progress)
+                    bar.empty()
+                else:
+                    with st.spinner("Processing..."):
+                        success, result = admin_upload_bulk(uploaded_files)
+                if success:
+                    if single:
                         st.success("Document uploaded!")
-                        time.sleep(1)
-                        st.rerun()
                     else:
-                        st.error("Upload failed")
+                        st.success(f"{len(result['documents'])} documents uploaded ({result['chunks_per_sec']} chunks/s)")
+                        for failure in result["failed"]:
+                            st.warning(f"{failure['name']}: {failure['error']}")
+                    time.sleep(1)
+                    st.rerun()
+                else:
+                    st.error(result["detail"] if result and "detail" in result else "Upload failed")
     
     with tab2:
         st.subheader("Manage Documents")
-        docs = get_admin_documents()
+        title_filter = st.text_input("Filter by title", key="doc_title_filter")
+        # Pages already shown stay loaded until the filter changes
+        if st.session_state.get("doc_pages_filter") != title_filter:
+            st.session_state.doc_pages_filter = title_filter
+            st.session_state.doc_pages = get_admin_documents(title=title_filter)
+        docs, next_cursor = st.session_state.doc_pages
         
         if docs:
             for doc in docs:
@@ -396,7 +553,10 @@ elif st.session_state.get("user_role") == "admin":
                     st.markdown(f"**📄 {doc['title'] or 'Untitled'}**")
                 with col2:
                     created = datetime.fromisoformat(doc['created_at'].replace('Z', '+00:00'))
-                    st.caption(created.strftime('%Y-%m-%d %H:%M'))
+                    caption = created.strftime('%Y-%m-%d %H:%M')
+                    if doc.get('chunk_count') is not None:
+                        caption += f" · {doc['chunk_count']} chunks"
+                    st.caption(caption)
                 with col3:
                     if st.button("🗑️", key=f"del_{doc['id']}"):
                         if delete_document(doc['id']):
@@ -404,6 +564,10 @@ elif st.session_state.get("user_role") == "admin":
                             time.sleep(1)
                             st.rerun()
                 st.markdown("---")
+            if next_cursor and st.button("Load more", use_container_width=True):
+                more, next_cursor = get_admin_documents(cursor=next_cursor, title=title_filter)
+                st.session_state.doc_pages = (docs + more, next_cursor)
+                st.rerun()
         else:
             st.info("No documents yet")
     
@@ -426,7 +590,6 @@ elif st.session_state.get("user_role") == "admin":
         # Chat input
         if prompt := st.chat_input("Ask something..."):
             st.session_state.messages.append({"role": "user", "content": prompt})
-            save_message_to_db("user", prompt)
             
             with st.chat_message("user"):
                 st.markdown(prompt)
@@ -441,7 +604,6 @@ elif st.session_state.get("user_role") == "admin":
                 
                 placeholder.markdown(full_response)
                 st.session_state.messages.append({"role": "assistant", "content": full_response})
-                save_message_to_db("assistant", full_response)
         
         # Clear button
         if st.button("Clear Chat"):
@@ -459,11 +621,7 @@ else:
         
         st.markdown("---")
         st.markdown("### 💡 Try asking:")
-        suggestions = [
-            "What are the policies?",
-            "Employee benefits?",
-            "Upcoming holidays?",
-        ]
+        suggestions = get_hot_questions()
         for q in suggestions:
             if st.button(q, key=q, use_container_width=True):
                 st.session_state.suggested_query = q
@@ -498,7 +656,6 @@ else:
     
     if prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
-        save_message_to_db("user", prompt)
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -513,7 +670,6 @@ else:
             
             placeholder.markdown(full_response)
             st.session_state.messages.append({"role": "assistant", "content": full_response})
-            save_message_to_db("assistant", full_response)
     
     # Footer
     col1, col2 = st.columns([3, 1])
@@ -521,4 +677,5 @@ else:
         if st.button("🔄 New Chat", use_container_width=True):
             clear_conversation_history()
             st.session_state.messages = []
+            st.session_state.thread_id = str(uuid.uuid4())
             st.rerun()
\ No newline at end of file